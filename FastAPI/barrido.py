@@ -0,0 +1,116 @@
+"""
+Barrido periódico de registros expirados, en segundo plano.
+
+Hasta ahora la expiración solo se aplicaba al leer (is_qr_valid al escanear
+y el filtro de fecha del feed de anuncios), así que las visitas vencidas
+seguían con qr_activo/activa en True y los anuncios vencidos seguían en la
+tabla, y cada consulta tenía que pasar sobre ellos. Cada
+BARRIDO_INTERVALO_SEGUNDOS (+ hasta BARRIDO_JITTER_SEGUNDOS al azar):
+
+- visitas: pone qr_activo y activa en False a las que ya expiraron; avisa
+  a manifiesto, analítica, índice y bus de eventos ("expirada").
+- anuncios: mueve los expirados a ANUNCIOS_ARCHIVO_TABLA e invalida el feed.
+  Solo si ANUNCIOS_ARCHIVO_TABLA está definida (la tabla se crea aparte, con
+  las mismas columnas que anuncios); si no, los anuncios vencidos se quedan
+  en su tabla y el feed los sigue filtrando al leer.
+
+Cada tarea trabaja en lotes de BARRIDO_LOTE filas y como máximo
+BARRIDO_MAX_LOTES por pasada; lo que quede se toma en la siguiente. Todo es
+I/O asíncrono y se cede el event loop entre lotes, así que las peticiones
+no esperan al barrido. Con varios workers cada uno corre su barrido; las
+actualizaciones son idempotentes y el jitter evita que coincidan.
+BARRIDO_ACTIVO=0 lo desactiva.
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import time
+from typing import Dict, Optional
+
+import database
+import metricas
+from crud.anuncios import ANUNCIOS_ARCHIVO_TABLA, archivar_anuncios_expirados
+from crud.visitas import desactivar_visitas_expiradas
+
+BARRIDO_ACTIVO = os.getenv("BARRIDO_ACTIVO", "1") != "0"
+BARRIDO_INTERVALO_SEGUNDOS = float(os.getenv("BARRIDO_INTERVALO_SEGUNDOS", "60"))
+BARRIDO_JITTER_SEGUNDOS = float(os.getenv("BARRIDO_JITTER_SEGUNDOS", "10"))
+BARRIDO_LOTE = int(os.getenv("BARRIDO_LOTE", "500"))
+BARRIDO_MAX_LOTES = int(os.getenv("BARRIDO_MAX_LOTES", "20"))
+
+logger = logging.getLogger(__name__)
+
+barrido_ejecuciones = metricas.Contador(
+    "smartcolonia_barrido_ejecuciones_total", "Pasadas del barrido de expirados.", ("tarea", "resultado"))
+barrido_filas = metricas.Contador(
+    "smartcolonia_barrido_filas_total", "Filas expiradas desactivadas o archivadas.", ("tarea",))
+barrido_duracion = metricas.Histograma(
+    "smartcolonia_barrido_duracion_segundos", "Duración de cada pasada del barrido.", ("tarea",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0))
+barrido_ultima = metricas.Medidor(
+    "smartcolonia_barrido_ultima_ejecucion_timestamp_segundos", "Momento (epoch) de la última pasada.", ("tarea",))
+
+
+async def _visitas(db, lote: int) -> int:
+    return len(await desactivar_visitas_expiradas(db, lote))
+
+
+TAREAS = {"visitas": _visitas}
+if ANUNCIOS_ARCHIVO_TABLA:
+    TAREAS["anuncios"] = archivar_anuncios_expirados
+
+
+async def barrer(db) -> Dict[str, int]:
+    """Una pasada de cada tarea. Devuelve cuántas filas procesó cada una."""
+    totales = {}
+    for nombre, tarea in TAREAS.items():
+        inicio = time.perf_counter()
+        total = 0
+        resultado = "ok"
+        try:
+            for _ in range(BARRIDO_MAX_LOTES):
+                procesadas = await tarea(db, BARRIDO_LOTE)
+                total += procesadas
+                if procesadas < BARRIDO_LOTE:
+                    break
+                # Cede el event loop entre lotes
+                await asyncio.sleep(0)
+        except Exception as e:
+            resultado = "error"
+            logger.warning("Error en el barrido de %s: %s", nombre, e)
+        barrido_ejecuciones.incrementar((nombre, resultado))
+        barrido_filas.incrementar((nombre,), total)
+        barrido_duracion.observar((nombre,), time.perf_counter() - inicio)
+        barrido_ultima.fijar((nombre,), time.time())
+        if total:
+            logger.info("Barrido de %s: %d filas expiradas", nombre, total)
+        totales[nombre] = total
+    return totales
+
+
+async def _bucle() -> None:
+    while True:
+        await asyncio.sleep(BARRIDO_INTERVALO_SEGUNDOS + random.uniform(0, BARRIDO_JITTER_SEGUNDOS))
+        # Un fallo al obtener el cliente (o cualquier otro) no debe terminar el barrido
+        try:
+            await barrer(await database.get_db())
+        except Exception:
+            logger.exception("Error en el barrido; se reintenta en la siguiente pasada")
+
+
+def iniciar() -> Optional[asyncio.Task]:
+    """Arranca el barrido (lo llama el lifespan de main.py). None si está desactivado."""
+    if not BARRIDO_ACTIVO:
+        return None
+    return asyncio.create_task(_bucle(), name="barrido")
+
+
+async def detener(tarea: Optional[asyncio.Task]) -> None:
+    if tarea is None:
+        return
+    tarea.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await tarea
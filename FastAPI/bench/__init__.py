@@ -0,0 +1,5 @@
+# Benchmarks de rendimiento de la API (ejecutar desde FastAPI/ con python -m bench.<nombre>)
+import os
+
+# Los benchmarks corren contra SupabaseEnMemoria: sin QR_SECRET la app solo arranca así
+os.environ.setdefault("DB_BACKEND", "memoria")
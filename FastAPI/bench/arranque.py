@@ -0,0 +1,94 @@
+"""
+Presupuesto de arranque: tiempo de import de la app y tiempo hasta /healthz.
+
+1. Ejecuta `python -X importtime -c "import main"` en un proceso nuevo y
+   suma el tiempo propio de cada módulo agrupado por paquete raíz
+   (fastapi, supabase, pydantic, ...), para ver qué pesa en el arranque.
+2. Con --servidor, levanta uvicorn y mide cuánto tarda en responder /healthz.
+   Si DB_BACKEND no está definido se usa "memoria", para no necesitar
+   credenciales de Supabase.
+
+Sale con código 1 si se pasa del presupuesto, para usarlo en CI.
+
+Uso (desde FastAPI/):
+    python -m bench.arranque --presupuesto-ms 1500 --servidor
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+_LINEA = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def medir_imports(modulo: str = "main"):
+    """Devuelve (total_ms, {paquete: ms}) del import de `modulo` en un proceso nuevo."""
+    salida = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    por_paquete = defaultdict(float)
+    total = 0.0
+    for linea in salida.splitlines():
+        coincidencia = _LINEA.match(linea)
+        if not coincidencia:
+            continue
+        propio, acumulado, sangria, nombre = coincidencia.groups()
+        por_paquete[nombre.split(".")[0]] += int(propio) / 1000
+        if nombre == modulo and not sangria:
+            total = int(acumulado) / 1000
+    return total, dict(por_paquete)
+
+
+def medir_servidor(puerto: int, limite_s: float = 30.0) -> float:
+    """Segundos desde que se lanza uvicorn hasta que /healthz responde 200."""
+    inicio = time.perf_counter()
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={"DB_BACKEND": "memoria", **os.environ},
+    )
+    try:
+        while time.perf_counter() - inicio < limite_s:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{puerto}/healthz", timeout=0.5) as respuesta:
+                    if respuesta.status == 200:
+                        return time.perf_counter() - inicio
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("uvicorn no respondió /healthz a tiempo")
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--presupuesto-ms", type=float, default=1500.0, help="Máximo para el import de main")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--servidor", action="store_true", help="Medir también el tiempo hasta /healthz")
+    parser.add_argument("--puerto", type=int, default=8765)
+    args = parser.parse_args()
+
+    # Se queda la mejor medición: las demás incluyen ruido del sistema de archivos
+    total, por_paquete = min((medir_imports() for _ in range(args.repeticiones)), key=lambda m: m[0])
+    print(f"import main: {total:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+    for paquete, ms in sorted(por_paquete.items(), key=lambda p: -p[1])[:args.top]:
+        print(f"  {paquete:<24} {ms:8.1f} ms")
+
+    if args.servidor:
+        print(f"uvicorn hasta /healthz: {medir_servidor(args.puerto) * 1000:.0f} ms")
+
+    if total > args.presupuesto_ms:
+        print("Presupuesto de import excedido")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Prueba de carga de extremo a extremo sobre todos los routers.
+
+Levanta la app contra SupabaseEnMemoria (con latencia inyectada), llena las
+tablas con datos sintéticos y lanza peticiones a cada endpoint con la
+concurrencia indicada. Reporta p50/p95/p99 de latencia y peticiones por
+segundo de cada endpoint.
+
+Uso (desde FastAPI/):
+    python -m bench.carga --concurrencia 50 --peticiones 500 --latencia-ms 15
+    python -m bench.carga --salida base.json
+    python -m bench.carga --comparar base.json --tolerancia 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import httpx
+
+from database import get_db
+from main import app
+from instrumentacion import ClienteInstrumentado
+from supabase_memoria import SupabaseEnMemoria
+
+
+def _visita_nueva(ids):
+    return {
+        "nombre_visitante": "Carga",
+        "apellido_visitante": "Bench",
+        "identificacion": "INE-0",
+        "tipo": "Visita",
+        "fecha_programada": (datetime.utcnow() + timedelta(hours=2)).isoformat(),
+        "residencia_id": random.choice(ids["residencias"]),
+        "usuario_id": random.choice(ids["usuarios"]),
+    }
+
+
+def _anuncio_nuevo(ids):
+    return {
+        "titulo": "Aviso",
+        "contenido": "Corte de agua",
+        "usuario_id": random.choice(ids["usuarios"]),
+        "colonia_id": random.choice(ids["colonias"]),
+    }
+
+
+def _usuario_nuevo(ids):
+    return {
+        "email": f"carga-{uuid4().hex[:12]}@example.com",
+        "password": "secreto123",
+        "nombre": "Carga",
+        "apellido": "Bench",
+        "tipo_usuario_id": 2,
+    }
+
+
+# (nombre, método, función que arma (url, cuerpo) a partir de los IDs sembrados)
+ENDPOINTS = [
+    ("GET /usuarios/", "GET", lambda ids: ("/usuarios/", None)),
+    ("GET /usuarios/{id}", "GET", lambda ids: (f"/usuarios/{random.choice(ids['usuarios'])}", None)),
+    ("POST /usuarios/", "POST", lambda ids: ("/usuarios/", _usuario_nuevo(ids))),
+    ("GET /colonias/", "GET", lambda ids: ("/colonias/", None)),
+    ("GET /colonias/{id}/residencias", "GET",
+     lambda ids: (f"/colonias/{random.choice(ids['colonias'])}/residencias", None)),
+    ("GET /residencias/", "GET", lambda ids: ("/residencias/", None)),
+    ("GET /residencias/{id}", "GET", lambda ids: (f"/residencias/{random.choice(ids['residencias'])}", None)),
+    ("GET /residencias/usuarios/{id}", "GET",
+     lambda ids: (f"/residencias/usuarios/{random.choice(ids['usuarios'])}", None)),
+    ("GET /visitas/", "GET", lambda ids: ("/visitas/", None)),
+    ("GET /visitas/{id}", "GET", lambda ids: (f"/visitas/{random.choice(ids['visitas'])}", None)),
+    ("POST /visitas/", "POST", lambda ids: ("/visitas/", _visita_nueva(ids))),
+    ("POST /visitas/{id}/scan", "POST", lambda ids: (f"/visitas/{random.choice(ids['visitas_vigentes'])}/scan", None)),
+    ("GET /visitas/residencia/{id}?activas", "GET",
+     lambda ids: (f"/visitas/residencia/{random.choice(ids['residencias'])}?activas=true", None)),
+    ("GET /visitas/fecha/rango", "GET", lambda ids: (
+        "/visitas/fecha/rango?fecha_inicio={}&fecha_fin={}".format(
+            datetime.utcnow().isoformat(), (datetime.utcnow() + timedelta(hours=6)).isoformat()),
+        None)),
+    ("GET /anuncios/colonia/{id}", "GET",
+     lambda ids: (f"/anuncios/colonia/{random.choice(ids['colonias'])}", None)),
+    ("GET /anuncios/{id}", "GET", lambda ids: (f"/anuncios/{random.choice(ids['anuncios'])}", None)),
+    ("POST /anuncios/", "POST", lambda ids: ("/anuncios/", _anuncio_nuevo(ids))),
+]
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
+
+
+async def _correr_endpoint(http, ids, metodo, construir, peticiones, concurrencia):
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias, errores = [], 0
+
+    async def una_peticion():
+        nonlocal errores
+        url, cuerpo = construir(ids)
+        async with semaforo:
+            inicio = time.perf_counter()
+            respuesta = await http.request(metodo, url, json=cuerpo)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code >= 400:
+                errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(una_peticion() for _ in range(peticiones)))
+    duracion = time.perf_counter() - inicio
+
+    return {
+        "p50_ms": _percentil(latencias, 50),
+        "p95_ms": _percentil(latencias, 95),
+        "p99_ms": _percentil(latencias, 99),
+        "media_ms": statistics.fmean(latencias),
+        "rps": peticiones / duracion,
+        "errores": errores,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--peticiones", type=int, default=500, help="peticiones por endpoint")
+    parser.add_argument("--latencia-ms", type=float, default=15.0, help="latencia simulada de cada consulta")
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+    parser.add_argument("--colonias", type=int, default=2)
+    parser.add_argument("--residencias", type=int, default=100, help="residencias por colonia")
+    parser.add_argument("--visitas", type=int, default=10, help="visitas por residencia")
+    parser.add_argument("--filtro", default="", help="solo endpoints cuyo nombre contenga este texto")
+    parser.add_argument("--salida", help="guarda los resultados en un archivo JSON")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="caída de req/s tolerada (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    random.seed(0)
+
+    db = SupabaseEnMemoria(latencia_ms=args.latencia_ms, jitter_ms=args.jitter_ms)
+    ids = db.sembrar(colonias=args.colonias, residencias_por_colonia=args.residencias,
+                     visitas_por_residencia=args.visitas)
+    # Igual que get_db: con las llamadas a la base instrumentadas
+    cliente = ClienteInstrumentado(db)
+    app.dependency_overrides[get_db] = lambda: cliente
+
+    resultados = {}
+    transporte = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as http:
+        for nombre, metodo, construir in ENDPOINTS:
+            if args.filtro and args.filtro not in nombre:
+                continue
+            resultados[nombre] = await _correr_endpoint(
+                http, ids, metodo, construir, args.peticiones, args.concurrencia)
+
+    print(f"concurrencia={args.concurrencia} peticiones/endpoint={args.peticiones} "
+          f"latencia upstream={args.latencia_ms}±{args.jitter_ms} ms")
+    print(f"{'endpoint':42} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>9} {'errores':>8}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:42} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} "
+              f"{r['rps']:9.1f} {r['errores']:8d}")
+
+    if args.salida:
+        with open(args.salida, "w") as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            base = json.load(archivo)
+        regresiones = [
+            f"{nombre}: {base[nombre]['rps']:.1f} -> {r['rps']:.1f} req/s"
+            for nombre, r in resultados.items()
+            if nombre in base and r["rps"] < base[nombre]["rps"] * (1 - args.tolerancia)
+        ]
+        if regresiones:
+            print("\nRegresiones de throughput:")
+            print("\n".join(f"  {linea}" for linea in regresiones))
+            sys.exit(1)
+        print("\nSin regresiones respecto a", args.comparar)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
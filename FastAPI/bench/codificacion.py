@@ -0,0 +1,87 @@
+"""
+Bytes en la red y CPU de codificación por endpoint: JSON, gzip, brotli y MessagePack.
+
+Pide cada listado una vez en JSON sin comprimir (a una base en memoria) y
+sobre ese cuerpo mide cada representación que puede negociar
+MiddlewareCodificacion: tamaño resultante y tiempo de codificación (el
+mejor de N). brotli y msgpack se omiten si no están instalados.
+
+Uso (desde FastAPI/):
+    python -m bench.codificacion --residencias 200 --visitas 20 --repeticiones 20
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+
+import codificacion
+from database import get_db
+from main import app
+from supabase_memoria import SupabaseEnMemoria
+
+ENDPOINTS = (
+    "/visitas/?limit=500",
+    "/visitas/residencia/{residencia}",
+    "/residencias/",
+    "/colonias/",
+    "/colonias/{colonia}/residencias",
+    "/anuncios/colonia/{colonia}",
+)
+
+
+def _representaciones():
+    casos = [("json", lambda c: c), ("json+gzip", lambda c: codificacion.comprimir(c, "gzip"))]
+    if codificacion.brotli is not None:
+        casos.append(("json+br", lambda c: codificacion.comprimir(c, "br")))
+    if codificacion.msgpack is not None:
+        casos.append(("msgpack", codificacion.json_a_msgpack))
+        casos.append(("msgpack+gzip", lambda c: codificacion.comprimir(codificacion.json_a_msgpack(c), "gzip")))
+        if codificacion.brotli is not None:
+            casos.append(("msgpack+br", lambda c: codificacion.comprimir(codificacion.json_a_msgpack(c), "br")))
+    return casos
+
+
+def _medir(funcion, cuerpo: bytes, repeticiones: int):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        salida = funcion(cuerpo)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return len(salida), mejor
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--colonias", type=int, default=20)
+    parser.add_argument("--residencias", type=int, default=200, help="residencias por colonia")
+    parser.add_argument("--visitas", type=int, default=20, help="visitas por residencia")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    db = SupabaseEnMemoria()
+    ids = db.sembrar(colonias=args.colonias, residencias_por_colonia=args.residencias,
+                     visitas_por_residencia=args.visitas)
+    app.dependency_overrides[get_db] = lambda: db
+    valores = {"colonia": ids["colonias"][0], "residencia": ids["residencias"][0]}
+
+    casos = _representaciones()
+    print(f"mejor de {args.repeticiones}; bytes y ms de CPU para codificar")
+    print(f"{'endpoint':36} " + " ".join(f"{nombre:>20}" for nombre, _ in casos))
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as http:
+        for endpoint in ENDPOINTS:
+            respuesta = await http.get(endpoint.format(**valores), headers={"Accept-Encoding": "identity"})
+            respuesta.raise_for_status()
+            celdas = []
+            for _, funcion in casos:
+                tamano, segundos = _medir(funcion, respuesta.content, args.repeticiones)
+                celdas.append(f"{tamano / 1024:9.1f}K {segundos * 1000:7.2f}ms")
+            print(f"{endpoint:36} " + " ".join(f"{c:>20}" for c in celdas))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Benchmark de throughput con peticiones concurrentes.
+
+Compara el comportamiento anterior (cliente de Supabase síncrono que bloquea
+el event loop en cada consulta) contra el cliente asíncrono actual. Ambos
+modos usan un cliente simulado con la misma latencia por consulta, así que
+no se necesita un proyecto de Supabase.
+
+Uso (desde FastAPI/):
+    python -m bench.concurrencia --peticiones 200 --concurrencia 50 --latencia-ms 20
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+import httpx
+
+from database import get_db
+from main import app
+
+
+class _ConsultaSimulada:
+    """Imita la cadena table().select().eq().execute() de postgrest."""
+
+    def __init__(self, latencia: float, bloqueante: bool):
+        self._latencia = latencia
+        self._bloqueante = bloqueante
+
+    def __getattr__(self, nombre):
+        return lambda *args, **kwargs: self
+
+    async def execute(self):
+        if self._bloqueante:
+            # Equivale a llamar al Client síncrono dentro de un handler async
+            time.sleep(self._latencia)
+        else:
+            await asyncio.sleep(self._latencia)
+        return SimpleNamespace(data=[])
+
+
+class _ClienteSimulado:
+    def __init__(self, latencia: float, bloqueante: bool):
+        self._latencia = latencia
+        self._bloqueante = bloqueante
+
+    def table(self, nombre):
+        return _ConsultaSimulada(self._latencia, self._bloqueante)
+
+    def rpc(self, nombre, params=None):
+        return _ConsultaSimulada(self._latencia, self._bloqueante)
+
+
+async def _medir(peticiones: int, concurrencia: int, latencia: float, bloqueante: bool) -> float:
+    cliente = _ClienteSimulado(latencia, bloqueante)
+    app.dependency_overrides[get_db] = lambda: cliente
+    semaforo = asyncio.Semaphore(concurrencia)
+    url = f"/visitas/residencia/{uuid4()}"
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as http:
+        async def una_peticion():
+            async with semaforo:
+                respuesta = await http.get(url)
+                respuesta.raise_for_status()
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(una_peticion() for _ in range(peticiones)))
+        duracion = time.perf_counter() - inicio
+
+    app.dependency_overrides.pop(get_db, None)
+    return peticiones / duracion
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--latencia-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    latencia = args.latencia_ms / 1000
+    antes = await _medir(args.peticiones, args.concurrencia, latencia, bloqueante=True)
+    despues = await _medir(args.peticiones, args.concurrencia, latencia, bloqueante=False)
+
+    print(f"Peticiones: {args.peticiones}  concurrencia: {args.concurrencia}  latencia upstream: {args.latencia_ms} ms")
+    print(f"  cliente síncrono (antes):   {antes:8.1f} req/s")
+    print(f"  cliente asíncrono (ahora):  {despues:8.1f} req/s")
+    print(f"  mejora: x{despues / antes:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
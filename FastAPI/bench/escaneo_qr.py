@@ -0,0 +1,70 @@
+"""
+Microbenchmark del escaneo de QR en la caseta.
+
+Compara escaneos por segundo del flujo anterior (is_qr_valid + scan_qr +
+lectura de la visita: tres viajes) contra el token firmado (verificación
+local + un UPDATE condicional), ambos sobre SupabaseEnMemoria con la misma
+latencia por consulta. También mide cuántos tokens por segundo se verifican
+sin tocar la base.
+
+Uso (desde FastAPI/):
+    python -m bench.escaneo_qr --escaneos 2000 --concurrencia 100 --latencia-ms 15
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from crud.qr import generar_token_qr, verificar_token_qr
+from crud.visitas import scan_visita_qr, scan_visita_token
+from supabase_memoria import SupabaseEnMemoria
+
+
+async def _escaneos_por_segundo(escanear, objetivos, concurrencia):
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def uno(objetivo):
+        async with semaforo:
+            await escanear(objetivo)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(uno(o) for o in objetivos))
+    return len(objetivos) / (time.perf_counter() - inicio)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escaneos", type=int, default=2000)
+    parser.add_argument("--concurrencia", type=int, default=100)
+    parser.add_argument("--latencia-ms", type=float, default=15.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    db = SupabaseEnMemoria(latencia_ms=args.latencia_ms)
+    ids = db.sembrar(colonias=1, residencias_por_colonia=100, visitas_por_residencia=10)
+    vigentes = [v for v in db.tablas["visitas"] if v["id"] in set(ids["visitas_vigentes"])]
+    for visita in vigentes:
+        expira = datetime.fromisoformat(visita["fecha_expiracion"])
+        visita["codigo_qr"] = generar_token_qr(visita["id"], visita["residencia_id"], expira)
+
+    ids_objetivo = [vigentes[i % len(vigentes)]["id"] for i in range(args.escaneos)]
+    tokens_objetivo = [vigentes[i % len(vigentes)]["codigo_qr"] for i in range(args.escaneos)]
+
+    inicio = time.perf_counter()
+    for token in tokens_objetivo:
+        verificar_token_qr(token)
+    verificacion = len(tokens_objetivo) / (time.perf_counter() - inicio)
+
+    anterior = await _escaneos_por_segundo(lambda v: scan_visita_qr(v, db), ids_objetivo, args.concurrencia)
+    firmado = await _escaneos_por_segundo(lambda t: scan_visita_token(t, db), tokens_objetivo, args.concurrencia)
+
+    print(f"escaneos={args.escaneos} concurrencia={args.concurrencia} latencia={args.latencia_ms} ms")
+    print(f"  verificación local del token:      {verificacion:10.0f} tokens/s")
+    print(f"  rpc is_qr_valid + scan_qr + get:   {anterior:10.1f} escaneos/s")
+    print(f"  token firmado + UPDATE condicional: {firmado:10.1f} escaneos/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""
+Fan-out del bus de eventos.
+
+Suscribe N clientes a una colonia (y cada uno a su residencia), publica
+eventos y mide cuánto tarda `publicar` y cuántos eventos por segundo llegan
+a las colas. Con --lentos, una fracción de clientes no lee nunca: su cola
+se llena y se descartan sus eventos viejos sin frenar a los demás.
+
+Uso (desde FastAPI/):
+    python -m bench.eventos --suscriptores 5000 --eventos 200 --lentos 0.1
+"""
+
+import argparse
+import asyncio
+import time
+
+from crud.eventos import BusEventos
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suscriptores", type=int, default=5000)
+    parser.add_argument("--eventos", type=int, default=200)
+    parser.add_argument("--lentos", type=float, default=0.1, help="fracción de suscriptores que no leen")
+    parser.add_argument("--cola", type=int, default=100)
+    args = parser.parse_args()
+
+    bus = BusEventos(max_cola=args.cola)
+    suscripciones = [bus.suscribir("colonia:c", f"residencia:{i}") for i in range(args.suscriptores)]
+    lentos = int(args.suscriptores * args.lentos)
+    recibidos = 0
+
+    async def leer(suscripcion):
+        nonlocal recibidos
+        while True:
+            if await suscripcion.siguiente() is not None:
+                recibidos += 1
+
+    lectores = [asyncio.ensure_future(leer(s)) for s in suscripciones[lentos:]]
+
+    tiempos = []
+    inicio = time.perf_counter()
+    for n in range(args.eventos):
+        t = time.perf_counter()
+        bus.publicar(["colonia:c", f"residencia:{n % args.suscriptores}"], {"tipo": "creada", "n": n})
+        tiempos.append(time.perf_counter() - t)
+        await asyncio.sleep(0)
+    while recibidos < args.eventos * len(lectores) and time.perf_counter() - inicio < 30:
+        await asyncio.sleep(0.01)
+    total = time.perf_counter() - inicio
+    for lector in lectores:
+        lector.cancel()
+
+    tiempos.sort()
+    perdidos = sum(s.perdidos for s in suscripciones[:lentos])
+    print(f"{args.suscriptores} suscriptores ({lentos} sin leer), {args.eventos} eventos")
+    print(f"  publicar p50 {tiempos[len(tiempos) // 2] * 1000:.2f} ms  p99 {tiempos[int(len(tiempos) * 0.99)] * 1000:.2f} ms")
+    print(f"  entregados {recibidos}  ({recibidos / total:,.0f}/s)  descartados en clientes lentos {perdidos}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+Ráfaga de lecturas idénticas: con y sin coalescencia.
+
+Simula el momento en que una colonia manda un aviso y cientos de teléfonos
+piden a la vez /anuncios/colonia/{id} y /colonias/{id}/residencias. Cuenta
+las llamadas que llegaron a la base y las colapsadas, y verifica que todas
+las respuestas sean iguales.
+
+Uso (desde FastAPI/):
+    python -m bench.rafaga --peticiones 500 --latencia-ms 30
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+
+import metricas
+from crud import coalescencia
+from crud.anuncios import feed_cache
+from database import get_db
+from instrumentacion import ClienteInstrumentado
+from main import app
+from supabase_memoria import SupabaseEnMemoria
+
+
+def _contador(metrica, filtro):
+    return sum(n for etiquetas, n in metrica._valores.items() if filtro(etiquetas))
+
+
+async def _rafaga(http, url, peticiones):
+    feed_cache.limpiar()
+    antes_db = _contador(metricas.upstream_total, lambda e: True)
+    antes_col = _contador(coalescencia.llamadas_coalescidas, lambda e: e[1] == "colapsada")
+    inicio = time.perf_counter()
+    respuestas = await asyncio.gather(*(http.get(url) for _ in range(peticiones)))
+    segundos = time.perf_counter() - inicio
+    cuerpos = {r.content for r in respuestas}
+    assert all(r.status_code == 200 for r in respuestas), "hubo respuestas con error"
+    assert len(cuerpos) == 1, "las respuestas no coinciden"
+    return {
+        "llamadas_db": _contador(metricas.upstream_total, lambda e: True) - antes_db,
+        "colapsadas": _contador(coalescencia.llamadas_coalescidas, lambda e: e[1] == "colapsada") - antes_col,
+        "segundos": segundos,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=500)
+    parser.add_argument("--latencia-ms", type=float, default=30.0)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    db = SupabaseEnMemoria(latencia_ms=args.latencia_ms)
+    ids = db.sembrar(colonias=1, residencias_por_colonia=200, visitas_por_residencia=1)
+    cliente = ClienteInstrumentado(db)
+    app.dependency_overrides[get_db] = lambda: cliente
+    colonia = ids["colonias"][0]
+
+    limites = httpx.Limits(max_connections=None)
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", limits=limites, timeout=60) as http:
+        print(f"{args.peticiones} peticiones simultáneas, latencia de la base {args.latencia_ms} ms")
+        print(f"{'endpoint':32} {'coalescencia':>12} {'llamadas db':>12} {'colapsadas':>11} {'req/s':>9}")
+        for nombre in ("/anuncios/colonia/{id}", "/colonias/{id}/residencias"):
+            for activa in (False, True):
+                coalescencia.ACTIVA = activa
+                r = await _rafaga(http, nombre.replace("{id}", colonia), args.peticiones)
+                print(f"{nombre:32} {'sí' if activa else 'no':>12} {r['llamadas_db']:>12} {r['colapsadas']:>11} "
+                      f"{args.peticiones / r['segundos']:>9.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Microbenchmark de la serialización de listas de visitas.
+
+Compara, sobre N filas como las que devuelve PostgREST:
+- anterior: `[Visita(**fila) ...]` y después lo que hace FastAPI con el
+  response_model (model_dump, validar otra vez, dump a tipos JSON y json.dumps).
+- serializar: una validación con el TypeAdapter compilado y dump_json directo a bytes.
+- orjson (si está instalado): las filas tal cual, sin validar, como referencia
+  de lo que cuesta solo codificar.
+
+Uso (desde FastAPI/):
+    python -m bench.serializacion --filas 10000 --repeticiones 5
+"""
+
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from models.visita import Visita
+from routes.serializacion import adaptador, serializar
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _filas(n: int) -> List[dict]:
+    ahora = datetime.utcnow()
+    residencia_id, usuario_id = str(uuid.uuid4()), str(uuid.uuid4())
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "nombre_visitante": f"Visitante {i}",
+            "apellido_visitante": "Pérez",
+            "identificacion": f"INE{i:08d}",
+            "tipo": "Visita",
+            "fecha_programada": (ahora + timedelta(minutes=i)).isoformat(),
+            "residencia_id": residencia_id,
+            "usuario_id": usuario_id,
+            "codigo_qr": None,
+            "qr_activo": True,
+            "fecha_expiracion": (ahora + timedelta(hours=24)).isoformat(),
+            "activa": False,
+            "fecha_escaneo": None,
+            "escaneo_exitoso": False,
+            "created_at": ahora.isoformat(),
+            "updated_at": ahora.isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+def _anterior(filas: List[dict]) -> bytes:
+    modelos = [Visita(**fila) for fila in filas]
+    lista = adaptador(List[Visita])
+    validado = lista.validate_python([m.model_dump() for m in modelos])
+    return json.dumps(lista.dump_python(validado, mode="json")).encode()
+
+
+def _medir(funcion, filas, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cuerpo = funcion(filas)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), len(cuerpo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    filas = _filas(args.filas)
+    casos = [("anterior", _anterior), ("serializar", lambda f: serializar(Visita, f))]
+    if orjson is not None:
+        casos.append(("orjson sin validar", orjson.dumps))
+
+    base = None
+    print(f"{args.filas} visitas, mejor de {args.repeticiones}")
+    for nombre, funcion in casos:
+        segundos, tamano = _medir(funcion, filas, args.repeticiones)
+        base = base or segundos
+        print(f"  {nombre:<20} {segundos * 1000:8.1f} ms  {tamano / 1024:8.0f} KiB  x{base / segundos:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# pytest agrega este directorio a sys.path, así los tests importan crud, metricas, etc.
+# igual que la app: python -m pytest -q desde FastAPI/
+import os
+
+# Los tests usan SupabaseEnMemoria; con ella la app arranca sin QR_SECRET
+os.environ.setdefault("DB_BACKEND", "memoria")
@@ -0,0 +1,176 @@
+"""
+Analítica de visitas por colonia con agregados incrementales.
+
+Para el tablero de los administradores: visitas por día, por residencia y
+por tipo, tasa de escaneo y retraso promedio de llegada (fecha_escaneo
+menos fecha_programada). Los agregados de una colonia se calculan una vez
+recorriendo sus visitas por páginas y después se mantienen en memoria con
+cada alta, cambio, escaneo o baja, así que consultar el tablero cuesta
+O(días + residencias + tipos) y no O(visitas).
+
+Se guardan por día de fecha_programada (UTC); un rango desde/hasta suma
+solo los días que pide. De cada visita se recuerda su aporte, para que un
+cambio o una baja reste exactamente lo que había sumado.
+
+Como el manifiesto, el estado vive en el proceso: con varios workers cada
+uno mantiene su copia y ANALITICA_TTL_SEGUNDOS fuerza una reconstrucción
+periódica para que converjan (y para incluir residencias nuevas). La
+construcción y las actualizaciones pasan por crud/vistas_colonia.py.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import Counter
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, TYPE_CHECKING
+from uuid import UUID
+
+from crud.base import a_datetime
+from crud.paginacion import obtener_pagina, LIMITE_MAXIMO
+from crud.relaciones import TAMANO_BLOQUE_IN
+from crud.vistas_colonia import VistasPorColonia
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+ANALITICA_TTL_SEGUNDOS = int(os.getenv("ANALITICA_TTL_SEGUNDOS", "3600"))
+
+# Columnas que hacen falta para los agregados (más las del cursor)
+_COLUMNAS = 'id,created_at,residencia_id,tipo,fecha_programada,fecha_escaneo,escaneo_exitoso'
+
+
+class _Aporte(NamedTuple):
+    """Lo que una visita suma a los agregados."""
+    dia: date
+    residencia_id: str
+    tipo: str
+    escaneada: bool
+    retraso_segundos: Optional[float]
+
+
+class _Dia:
+    __slots__ = ("visitas", "escaneadas", "retraso_segundos", "con_retraso", "por_residencia", "por_tipo")
+
+    def __init__(self):
+        self.visitas = 0
+        self.escaneadas = 0
+        self.retraso_segundos = 0.0
+        self.con_retraso = 0
+        self.por_residencia: Counter = Counter()
+        self.por_tipo: Counter = Counter()
+
+
+def _aporte(visita: dict) -> Optional[_Aporte]:
+    programada = a_datetime(visita.get('fecha_programada'))
+    if programada is None:
+        return None
+    escaneada = bool(visita.get('escaneo_exitoso'))
+    escaneo = a_datetime(visita.get('fecha_escaneo')) if escaneada else None
+    retraso = (escaneo - programada).total_seconds() if escaneo is not None else None
+    return _Aporte(programada.date(), str(visita['residencia_id']), visita.get('tipo') or '', escaneada, retraso)
+
+
+class AnaliticaColonia:
+    def __init__(self, colonia_id: str):
+        self.colonia_id = colonia_id
+        self.construido = time.monotonic()
+        self.dias: Dict[date, _Dia] = {}
+        self.aportes: Dict[str, _Aporte] = {}
+
+    @property
+    def vencido(self) -> bool:
+        return time.monotonic() - self.construido > ANALITICA_TTL_SEGUNDOS
+
+    def _sumar(self, aporte: _Aporte, signo: int) -> None:
+        dia = self.dias.get(aporte.dia)
+        if dia is None:
+            dia = self.dias[aporte.dia] = _Dia()
+        dia.visitas += signo
+        dia.por_residencia[aporte.residencia_id] += signo
+        dia.por_tipo[aporte.tipo] += signo
+        if aporte.escaneada:
+            dia.escaneadas += signo
+        if aporte.retraso_segundos is not None:
+            dia.retraso_segundos += signo * aporte.retraso_segundos
+            dia.con_retraso += signo
+        if signo < 0:
+            if dia.visitas == 0:
+                del self.dias[aporte.dia]
+                return
+            for contador, clave in ((dia.por_residencia, aporte.residencia_id), (dia.por_tipo, aporte.tipo)):
+                if contador[clave] == 0:
+                    del contador[clave]
+
+    def aplicar(self, visita_id: str, aporte: Optional[_Aporte]) -> None:
+        """Reemplaza el aporte de la visita (None la quita)."""
+        anterior = self.aportes.pop(visita_id, None)
+        if anterior == aporte:
+            if aporte is not None:
+                self.aportes[visita_id] = aporte
+            return
+        if anterior is not None:
+            self._sumar(anterior, -1)
+        if aporte is not None:
+            self._sumar(aporte, 1)
+            self.aportes[visita_id] = aporte
+
+    def resumen(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> dict:
+        por_dia = []
+        por_residencia: Counter = Counter()
+        por_tipo: Counter = Counter()
+        visitas = escaneadas = con_retraso = 0
+        retraso = 0.0
+        for fecha in sorted(self.dias):
+            if (desde and fecha < desde) or (hasta and fecha > hasta):
+                continue
+            dia = self.dias[fecha]
+            por_dia.append({'fecha': fecha, 'visitas': dia.visitas, 'escaneadas': dia.escaneadas})
+            por_residencia.update(dia.por_residencia)
+            por_tipo.update(dia.por_tipo)
+            visitas += dia.visitas
+            escaneadas += dia.escaneadas
+            retraso += dia.retraso_segundos
+            con_retraso += dia.con_retraso
+        return {
+            'colonia_id': self.colonia_id,
+            'desde': desde,
+            'hasta': hasta,
+            'visitas': visitas,
+            'escaneadas': escaneadas,
+            'tasa_escaneo': round(escaneadas / visitas, 4) if visitas else None,
+            'retraso_promedio_minutos': round(retraso / con_retraso / 60, 2) if con_retraso else None,
+            'por_dia': por_dia,
+            'por_residencia': dict(por_residencia),
+            'por_tipo': dict(por_tipo),
+        }
+
+
+async def _construir(colonia_id: str, residencias: List[dict], db: AsyncClient,
+                     anterior: Optional[AnaliticaColonia]) -> AnaliticaColonia:
+    ids = [str(r['id']) for r in residencias]
+    analitica = AnaliticaColonia(colonia_id)
+
+    for i in range(0, len(ids), TAMANO_BLOQUE_IN):
+        cursor = None
+        while True:
+            query = db.table('visitas').select(_COLUMNAS).in_('residencia_id', ids[i:i + TAMANO_BLOQUE_IN])
+            lote, cursor = await obtener_pagina(query, LIMITE_MAXIMO, cursor)
+            for visita in lote:
+                analitica.aplicar(str(visita['id']), _aporte(visita))
+            if cursor is None:
+                break
+    return analitica
+
+
+_analiticas = VistasPorColonia(
+    _construir,
+    lambda analitica, visita: analitica.aplicar(str(visita['id']), _aporte(visita)),
+    lambda analitica, visita_id: analitica.aplicar(visita_id, None),
+)
+
+
+async def get_analitica(colonia_id: UUID, db: AsyncClient) -> AnaliticaColonia:
+    """Devuelve los agregados de la colonia, construyéndolos si hace falta."""
+    return await _analiticas.obtener(colonia_id, db)
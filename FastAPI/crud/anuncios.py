@@ -1,12 +1,35 @@
+from __future__ import annotations
+
 from fastapi import HTTPException
-from supabase import Client
 from uuid import UUID, uuid4
 from datetime import datetime
 from models.anuncio import Anuncio, AnuncioCreate
 from crud.base import serialize_model
-from typing import List, Optional
+from crud.paginacion import obtener_pagina, LIMITE_POR_DEFECTO
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+from crud.cache import CacheTTL
+from crud.coalescencia import coalescer
+import os
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+# Feed de anuncios por colonia; se invalida al crear, editar o borrar anuncios
+feed_cache = CacheTTL(
+    "anuncios_feed",
+    max_entradas=int(os.getenv("ANUNCIOS_CACHE_MAX", "1000")),
+    ttl_segundos=float(os.getenv("ANUNCIOS_CACHE_TTL", "30")),
+)
+
+# Tabla a la que el barrido mueve los anuncios expirados. Debe existir en la base
+# con las mismas columnas que anuncios; sin definirla el barrido no toca anuncios
+ANUNCIOS_ARCHIVO_TABLA = os.getenv("ANUNCIOS_ARCHIVO_TABLA") or None
 
-def create_anuncio(anuncio_data: AnuncioCreate, db: Client) -> Anuncio:
+# Generación del feed por colonia: cada escritura la incrementa, y una lectura
+# que empezó antes solo guarda su resultado en caché si no cambió
+_generacion_feed: Dict[str, int] = {}
+
+async def create_anuncio(anuncio_data: AnuncioCreate, db: AsyncClient) -> Anuncio:
     """Crea un nuevo anuncio en la colonia."""
     # Crear el objeto Anuncio completo
     anuncio = Anuncio(
@@ -23,50 +46,60 @@ def create_anuncio(anuncio_data: AnuncioCreate, db: Client) -> Anuncio:
     serialized_data = serialize_model(anuncio)
     
     # Insertar en la base de datos
-    response = db.table('anuncios').insert(serialized_data).execute()
+    response = await db.table('anuncios').insert(serialized_data).execute()
     
     if len(response.data) > 0:
+        _invalidar_feed(str(anuncio.colonia_id))
         return anuncio
     raise HTTPException(status_code=500, detail="Error al crear el anuncio")
 
-def get_anuncios(db: Client) -> List[Anuncio]:
-    """Obtiene todos los anuncios."""
-    response = db.table('anuncios').select('*').execute()
-    return [Anuncio(**item) for item in response.data]
+async def get_anuncios(db: AsyncClient, limit: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None) -> Tuple[List[Anuncio], Optional[str]]:
+    """Obtiene una página de anuncios. Devuelve (anuncios, next_cursor)."""
+    filas, next_cursor = await obtener_pagina(db.table('anuncios').select('*'), limit, cursor)
+    return [Anuncio(**item) for item in filas], next_cursor
 
-def get_anuncio_by_id(anuncio_id: UUID, db: Client) -> Optional[Anuncio]:
+async def get_anuncio_by_id(anuncio_id: UUID, db: AsyncClient) -> Optional[Anuncio]:
     """Obtiene un anuncio por su ID."""
-    response = db.table('anuncios').select('*').eq('id', str(anuncio_id)).execute()
+    response = await db.table('anuncios').select('*').eq('id', str(anuncio_id)).execute()
     if response.data and len(response.data) > 0:
         return Anuncio(**response.data[0])
     return None
 
-def get_anuncios_by_colonia(colonia_id: UUID, db: Client) -> List[Anuncio]:
-    """Obtiene todos los anuncios de una colonia específica."""
+def _invalidar_feed(colonia_id) -> None:
+    clave = str(colonia_id)
+    _generacion_feed[clave] = _generacion_feed.get(clave, 0) + 1
+    feed_cache.invalidar(clave)
+    _cargar_feed.olvidar(colonia_id)
+
+@coalescer("anuncios_por_colonia")
+async def _cargar_feed(colonia_id: UUID, db: AsyncClient) -> List[Anuncio]:
+    """Consulta el feed. Las peticiones simultáneas comparten la consulta."""
+    # La base filtra los expirados y ordena por importancia y fecha de publicación
+    response = await db.table('anuncios').select('*').eq('colonia_id', str(colonia_id)).or_(
+        f'fecha_expiracion.is.null,fecha_expiracion.gt."{datetime.utcnow().isoformat()}"'
+    ).order('importante', desc=True).order('fecha_publicacion', desc=True).execute()
+    return [Anuncio(**anuncio_data) for anuncio_data in response.data]
+
+async def get_anuncios_by_colonia(colonia_id: UUID, db: AsyncClient) -> List[Anuncio]:
+    """Obtiene los anuncios vigentes de una colonia, importantes y más recientes primero."""
+    clave = str(colonia_id)
+    anuncios = feed_cache.get(clave)
+    if anuncios is None:
+        generacion = _generacion_feed.get(clave, 0)
+        anuncios = await _cargar_feed(colonia_id, db)
+        # Si hubo una escritura mientras se consultaba, lo leído ya es viejo: no se guarda
+        if _generacion_feed.get(clave, 0) == generacion:
+            feed_cache.set(clave, anuncios)
+        return anuncios
+
+    # Un anuncio en caché puede haber expirado después de guardarse
     ahora = datetime.utcnow()
-    
-    # Obtenemos anuncios que son válidos (no expirados o sin fecha de expiración)
-    response = db.table('anuncios').select('*').eq('colonia_id', str(colonia_id)).execute()
-    
-    # Filtramos manualmente los anuncios expirados
-    anuncios_validos = []
-    for anuncio_data in response.data:
-        # Convertir a objeto Anuncio
-        anuncio = Anuncio(**anuncio_data)
-        
-        # Verificar si el anuncio no ha expirado
-        if anuncio.fecha_expiracion is None or anuncio.fecha_expiracion > ahora:
-            anuncios_validos.append(anuncio)
-    
-    # Ordenar por importancia y fecha de publicación (más recientes primero)
-    anuncios_validos.sort(key=lambda x: (not x.importante, x.fecha_publicacion), reverse=True)
-    
-    return anuncios_validos
+    return [a for a in anuncios if a.fecha_expiracion is None or a.fecha_expiracion > ahora]
 
-def update_anuncio(anuncio_id: UUID, anuncio_data: dict, db: Client) -> Optional[Anuncio]:
+async def update_anuncio(anuncio_id: UUID, anuncio_data: dict, db: AsyncClient) -> Optional[Anuncio]:
     """Actualiza un anuncio existente."""
     # Verificar que el anuncio existe
-    existing = get_anuncio_by_id(anuncio_id, db)
+    existing = await get_anuncio_by_id(anuncio_id, db)
     if not existing:
         return None
     
@@ -74,16 +107,42 @@ def update_anuncio(anuncio_id: UUID, anuncio_data: dict, db: Client) -> Optional
     anuncio_data['updated_at'] = datetime.utcnow().isoformat()
     
     # Actualizar en la base de datos
-    response = db.table('anuncios').update(anuncio_data).eq('id', str(anuncio_id)).execute()
+    response = await db.table('anuncios').update(anuncio_data).eq('id', str(anuncio_id)).execute()
     
     if response.data and len(response.data) > 0:
-        return Anuncio(**response.data[0])
+        actualizado = Anuncio(**response.data[0])
+        _invalidar_feed(str(existing.colonia_id))
+        _invalidar_feed(str(actualizado.colonia_id))
+        return actualizado
     return None
 
-def delete_anuncio(anuncio_id: UUID, db: Client) -> bool:
+async def delete_anuncio(anuncio_id: UUID, db: AsyncClient) -> bool:
     """Elimina un anuncio por su ID."""
-    response = db.table('anuncios').delete().eq('id', str(anuncio_id)).execute()
+    response = await db.table('anuncios').delete().eq('id', str(anuncio_id)).execute()
     
     if response.data and len(response.data) > 0:
+        for eliminado in response.data:
+            _invalidar_feed(str(eliminado['colonia_id']))
         return True
-    return False
\ No newline at end of file
+    return False
+
+
+async def archivar_anuncios_expirados(db: AsyncClient, lote: int) -> int:
+    """
+    Mueve hasta `lote` anuncios expirados a ANUNCIOS_ARCHIVO_TABLA. Se borran
+    de anuncios solo después de copiarlos; la copia es un upsert, así que
+    repetir un lote que falló a medias no duplica filas. Devuelve cuántos movió.
+    """
+    ahora = datetime.utcnow().isoformat()
+    response = await db.table('anuncios').select('*').lt('fecha_expiracion', ahora).order('fecha_expiracion').limit(lote).execute()
+    if not response.data:
+        return 0
+
+    await db.table(ANUNCIOS_ARCHIVO_TABLA).upsert(response.data).execute()
+    # Se repite la condición: si otra petición extendió la expiración entre la
+    # copia y el borrado, el anuncio se queda (la copia archivada es inofensiva)
+    response = await db.table('anuncios').delete().in_('id', [str(a['id']) for a in response.data]).lt(
+        'fecha_expiracion', ahora).execute()
+    for colonia_id in {str(a['colonia_id']) for a in response.data}:
+        _invalidar_feed(colonia_id)
+    return len(response.data)
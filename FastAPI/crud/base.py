@@ -1,14 +1,30 @@
+from datetime import date, datetime, timezone
+from typing import Optional
 from uuid import UUID
-from datetime import datetime
+
 
 def serialize_model(model):
-    """Convierte un modelo Pydantic a un diccionario serializable para JSON"""
-    data = {}
-    for key, value in model.dict().items():
-        if isinstance(value, UUID):
-            data[key] = str(value)
-        elif isinstance(value, datetime):
-            data[key] = value.isoformat()
-        else:
-            data[key] = value
-    return data
\ No newline at end of file
+    """Convierte un modelo Pydantic a un diccionario serializable para JSON (UUID y fechas como texto)"""
+    return model.model_dump(mode="json")
+
+
+def serialize_fila(fila: dict) -> dict:
+    """
+    Fila de la base con UUID y fechas como texto ISO, como las devuelve
+    PostgREST. Las filas de asyncpg traen UUID y datetime.
+    """
+    return {
+        campo: valor.isoformat() if isinstance(valor, (date, datetime))
+        else str(valor) if isinstance(valor, UUID) else valor
+        for campo, valor in fila.items()
+    }
+
+
+def a_datetime(valor) -> Optional[datetime]:
+    """Convierte una fecha de la base (texto ISO o datetime) a datetime UTC sin zona."""
+    if valor is None:
+        return None
+    fecha = valor if isinstance(valor, datetime) else datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
@@ -0,0 +1,87 @@
+"""
+Caché en memoria con expiración (TTL) y desalojo LRU.
+
+Es local al proceso: cada worker tiene la suya. Las funciones de crud que
+escriben invalidan las claves afectadas y el TTL acota cuánto puede durar
+un dato viejo en otros workers.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Todas las cachés creadas, por nombre, para reportar sus contadores
+CACHES: Dict[str, "CacheTTL"] = {}
+
+
+class CacheTTL:
+    def __init__(self, nombre: str, max_entradas: int = 1000, ttl_segundos: float = 60.0):
+        self.nombre = nombre
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+        CACHES[nombre] = self
+
+    def get(self, clave: Hashable, default: Any = None) -> Any:
+        """Devuelve el valor vigente o `default` si no está o ya expiró."""
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return default
+        expira, valor = entrada
+        if expira < time.monotonic():
+            del self._datos[clave]
+            self.fallos += 1
+            return default
+        self._datos.move_to_end(clave)
+        self.aciertos += 1
+        return valor
+
+    def set(self, clave: Hashable, valor: Any, ttl_segundos: Optional[float] = None) -> None:
+        ttl = self.ttl_segundos if ttl_segundos is None else ttl_segundos
+        self._datos[clave] = (time.monotonic() + ttl, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_entradas:
+            self._datos.popitem(last=False)
+            self.desalojos += 1
+
+    def invalidar(self, clave: Hashable) -> None:
+        if self._datos.pop(clave, None) is not None:
+            self.invalidaciones += 1
+
+    def limpiar(self) -> None:
+        self._datos.clear()
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def estadisticas(self) -> dict:
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._datos),
+            'max_entradas': self.max_entradas,
+            'ttl_segundos': self.ttl_segundos,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            'desalojos': self.desalojos,
+            'invalidaciones': self.invalidaciones,
+        }
+
+
+def crear_cache_entidades(nombre: str) -> CacheTTL:
+    """Caché para búsquedas por id, configurada con ENTIDADES_CACHE_MAX / ENTIDADES_CACHE_TTL."""
+    return CacheTTL(
+        nombre,
+        max_entradas=int(os.getenv("ENTIDADES_CACHE_MAX", "10000")),
+        ttl_segundos=float(os.getenv("ENTIDADES_CACHE_TTL", "60")),
+    )
+
+
+def estadisticas_caches() -> Dict[str, dict]:
+    return {nombre: cache.estadisticas() for nombre, cache in CACHES.items()}
@@ -0,0 +1,79 @@
+"""
+Coalescencia de lecturas concurrentes idénticas (single-flight).
+
+Cuando cientos de teléfonos piden lo mismo a la vez (p. ej. el feed de una
+colonia justo después de un aviso), solo la primera llamada va a la base;
+las que llegan mientras está en vuelo esperan ese mismo resultado.
+
+    @coalescer("residencias_por_colonia")
+    async def get_residencias_by_colonia(colonia_id, db): ...
+
+La clave son los argumentos de la función salvo `db`. El resultado se
+comparte entre todos los que esperaban: no debe modificarse. La llamada
+corre en su propia tarea, así que si el cliente que la inició se desconecta
+los demás siguen recibiendo el resultado.
+
+Los contadores (llamadas que fueron a la base y llamadas colapsadas) se
+publican en /metrics. COALESCENCIA=0 desactiva el mecanismo.
+"""
+
+import asyncio
+import functools
+import inspect
+import os
+from typing import Dict, Hashable
+
+import metricas
+
+ACTIVA = os.getenv("COALESCENCIA", "1") != "0"
+
+llamadas_coalescidas = metricas.Contador(
+    "smartcolonia_coalescencia_llamadas_total",
+    "Lecturas coalescibles: 'ejecutada' fue a la base, 'colapsada' esperó una en vuelo.",
+    ("funcion", "resultado"),
+)
+
+
+def coalescer(nombre: str):
+    """Decorador para funciones async de crud que solo leen."""
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+        en_vuelo: Dict[Hashable, asyncio.Task] = {}
+
+        def clave(args, kwargs) -> Hashable:
+            argumentos = firma.bind_partial(*args, **kwargs)
+            argumentos.apply_defaults()
+            return tuple((k, str(v)) for k, v in argumentos.arguments.items() if k != "db")
+
+        @functools.wraps(funcion)
+        async def envoltura(*args, **kwargs):
+            if not ACTIVA:
+                return await funcion(*args, **kwargs)
+
+            k = clave(args, kwargs)
+            tarea = en_vuelo.get(k)
+            if tarea is None:
+                tarea = asyncio.ensure_future(funcion(*args, **kwargs))
+                en_vuelo[k] = tarea
+                tarea.add_done_callback(functools.partial(_terminar, en_vuelo, k))
+                llamadas_coalescidas.incrementar((nombre, "ejecutada"))
+            else:
+                llamadas_coalescidas.incrementar((nombre, "colapsada"))
+            # shield: cancelar a uno de los que esperan no cancela la consulta de los demás
+            return await asyncio.shield(tarea)
+
+        def olvidar(*args, **kwargs) -> None:
+            """Tras una escritura, las lecturas nuevas no se unen a la que ya estaba en vuelo."""
+            en_vuelo.pop(clave(args, kwargs), None)
+
+        envoltura.olvidar = olvidar
+        return envoltura
+    return decorador
+
+
+def _terminar(en_vuelo: Dict[Hashable, asyncio.Task], clave: Hashable, tarea: asyncio.Task) -> None:
+    if en_vuelo.get(clave) is tarea:
+        del en_vuelo[clave]
+    # Marca la excepción como leída aunque todos los que esperaban se hayan cancelado
+    if not tarea.cancelled():
+        tarea.exception()
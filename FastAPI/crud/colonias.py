@@ -1,36 +1,51 @@
+from __future__ import annotations
+
 from fastapi import HTTPException
-from supabase import Client
+from typing import Optional, TYPE_CHECKING
 from uuid import UUID
+from datetime import datetime
 
 from models.colonia import Colonia
 from crud.base import serialize_model
+from crud.paginacion import obtener_pagina, LIMITE_POR_DEFECTO
+from crud.cache import crear_cache_entidades
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+colonias_cache = crear_cache_entidades("colonias")
 
-def create_colonia(colonia, db: Client):
+async def create_colonia(colonia, db: AsyncClient):
     """Crea una nueva colonia."""
     # Serializa el modelo correctamente
     serialized_data = serialize_model(colonia)
-    response = db.table('colonias').insert(serialized_data).execute()
+    response = await db.table('colonias').insert(serialized_data).execute()
     
     if len(response.data) > 0:
         return colonia
     raise HTTPException(status_code=500, detail="Error al crear la colonia")
 
-def get_colonias(db: Client):
-    """Obtiene todas las colonias."""
-    response = db.table('colonias').select('*').execute()
-    return response.data
+async def get_colonias(db: AsyncClient, limit: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None):
+    """Obtiene una página de colonias. Devuelve (colonias, next_cursor)."""
+    return await obtener_pagina(db.table('colonias').select('*'), limit, cursor)
+
+async def get_colonia_by_id(colonia_id: UUID, db: AsyncClient):
+    """Obtiene una colonia por su ID (primero busca en la caché)."""
+    colonia = colonias_cache.get(str(colonia_id))
+    if colonia is not None:
+        return colonia
 
-def get_colonia_by_id(colonia_id: UUID, db: Client):
-    """Obtiene una colonia por su ID."""
-    response = db.table('colonias').select('*').eq('id', str(colonia_id)).execute()
+    response = await db.table('colonias').select('*').eq('id', str(colonia_id)).execute()
     if response.data and len(response.data) > 0:
-        return Colonia(**response.data[0])
+        colonia = Colonia(**response.data[0])
+        colonias_cache.set(str(colonia_id), colonia)
+        return colonia
     return None
 
-def update_colonia(colonia_id: UUID, colonia_data, db: Client):
+async def update_colonia(colonia_id: UUID, colonia_data, db: AsyncClient):
     """Actualiza los datos de una colonia existente."""
     # Primero verificamos que la colonia exista
-    existing = get_colonia_by_id(colonia_id, db)
+    existing = await get_colonia_by_id(colonia_id, db)
     if not existing:
         raise HTTPException(status_code=404, detail="Colonia no encontrada")
     
@@ -42,22 +57,28 @@ def update_colonia(colonia_id: UUID, colonia_data, db: Client):
         else:
             update_data[key] = value
     
+    # Se actualiza updated_at para que los ETag de las lecturas cambien
+    update_data['updated_at'] = datetime.utcnow().isoformat()
+
     # Actualizamos la colonia
-    response = db.table('colonias').update(update_data).eq('id', str(colonia_id)).execute()
+    response = await db.table('colonias').update(update_data).eq('id', str(colonia_id)).execute()
     
+    colonias_cache.invalidar(str(colonia_id))
     if response.data and len(response.data) > 0:
-        return get_colonia_by_id(colonia_id, db)
+        # La respuesta del update ya trae la fila actualizada
+        return Colonia(**response.data[0])
     raise HTTPException(status_code=500, detail="Error al actualizar la colonia")
 
-def delete_colonia(colonia_id: UUID, db: Client):
+async def delete_colonia(colonia_id: UUID, db: AsyncClient):
     """Elimina una colonia por su ID."""
     # Primero verificamos que la colonia exista
-    existing = get_colonia_by_id(colonia_id, db)
+    existing = await get_colonia_by_id(colonia_id, db)
     if not existing:
         raise HTTPException(status_code=404, detail="Colonia no encontrada")
     
     # Eliminamos la colonia
-    response = db.table('colonias').delete().eq('id', str(colonia_id)).execute()
+    response = await db.table('colonias').delete().eq('id', str(colonia_id)).execute()
+    colonias_cache.invalidar(str(colonia_id))
     
     if response.data is not None:
         return True
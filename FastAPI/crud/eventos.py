@@ -0,0 +1,129 @@
+"""
+Bus de eventos en el proceso para avisar de cambios en las visitas.
+
+Los residentes y la caseta se suscriben por WebSocket o SSE a un canal
+("residencia:<id>" o "colonia:<id>") en lugar de consultar la lista de
+visitas cada pocos segundos. crud publica un evento cuando una visita se
+crea, se actualiza, se escanea, se elimina o expira.
+
+- Fan-out: el evento se serializa una vez y el mismo texto se encola para
+  todos los suscriptores de los canales, sin esperar a ninguno.
+- Contrapresión: cada suscriptor tiene una cola acotada (EVENTOS_COLA_MAX).
+  Si un cliente lento la llena se descarta su evento más viejo y se cuenta
+  en `perdidos`; al cliente le llega un evento "desfase" para que vuelva a
+  pedir la lista completa. Publicar nunca bloquea una petición.
+
+El bus es local al proceso: con varios workers, cada suscriptor recibe los
+eventos de las escrituras que atendió su mismo worker.
+"""
+
+import asyncio
+import json
+import os
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set
+
+import metricas
+
+EVENTOS_COLA_MAX = int(os.getenv("EVENTOS_COLA_MAX", "100"))
+
+eventos_publicados = metricas.Contador(
+    "smartcolonia_eventos_publicados_total", "Eventos publicados en el bus, por tipo.", ("tipo",))
+eventos_entregados = metricas.Contador(
+    "smartcolonia_eventos_entregados_total", "Eventos encolados a suscriptores.")
+eventos_descartados = metricas.Contador(
+    "smartcolonia_eventos_descartados_total", "Eventos descartados porque la cola del suscriptor estaba llena.")
+suscriptores_activos = metricas.Medidor(
+    "smartcolonia_eventos_suscriptores", "Suscripciones abiertas por tipo de canal.", ("canal",))
+
+
+def _tipo_canal(canal: str) -> str:
+    return canal.split(":", 1)[0]
+
+
+class Suscripcion:
+    """Cola acotada de eventos (ya serializados a JSON) de uno o más canales."""
+
+    def __init__(self, bus: "BusEventos", canales: Iterable[str], max_cola: int):
+        self.bus = bus
+        self.canales = tuple(canales)
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=max_cola)
+        self.perdidos = 0
+
+    def _entregar(self, mensaje: str) -> None:
+        try:
+            self.cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            self.cola.get_nowait()
+            self.cola.put_nowait(mensaje)
+            self.perdidos += 1
+            eventos_descartados.incrementar()
+
+    async def siguiente(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Espera el próximo evento; None si pasa `timeout` sin eventos. Si se
+        descartaron eventos desde la última lectura, primero entrega un "desfase".
+        """
+        if self.perdidos:
+            perdidos, self.perdidos = self.perdidos, 0
+            return json.dumps({"tipo": "desfase", "perdidos": perdidos})
+        try:
+            return await asyncio.wait_for(self.cola.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def cerrar(self) -> None:
+        self.bus.cancelar(self)
+
+    def __enter__(self) -> "Suscripcion":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
+
+
+class BusEventos:
+    def __init__(self, max_cola: int = EVENTOS_COLA_MAX):
+        self.max_cola = max_cola
+        self._canales: Dict[str, Set[Suscripcion]] = {}
+        self._por_tipo: Counter = Counter()
+
+    def suscribir(self, *canales: str) -> Suscripcion:
+        suscripcion = Suscripcion(self, canales, self.max_cola)
+        for canal in canales:
+            self._canales.setdefault(canal, set()).add(suscripcion)
+            self._por_tipo[_tipo_canal(canal)] += 1
+            suscriptores_activos.sumar((_tipo_canal(canal),))
+        return suscripcion
+
+    def cancelar(self, suscripcion: Suscripcion) -> None:
+        for canal in suscripcion.canales:
+            suscriptores = self._canales.get(canal)
+            if suscriptores is None or suscripcion not in suscriptores:
+                continue
+            suscriptores.discard(suscripcion)
+            if not suscriptores:
+                del self._canales[canal]
+            self._por_tipo[_tipo_canal(canal)] -= 1
+            suscriptores_activos.sumar((_tipo_canal(canal),), -1)
+
+    def hay_suscriptores(self, tipo_canal: str) -> bool:
+        """True si hay al menos una suscripción a algún canal de ese tipo ("residencia", "colonia")."""
+        return self._por_tipo[tipo_canal] > 0
+
+    def publicar(self, canales: Iterable[str], evento: dict) -> int:
+        """Encola el evento para los suscriptores de `canales`. Devuelve a cuántos se entregó."""
+        eventos_publicados.incrementar((evento.get("tipo", ""),))
+        destinatarios = set()
+        for canal in canales:
+            destinatarios.update(self._canales.get(canal, ()))
+        if not destinatarios:
+            return 0
+        mensaje = json.dumps(evento, default=str, ensure_ascii=False)
+        for suscripcion in destinatarios:
+            suscripcion._entregar(mensaje)
+        eventos_entregados.incrementar(cantidad=len(destinatarios))
+        return len(destinatarios)
+
+
+bus = BusEventos()
@@ -0,0 +1,173 @@
+"""
+Índice en memoria de las visitas de cada colonia ordenadas por fecha_programada.
+
+La caseta y los administradores consultan una y otra vez ventanas cortas
+alrededor de ahora ("¿quién llega en las próximas dos horas?"). En lugar de
+un escaneo de rango en la base por consulta, cada colonia mantiene la lista
+ordenada de (fecha_programada, id) de sus visitas dentro de una ventana de
+±INDICE_VISITAS_HORAS alrededor del momento en que se construyó, y las
+consultas de rango y de "próximas N llegadas" se resuelven con bisección.
+
+- Las escrituras de crud (alta, cambio, escaneo, baja) actualizan el índice
+  de la colonia si ya existe, como el manifiesto y la analítica (ver
+  crud/vistas_colonia.py).
+- Un rango que se sale de la ventana va a la base, igual que antes.
+- INDICE_VISITAS_TTL_SEGUNDOS fuerza la reconstrucción: así la ventana se
+  desplaza con el reloj y los workers convergen con las escrituras que
+  atendieron otros procesos.
+
+Las filas se guardan como las devuelve la base (dicts) y se comparten entre
+consultas: no deben modificarse.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+from uuid import UUID
+
+import metricas
+from crud.base import a_datetime
+from crud.paginacion import obtener_pagina, LIMITE_MAXIMO
+from crud.relaciones import TAMANO_BLOQUE_IN
+from crud.vistas_colonia import VistasPorColonia
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+INDICE_VISITAS_HORAS = int(os.getenv("INDICE_VISITAS_HORAS", "48"))
+INDICE_VISITAS_TTL_SEGUNDOS = int(os.getenv("INDICE_VISITAS_TTL_SEGUNDOS", "120"))
+
+# Mayor que cualquier id: (fecha, _FIN) queda después de todas las visitas de esa fecha
+_FIN = "\uffff"
+
+consultas_indice = metricas.Contador(
+    "smartcolonia_indice_visitas_consultas_total",
+    "Consultas por fecha de visitas: 'indice' se resolvió en memoria, 'base' cayó a la base.",
+    ("resultado",),
+)
+
+
+class IndiceColonia:
+    def __init__(self, colonia_id: str, residencias: List[str], ahora: datetime):
+        self.colonia_id = colonia_id
+        self.residencias = residencias
+        self.inicio = ahora - timedelta(hours=INDICE_VISITAS_HORAS)
+        self.fin = ahora + timedelta(hours=INDICE_VISITAS_HORAS)
+        self.construido = time.monotonic()
+        self.claves: List[Tuple[datetime, str]] = []
+        self.filas: Dict[str, Tuple[Tuple[datetime, str], dict]] = {}
+
+    @property
+    def vencido(self) -> bool:
+        return time.monotonic() - self.construido > INDICE_VISITAS_TTL_SEGUNDOS
+
+    def cubre(self, inicio: datetime, fin: datetime) -> bool:
+        return self.inicio <= inicio and fin <= self.fin
+
+    def agregar_residencia(self, residencia: dict) -> None:
+        # Para que las consultas que caen a la base incluyan sus visitas
+        if str(residencia['id']) not in self.residencias:
+            self.residencias.append(str(residencia['id']))
+
+    def quitar(self, visita_id: str) -> None:
+        anterior = self.filas.pop(visita_id, None)
+        if anterior is not None:
+            del self.claves[bisect_left(self.claves, anterior[0])]
+
+    def poner(self, fila: dict) -> None:
+        visita_id = str(fila['id'])
+        self.quitar(visita_id)
+        programada = a_datetime(fila.get('fecha_programada'))
+        if programada is None or not self.inicio <= programada <= self.fin:
+            return
+        clave = (programada, visita_id)
+        insort(self.claves, clave)
+        self.filas[visita_id] = (clave, fila)
+
+    def rango(self, inicio: datetime, fin: datetime) -> List[dict]:
+        """Visitas con inicio <= fecha_programada <= fin, en orden de fecha."""
+        desde = bisect_left(self.claves, (inicio, ""))
+        hasta = bisect_right(self.claves, (fin, _FIN))
+        return [self.filas[visita_id][1] for _, visita_id in self.claves[desde:hasta]]
+
+    def proximas(self, ahora: datetime, cantidad: int) -> Optional[List[dict]]:
+        """
+        Las siguientes `cantidad` visitas sin escanear a partir de `ahora`, o
+        None si la ventana se acaba antes de juntarlas.
+        """
+        resultado = []
+        for _, visita_id in self.claves[bisect_left(self.claves, (ahora, "")):]:
+            fila = self.filas[visita_id][1]
+            if fila.get('escaneo_exitoso') or not fila.get('qr_activo', True):
+                continue
+            resultado.append(fila)
+            if len(resultado) == cantidad:
+                return resultado
+        return None
+
+
+async def _construir(colonia_id: str, residencias: List[dict], db: AsyncClient,
+                     anterior: Optional[IndiceColonia]) -> IndiceColonia:
+    ids = [str(r['id']) for r in residencias]
+    indice = IndiceColonia(colonia_id, ids, datetime.utcnow())
+
+    for i in range(0, len(ids), TAMANO_BLOQUE_IN):
+        cursor = None
+        while True:
+            query = db.table('visitas').select('*').in_('residencia_id', ids[i:i + TAMANO_BLOQUE_IN]).gte(
+                'fecha_programada', indice.inicio.isoformat()).lte('fecha_programada', indice.fin.isoformat())
+            lote, cursor = await obtener_pagina(query, LIMITE_MAXIMO, cursor)
+            for fila in lote:
+                indice.poner(fila)
+            if cursor is None:
+                break
+    return indice
+
+
+_indices = VistasPorColonia(_construir, IndiceColonia.poner, IndiceColonia.quitar, IndiceColonia.agregar_residencia)
+
+
+async def get_indice(colonia_id: UUID, db: AsyncClient) -> IndiceColonia:
+    """Devuelve el índice de la colonia, construyéndolo si hace falta."""
+    return await _indices.obtener(colonia_id, db)
+
+
+async def visitas_por_fecha(colonia_id: UUID, fecha_inicio: datetime, fecha_fin: datetime, db: AsyncClient) -> List[dict]:
+    """Visitas de la colonia programadas en [fecha_inicio, fecha_fin]."""
+    inicio, fin = a_datetime(fecha_inicio), a_datetime(fecha_fin)
+    indice = await get_indice(colonia_id, db)
+    if indice.cubre(inicio, fin):
+        consultas_indice.incrementar(("indice",))
+        return indice.rango(inicio, fin)
+
+    consultas_indice.incrementar(("base",))
+    filas = []
+    for i in range(0, len(indice.residencias), TAMANO_BLOQUE_IN):
+        response = await db.table('visitas').select('*').in_('residencia_id', indice.residencias[i:i + TAMANO_BLOQUE_IN]).gte(
+            'fecha_programada', inicio.isoformat()).lte('fecha_programada', fin.isoformat()).execute()
+        filas.extend(response.data)
+    return filas
+
+
+async def proximas_visitas(colonia_id: UUID, cantidad: int, db: AsyncClient) -> List[dict]:
+    """Las próximas `cantidad` llegadas (visitas sin escanear desde ahora) de la colonia."""
+    ahora = datetime.utcnow()
+    indice = await get_indice(colonia_id, db)
+    filas = indice.proximas(ahora, cantidad)
+    if filas is not None:
+        consultas_indice.incrementar(("indice",))
+        return filas
+
+    consultas_indice.incrementar(("base",))
+    filas = []
+    for i in range(0, len(indice.residencias), TAMANO_BLOQUE_IN):
+        response = await db.table('visitas').select('*').in_('residencia_id', indice.residencias[i:i + TAMANO_BLOQUE_IN]).gte(
+            'fecha_programada', ahora.isoformat()).eq('escaneo_exitoso', False).eq('qr_activo', True).order(
+            'fecha_programada').limit(cantidad).execute()
+        filas.extend(response.data)
+    filas.sort(key=lambda f: (a_datetime(f['fecha_programada']), str(f['id'])))
+    return filas[:cantidad]
@@ -0,0 +1,183 @@
+"""
+Manifiesto diario de la caseta por colonia.
+
+Lista compacta de las visitas esperadas hoy o activas en una colonia, con
+los ids de QR ordenados (las tabletas de los guardias buscan con bisección)
+y los campos mínimos para mostrar. Se construye una vez por colonia y
+después se actualiza en memoria con cada alta, cambio o baja de visita,
+sin volver a consultar la base.
+
+Cada cambio incrementa la versión. Las tabletas piden el manifiesto con
+If-None-Match (304 si no cambió) o con `desde=<versión>` para recibir solo
+las altas y bajas posteriores.
+
+El estado vive en el proceso: con varios workers cada uno mantiene su
+copia, y MANIFIESTO_TTL_SEGUNDOS fuerza una reconstrucción periódica para
+que converjan. La construcción y las actualizaciones pasan por
+crud/vistas_colonia.py.
+"""
+
+from __future__ import annotations
+
+import os
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, TYPE_CHECKING
+from uuid import UUID
+
+from crud.base import a_datetime
+from crud.relaciones import TAMANO_BLOQUE_IN
+from crud.vistas_colonia import VistasPorColonia
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+MANIFIESTO_TTL_SEGUNDOS = int(os.getenv("MANIFIESTO_TTL_SEGUNDOS", "300"))
+# Cambios que se conservan para responder deltas; más atrás se manda completo
+MAX_CAMBIOS = 1000
+
+# Identifica esta instancia para que un ETag de otro proceso no coincida
+_INSTANCIA = secrets.token_hex(4)
+
+
+def _entrada(visita: dict, residencias: Dict[str, dict]) -> dict:
+    """Campos mínimos que muestra la tableta."""
+    residencia = residencias.get(str(visita['residencia_id'])) or {}
+    return {
+        'id': str(visita['id']),
+        'visitante': f"{visita.get('nombre_visitante', '')} {visita.get('apellido_visitante', '')}".strip(),
+        'tipo': visita.get('tipo'),
+        'residencia_id': str(visita['residencia_id']),
+        'residencia': f"{residencia.get('calle', '')} {residencia.get('numero', '')}".strip(),
+        'fecha_programada': str(visita.get('fecha_programada')),
+        'fecha_expiracion': str(visita.get('fecha_expiracion')) if visita.get('fecha_expiracion') else None,
+        'activa': bool(visita.get('activa')),
+    }
+
+
+class ManifiestoColonia:
+    def __init__(self, colonia_id: str, fecha, residencias: Dict[str, dict], version: int = 1):
+        self.colonia_id = colonia_id
+        self.fecha = fecha
+        self.residencias = residencias
+        self.version = version
+        self.construido = time.monotonic()
+        self.entradas: Dict[str, dict] = {}
+        self._ids_ordenados: Optional[List[str]] = None
+        # (versión, visita_id, entrada o None si fue baja)
+        self.cambios: List[tuple] = []
+
+    @property
+    def etag(self) -> str:
+        return f'"{_INSTANCIA}-{self.fecha:%Y%m%d}-{self.version}"'
+
+    @property
+    def vencido(self) -> bool:
+        return (self.fecha != datetime.utcnow().date()
+                or time.monotonic() - self.construido > MANIFIESTO_TTL_SEGUNDOS)
+
+    def corresponde(self, visita: dict) -> bool:
+        """La visita entra al manifiesto si está activa o programada para hoy con QR activo."""
+        if not visita.get('qr_activo', True):
+            return False
+        if visita.get('activa'):
+            return True
+        programada = a_datetime(visita.get('fecha_programada'))
+        return programada is not None and programada.date() == self.fecha
+
+    def aplicar(self, visita_id: str, entrada: Optional[dict]):
+        if entrada is None and visita_id not in self.entradas:
+            return
+        if entrada is not None and self.entradas.get(visita_id) == entrada:
+            return
+        if entrada is None:
+            del self.entradas[visita_id]
+        else:
+            self.entradas[visita_id] = entrada
+        self._ids_ordenados = None
+        self.version += 1
+        self.cambios.append((self.version, visita_id, entrada))
+        if len(self.cambios) > MAX_CAMBIOS:
+            del self.cambios[:len(self.cambios) - MAX_CAMBIOS]
+
+    def completo(self) -> dict:
+        if self._ids_ordenados is None:
+            self._ids_ordenados = sorted(self.entradas)
+        return {
+            'colonia_id': self.colonia_id,
+            'fecha': self.fecha.isoformat(),
+            'version': self.version,
+            'completo': True,
+            'ids': self._ids_ordenados,
+            'visitas': [self.entradas[i] for i in self._ids_ordenados],
+        }
+
+    def delta(self, desde: int) -> Optional[dict]:
+        """Cambios posteriores a `desde`, o None si ya no se conservan."""
+        primera = self.cambios[0][0] if self.cambios else self.version + 1
+        if desde > self.version or desde < primera - 1:
+            return None
+        altas, bajas = {}, set()
+        for version, visita_id, entrada in self.cambios:
+            if version <= desde:
+                continue
+            if entrada is None:
+                altas.pop(visita_id, None)
+                bajas.add(visita_id)
+            else:
+                bajas.discard(visita_id)
+                altas[visita_id] = entrada
+        return {
+            'colonia_id': self.colonia_id,
+            'fecha': self.fecha.isoformat(),
+            'version': self.version,
+            'completo': False,
+            'altas': list(altas.values()),
+            'bajas': sorted(bajas),
+        }
+
+
+async def _construir(colonia_id: str, residencias: List[dict], db: AsyncClient,
+                     anterior: Optional[ManifiestoColonia]) -> ManifiestoColonia:
+    hoy = datetime.utcnow().date()
+    inicio = datetime.combine(hoy, datetime.min.time())
+    fin = inicio + timedelta(days=1)
+
+    por_id = {str(r['id']): r for r in residencias}
+    # La versión sigue creciendo para que los deltas viejos no se confundan
+    manifiesto = ManifiestoColonia(colonia_id, hoy, por_id, anterior.version + 1 if anterior else 1)
+
+    ids = list(por_id)
+    for i in range(0, len(ids), TAMANO_BLOQUE_IN):
+        response = await db.table('visitas').select('*').in_('residencia_id', ids[i:i + TAMANO_BLOQUE_IN]).eq('qr_activo', True).or_(
+            f'activa.eq.true,and(fecha_programada.gte."{inicio.isoformat()}",fecha_programada.lt."{fin.isoformat()}")'
+        ).execute()
+        for visita in response.data:
+            manifiesto.entradas[str(visita['id'])] = _entrada(visita, por_id)
+    return manifiesto
+
+
+def _registrar(manifiesto: ManifiestoColonia, visita: dict) -> None:
+    visita_id = str(visita['id'])
+    if manifiesto.corresponde(visita):
+        manifiesto.aplicar(visita_id, _entrada(visita, manifiesto.residencias))
+    else:
+        manifiesto.aplicar(visita_id, None)
+
+
+def _agregar_residencia(manifiesto: ManifiestoColonia, residencia: dict) -> None:
+    manifiesto.residencias[str(residencia['id'])] = residencia
+
+
+_manifiestos = VistasPorColonia(
+    _construir,
+    _registrar,
+    lambda manifiesto, visita_id: manifiesto.aplicar(visita_id, None),
+    _agregar_residencia,
+)
+
+
+async def get_manifiesto(colonia_id: UUID, db: AsyncClient) -> ManifiestoColonia:
+    """Devuelve el manifiesto de la colonia, construyéndolo si hace falta."""
+    return await _manifiestos.obtener(colonia_id, db)
@@ -0,0 +1,88 @@
+"""
+Paginación por cursor (keyset) sobre (created_at, id).
+
+En lugar de OFFSET, cada página pide las filas posteriores a la última de
+la página anterior, así que el costo no crece con la profundidad de la
+página. El cursor es opaco para el cliente: base64 de [created_at, id].
+"""
+
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 500
+
+# Header en el que las rutas de listado devuelven el cursor de la siguiente página
+HEADER_CURSOR = "X-Next-Cursor"
+
+
+def codificar_cursor(fila: dict) -> str:
+    """Genera el cursor que apunta a la fila dada."""
+    crudo = json.dumps([str(fila['created_at']), str(fila['id'])], separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Devuelve (created_at, id) o lanza 400 si el cursor no es válido. Los dos
+    valores van dentro del filtro de PostgREST, así que solo se aceptan una
+    fecha ISO y un UUID.
+    """
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        created_at, fila_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+        return str(created_at), str(UUID(str(fila_id)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def aplicar_cursor(query, cursor: Optional[str]):
+    """Agrega el filtro (created_at, id) > cursor y el orden correspondiente."""
+    if cursor:
+        created_at, fila_id = decodificar_cursor(cursor)
+        query = query.or_(
+            f'created_at.gt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.gt."{fila_id}")'
+        )
+    return query.order('created_at').order('id')
+
+
+async def obtener_pagina(query, limit: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """Ejecuta la consulta paginada. Devuelve (filas, next_cursor)."""
+    limit = max(1, min(limit, LIMITE_MAXIMO))
+    # Se pide una fila extra para saber si hay otra página sin hacer un count
+    response = await aplicar_cursor(query, cursor).limit(limit + 1).execute()
+    filas = response.data
+
+    if len(filas) > limit:
+        filas = filas[:limit]
+        return filas, codificar_cursor(filas[-1])
+    return filas, None
+
+
+async def obtener_pagina_bloques(queries: List, limit: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Como obtener_pagina, para una consulta repartida en varias (p. ej. un
+    filtro in_ partido en bloques). Cada una trae su página a partir del
+    cursor y se mezclan por (created_at, id), así que el cursor sigue
+    siendo válido entre páginas.
+    """
+    limit = max(1, min(limit, LIMITE_MAXIMO))
+    if len(queries) == 1:
+        return await obtener_pagina(queries[0], limit, cursor)
+
+    filas = []
+    for query in queries:
+        response = await aplicar_cursor(query, cursor).limit(limit + 1).execute()
+        filas.extend(response.data)
+    filas.sort(key=lambda f: (str(f['created_at']), str(f['id'])))
+
+    if len(filas) > limit:
+        filas = filas[:limit]
+        return filas, codificar_cursor(filas[-1])
+    return filas, None
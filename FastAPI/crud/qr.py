@@ -0,0 +1,91 @@
+"""
+Tokens firmados para los códigos QR de las visitas.
+
+El token lleva el id de la visita, el de la residencia y la expiración,
+firmados con HMAC-SHA256. La API puede rechazar un QR alterado o vencido
+sin consultar la base de datos.
+
+Formato: base64url(visita_id[16] + residencia_id[16] + expira[4]) "." base64url(firma[16])
+"""
+
+import base64
+import hashlib
+import hmac
+import logging
+import secrets
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from uuid import UUID
+
+from database import DB_BACKEND, QR_SECRET
+
+logger = logging.getLogger(__name__)
+
+if not QR_SECRET:
+    # Con un secreto por proceso los QR guardados dejan de validar al
+    # reiniciar y en los demás workers: solo se permite con la base en memoria
+    if DB_BACKEND != "memoria":
+        raise RuntimeError("QR_SECRET no está configurado (solo es opcional con DB_BACKEND=memoria)")
+    logger.warning("QR_SECRET no está configurado; se usará un secreto temporal")
+    QR_SECRET = secrets.token_hex(32)
+
+_CLAVE = QR_SECRET.encode()
+_FORMATO = ">16s16sI"
+_LARGO_FIRMA = 16
+
+
+@dataclass(frozen=True)
+class TokenQR:
+    visita_id: UUID
+    residencia_id: UUID
+    expira: datetime
+
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).decode().rstrip("=")
+
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _firmar(payload: bytes) -> bytes:
+    return hmac.new(_CLAVE, payload, hashlib.sha256).digest()[:_LARGO_FIRMA]
+
+
+def _a_epoch(fecha: datetime) -> int:
+    # Las fechas sin zona horaria se interpretan como UTC (igual que datetime.utcnow)
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return int(fecha.timestamp())
+
+
+def generar_token_qr(visita_id: UUID, residencia_id: UUID, expira: datetime) -> str:
+    """Genera el contenido del QR de una visita."""
+    payload = struct.pack(_FORMATO, UUID(str(visita_id)).bytes, UUID(str(residencia_id)).bytes, _a_epoch(expira))
+    return f"{_b64(payload)}.{_b64(_firmar(payload))}"
+
+
+def verificar_token_qr(token: str) -> TokenQR:
+    """Valida firma y expiración del token. Lanza 400 si no es válido."""
+    try:
+        parte_payload, parte_firma = token.split(".", 1)
+        payload = _desde_b64(parte_payload)
+        firma = _desde_b64(parte_firma)
+        visita_bytes, residencia_bytes, expira = struct.unpack(_FORMATO, payload)
+    except (ValueError, struct.error):
+        raise HTTPException(status_code=400, detail="QR inválido o expirado")
+
+    if not hmac.compare_digest(firma, _firmar(payload)):
+        raise HTTPException(status_code=400, detail="QR inválido o expirado")
+
+    if expira <= _a_epoch(datetime.utcnow()):
+        raise HTTPException(status_code=400, detail="QR inválido o expirado")
+
+    return TokenQR(
+        visita_id=UUID(bytes=visita_bytes),
+        residencia_id=UUID(bytes=residencia_bytes),
+        expira=datetime.fromtimestamp(expira, tz=timezone.utc).replace(tzinfo=None),
+    )
@@ -0,0 +1,63 @@
+"""
+Carga de relaciones por lotes.
+
+Evita el patrón N+1 (una consulta por cada fila hija): se juntan las llaves
+de todas las filas y se resuelven con una sola consulta `in_()` por tabla
+(partida en bloques para no exceder el largo de URL de PostgREST).
+
+Relaciones incluidas:
+- adjuntar(filas, llave, tabla, como, db)       muchos-a-uno; p. ej. visita -> residencia
+                                                al publicar eventos de varias visitas
+- get_residencias_de_usuarios(usuario_ids, db)  usuario -> residencias
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+# Cantidad máxima de llaves por consulta in_()
+TAMANO_BLOQUE_IN = 200
+
+
+async def cargar_por_llave(tabla: str, columna: str, valores: Iterable, db: AsyncClient) -> List[dict]:
+    """Obtiene las filas de `tabla` cuyo `columna` está en `valores`."""
+    unicos = list(dict.fromkeys(str(v) for v in valores if v is not None))
+    filas = []
+    for inicio in range(0, len(unicos), TAMANO_BLOQUE_IN):
+        bloque = unicos[inicio:inicio + TAMANO_BLOQUE_IN]
+        response = await db.table(tabla).select('*').in_(columna, bloque).execute()
+        filas.extend(response.data)
+    return filas
+
+
+async def adjuntar(filas: List[dict], llave: str, tabla: str, como: str, db: AsyncClient) -> List[dict]:
+    """
+    Relación muchos-a-uno: agrega a cada fila el registro de `tabla` cuyo id
+    es `fila[llave]`, bajo la clave `como` (None si no existe).
+    """
+    relacionados = await cargar_por_llave(tabla, 'id', (f.get(llave) for f in filas), db)
+    por_id = {str(r['id']): r for r in relacionados}
+    for fila in filas:
+        fila[como] = por_id.get(str(fila.get(llave)))
+    return filas
+
+
+async def get_residencias_de_usuarios(usuario_ids: Iterable, db: AsyncClient) -> Dict[str, List[dict]]:
+    """
+    Relación usuario -> residencias (a través de residencias_usuarios).
+    Siempre son dos consultas, sin importar cuántos usuarios o residencias haya.
+    """
+    usuario_ids = [str(u) for u in usuario_ids]
+    relaciones = await cargar_por_llave('residencias_usuarios', 'usuario_id', usuario_ids, db)
+    residencias = await cargar_por_llave('residencias', 'id', (r['residencia_id'] for r in relaciones), db)
+    por_id = {str(r['id']): r for r in residencias}
+
+    resultado = {usuario_id: [] for usuario_id in usuario_ids}
+    for relacion in relaciones:
+        residencia = por_id.get(str(relacion['residencia_id']))
+        if residencia:
+            resultado.setdefault(str(relacion['usuario_id']), []).append(residencia)
+    return resultado
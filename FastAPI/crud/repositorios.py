@@ -0,0 +1,145 @@
+"""
+Repositorios para las consultas con más tráfico (residencias y visitas).
+
+Las funciones de crud piden su repositorio con `get_repositorio(db)` y no
+saben qué backend hay detrás:
+- SupabaseRepositorio: PostgREST sobre HTTP, igual que el resto de crud.
+- AsyncpgRepositorio: conexión directa a Postgres con un pool de asyncpg.
+  asyncpg prepara cada sentencia la primera vez que se usa en una conexión
+  y la reutiliza después (statement cache), así que las consultas de abajo
+  se ejecutan como prepared statements.
+
+El backend se elige con la variable de entorno DB_BACKEND.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from uuid import UUID
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+import database
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+COLUMNAS_RESIDENCIA = "id, numero, calle, referencia, ubicacion, colonia_id, created_at, updated_at"
+
+COLUMNAS_VISITA = (
+    "id, nombre_visitante, apellido_visitante, identificacion, tipo, fecha_programada, "
+    "residencia_id, usuario_id, codigo_qr, qr_activo, fecha_expiracion, activa, "
+    "fecha_escaneo, escaneo_exitoso, created_at, updated_at"
+)
+
+
+class SupabaseRepositorio:
+    """Consultas a través de PostgREST con el cliente de Supabase."""
+
+    def __init__(self, db: AsyncClient):
+        self.db = db
+
+    async def get_residencia(self, residencia_id: UUID) -> Optional[dict]:
+        response = await self.db.table('residencias').select('*').eq('id', str(residencia_id)).execute()
+        if response.data and len(response.data) > 0:
+            return response.data[0]
+        return None
+
+    async def get_visita(self, visita_id: UUID) -> Optional[dict]:
+        response = await self.db.table('visitas').select('*').eq('id', str(visita_id)).execute()
+        if response.data and len(response.data) > 0:
+            return response.data[0]
+        return None
+
+    async def get_visitas_by_residencia(self, residencia_id: UUID, solo_activas: bool = False) -> List[dict]:
+        query = self.db.table('visitas').select('*').eq('residencia_id', str(residencia_id))
+        if solo_activas:
+            query = query.eq('activa', True)
+        response = await query.execute()
+        return response.data
+
+    async def escanear_qr(self, visita_id: UUID) -> Tuple[bool, Optional[dict]]:
+        """Valida y registra el escaneo. Devuelve (qr_valido, visita_actualizada)."""
+        check_response = await self.db.rpc('is_qr_valid', {'visit_id': str(visita_id)}).execute()
+
+        if not check_response.data or not check_response.data[0]:
+            return False, None
+
+        scan_response = await self.db.rpc('scan_qr', {'visit_id': str(visita_id)}).execute()
+
+        if scan_response.data and scan_response.data[0]:
+            return True, await self.get_visita(visita_id)
+        return True, None
+
+    async def registrar_escaneo(self, visita_id: UUID, residencia_id: UUID) -> Optional[dict]:
+        """
+        Marca la visita como escaneada solo si su QR sigue activo y vigente.
+        Es un único PATCH condicional que devuelve la fila actualizada, o None
+        si ninguna fila cumplió las condiciones.
+        """
+        ahora = datetime.utcnow().isoformat()
+        response = await self.db.table('visitas').update({
+            'fecha_escaneo': ahora,
+            'escaneo_exitoso': True,
+            'activa': True,
+            'updated_at': ahora,
+        }).eq('id', str(visita_id)).eq('residencia_id', str(residencia_id)).eq('qr_activo', True).gt('fecha_expiracion', ahora).execute()
+        if response.data and len(response.data) > 0:
+            return response.data[0]
+        return None
+
+
+class AsyncpgRepositorio:
+    """Consultas directas a Postgres sin pasar por PostgREST."""
+
+    SQL_RESIDENCIA = f"SELECT {COLUMNAS_RESIDENCIA} FROM residencias WHERE id = $1"
+    SQL_VISITA = f"SELECT {COLUMNAS_VISITA} FROM visitas WHERE id = $1"
+    SQL_VISITAS_RESIDENCIA = f"SELECT {COLUMNAS_VISITA} FROM visitas WHERE residencia_id = $1"
+    SQL_VISITAS_ACTIVAS_RESIDENCIA = (
+        f"SELECT {COLUMNAS_VISITA} FROM visitas WHERE residencia_id = $1 AND activa = true"
+    )
+    SQL_QR_VALIDO = "SELECT is_qr_valid(visit_id => $1)"
+    SQL_ESCANEAR_QR = "SELECT scan_qr(visit_id => $1)"
+    SQL_REGISTRAR_ESCANEO = (
+        "UPDATE visitas SET fecha_escaneo = now(), escaneo_exitoso = true, activa = true, updated_at = now() "
+        "WHERE id = $1 AND residencia_id = $2 AND qr_activo AND fecha_expiracion > now() "
+        f"RETURNING {COLUMNAS_VISITA}"
+    )
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def get_residencia(self, residencia_id: UUID) -> Optional[dict]:
+        row = await self.pool.fetchrow(self.SQL_RESIDENCIA, residencia_id)
+        return dict(row) if row else None
+
+    async def get_visita(self, visita_id: UUID) -> Optional[dict]:
+        row = await self.pool.fetchrow(self.SQL_VISITA, visita_id)
+        return dict(row) if row else None
+
+    async def get_visitas_by_residencia(self, residencia_id: UUID, solo_activas: bool = False) -> List[dict]:
+        sql = self.SQL_VISITAS_ACTIVAS_RESIDENCIA if solo_activas else self.SQL_VISITAS_RESIDENCIA
+        rows = await self.pool.fetch(sql, residencia_id)
+        return [dict(row) for row in rows]
+
+    async def escanear_qr(self, visita_id: UUID) -> Tuple[bool, Optional[dict]]:
+        """Valida, registra y lee la visita en una sola transacción."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if not await conn.fetchval(self.SQL_QR_VALIDO, visita_id):
+                    return False, None
+                if not await conn.fetchval(self.SQL_ESCANEAR_QR, visita_id):
+                    return True, None
+                row = await conn.fetchrow(self.SQL_VISITA, visita_id)
+                return True, dict(row) if row else None
+
+    async def registrar_escaneo(self, visita_id: UUID, residencia_id: UUID) -> Optional[dict]:
+        """UPDATE ... RETURNING condicional: una sola sentencia, atómica."""
+        row = await self.pool.fetchrow(self.SQL_REGISTRAR_ESCANEO, visita_id, residencia_id)
+        return dict(row) if row else None
+
+
+async def get_repositorio(db: AsyncClient):
+    """Devuelve el repositorio del backend configurado en DB_BACKEND."""
+    if database.DB_BACKEND == "asyncpg":
+        return AsyncpgRepositorio(await database.get_pool())
+    return SupabaseRepositorio(db)
@@ -1,14 +1,25 @@
+from __future__ import annotations
+
 from fastapi import HTTPException, Depends
-from supabase import create_client, Client
-from gotrue.errors import AuthApiError
-from database import supabase
+from typing import List, Optional, TYPE_CHECKING
 from uuid import UUID, uuid4
 from datetime import datetime
 import bcrypt
 from models.residencia import Residencia, ResidenciaCreate, ResidenciaUsuario, ResidenciaUsuarioCreate
 from crud.base import serialize_model
+from crud.paginacion import obtener_pagina, LIMITE_POR_DEFECTO
+from crud.repositorios import get_repositorio
+from crud.relaciones import get_residencias_de_usuarios
+from crud.cache import crear_cache_entidades
+from crud.coalescencia import coalescer
+from crud import vistas_colonia
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
-def create_residencia(residencia_data: ResidenciaCreate, db: Client):
+residencias_cache = crear_cache_entidades("residencias")
+
+async def create_residencia(residencia_data: ResidenciaCreate, db: AsyncClient):
     """Crea una nueva residencia."""
     # Crear el objeto Residencia completo
     residencia = Residencia(
@@ -22,30 +33,65 @@ def create_residencia(residencia_data: ResidenciaCreate, db: Client):
     serialized_data = serialize_model(residencia)
     
     # Insertar en la base de datos
-    response = db.table('residencias').insert(serialized_data).execute()
+    response = await db.table('residencias').insert(serialized_data).execute()
     
     if len(response.data) > 0:
+        get_residencias_by_colonia.olvidar(residencia.colonia_id)
+        vistas_colonia.residencia_creada(residencia)
         return residencia
     raise HTTPException(status_code=500, detail="Error al crear la residencia")
 
-def get_residencias(db: Client):
-    """Obtiene todas las residencias."""
-    response = db.table('residencias').select('*').execute()
-    return response.data
+async def create_residencias_bulk(residencias: List[Residencia], db: AsyncClient, tamano_lote: int = 500):
+    """
+    Inserta residencias en lotes de varias filas (un viaje a la base por lote).
+    Un lote que falla no detiene a los demás; el resultado de cada lote se
+    reporta por separado.
+    """
+    creadas = []
+    lotes = []
 
-def get_residencia_by_id(residencia_id: UUID, db: Client):
+    for inicio in range(0, len(residencias), tamano_lote):
+        lote = residencias[inicio:inicio + tamano_lote]
+        resultado = {"lote": len(lotes) + 1, "solicitadas": len(lote), "insertadas": 0, "error": None}
+        try:
+            response = await db.table('residencias').insert([serialize_model(r) for r in lote]).execute()
+            creadas.extend(response.data)
+            resultado["insertadas"] = len(response.data)
+        except Exception as e:
+            resultado["error"] = str(e)
+        lotes.append(resultado)
+
+    for colonia_id in {str(r.colonia_id) for r in residencias}:
+        get_residencias_by_colonia.olvidar(colonia_id)
+    for residencia in creadas:
+        vistas_colonia.residencia_creada(residencia)
+    return creadas, lotes
+
+async def get_residencias(db: AsyncClient, limit: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None):
+    """Obtiene una página de residencias. Devuelve (residencias, next_cursor)."""
+    return await obtener_pagina(db.table('residencias').select('*'), limit, cursor)
+
+async def get_residencia_by_id(residencia_id: UUID, db: AsyncClient):
     """Obtiene una residencia por su ID."""
-    response = db.table('residencias').select('*').eq('id', str(residencia_id)).execute()
-    if response.data and len(response.data) > 0:
-        return Residencia(**response.data[0])
+    residencia = residencias_cache.get(str(residencia_id))
+    if residencia is not None:
+        return residencia
+
+    repo = await get_repositorio(db)
+    residencia = await repo.get_residencia(residencia_id)
+    if residencia:
+        residencia = Residencia(**residencia)
+        residencias_cache.set(str(residencia_id), residencia)
+        return residencia
     return None
 
-def get_residencias_by_colonia(colonia_id: UUID, db: Client):
-    """Obtiene todas las residencias de una colonia."""
-    response = db.table('residencias').select('*').eq('colonia_id', str(colonia_id)).execute()
+@coalescer("residencias_por_colonia")
+async def get_residencias_by_colonia(colonia_id: UUID, db: AsyncClient):
+    """Obtiene todas las residencias de una colonia. Las peticiones simultáneas comparten la consulta."""
+    response = await db.table('residencias').select('*').eq('colonia_id', str(colonia_id)).execute()
     return response.data
 
-def create_residencia_usuario(residencia_usuario_data: ResidenciaUsuarioCreate, db: Client):
+async def create_residencia_usuario(residencia_usuario_data: ResidenciaUsuarioCreate, db: AsyncClient):
     """Asocia un usuario a una residencia."""
     # Crear el objeto ResidenciaUsuario completo
     residencia_usuario = ResidenciaUsuario(
@@ -60,35 +106,21 @@ def create_residencia_usuario(residencia_usuario_data: ResidenciaUsuarioCreate,
     serialized_data = serialize_model(residencia_usuario)
     
     # Insertar en la base de datos
-    response = db.table('residencias_usuarios').insert(serialized_data).execute()
+    response = await db.table('residencias_usuarios').insert(serialized_data).execute()
     
     if len(response.data) > 0:
         return residencia_usuario
     raise HTTPException(status_code=500, detail="Error al asociar usuario a residencia")
 
-def get_residencias_by_usuario(usuario_id: UUID, db: Client):
+async def get_residencias_by_usuario(usuario_id: UUID, db: AsyncClient):
     """Obtiene todas las residencias asociadas a un usuario."""
-    # Primero obtenemos todas las relaciones residencia-usuario del usuario
-    relations = db.table('residencias_usuarios').select('*').eq('usuario_id', str(usuario_id)).execute()
-    
-    if not relations.data:
-        return []
-    
-    # Obtenemos los IDs de las residencias asociadas
-    residencia_ids = [rel['residencia_id'] for rel in relations.data]
-    
-    # Consultamos las residencias por sus IDs
-    residencias = []
-    for residencia_id in residencia_ids:
-        res = db.table('residencias').select('*').eq('id', residencia_id).execute()
-        if res.data and len(res.data) > 0:
-            residencias.append(res.data[0])
-    
-    return residencias
+    # Dos consultas (relaciones + residencias con in_) sin importar cuántas residencias tenga
+    residencias = await get_residencias_de_usuarios([usuario_id], db)
+    return residencias[str(usuario_id)]
 
-def verificar_residencia_usuario(residencia_id: UUID, usuario_id: UUID, db: Client):
+async def verificar_residencia_usuario(residencia_id: UUID, usuario_id: UUID, db: AsyncClient):
     """Marca como verificada la relación entre un usuario y una residencia."""
-    response = db.table('residencias_usuarios').update({
+    response = await db.table('residencias_usuarios').update({
         'verificado': True, 
         'updated_at': datetime.utcnow().isoformat()
     }).eq('usuario_id', str(usuario_id)).eq('residencia_id', str(residencia_id)).execute()
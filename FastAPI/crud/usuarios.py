@@ -1,20 +1,33 @@
+from __future__ import annotations
+
 from fastapi import HTTPException, Depends
-from supabase import create_client, Client
-from gotrue.errors import AuthApiError
-from database import supabase
+from typing import Optional, TYPE_CHECKING
 from uuid import UUID, uuid4
 from datetime import datetime
 import bcrypt
+import logging
 from crud.base import serialize_model
+from crud.paginacion import obtener_pagina, LIMITE_POR_DEFECTO
+from crud.cache import crear_cache_entidades
 from models.user import User, UserCreate
 
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+logger = logging.getLogger(__name__)
+
+usuarios_cache = crear_cache_entidades("usuarios")
+
 
 # Versión simplificada de create_user_in_auth_and_db
-async def create_user_in_auth_and_db(email: str, password: str, user_data: UserCreate, db: Client):
+async def create_user_in_auth_and_db(email: str, password: str, user_data: UserCreate, db: AsyncClient):
+    # gotrue se importa aquí y no al arrancar: solo lo usa el alta de usuarios
+    from gotrue.errors import AuthApiError
+
     try:
         # Ahora solo necesitamos crear el usuario en Supabase Auth
         # El trigger se encargará de crear el registro en nuestra tabla personalizada
-        auth_response = db.auth.sign_up({
+        auth_response = await db.auth.sign_up({
             "email": email,
             "password": password
         })
@@ -33,14 +46,15 @@ async def create_user_in_auth_and_db(email: str, password: str, user_data: UserC
         }
         
         # Actualizamos el registro que el trigger ya creó
-        response = db.table('usuarios').update(update_data).eq('id', user_id).execute()
+        response = await db.table('usuarios').update(update_data).eq('id', user_id).execute()
+        usuarios_cache.invalidar(str(user_id))
         
         if not response.data:
-            print("Advertencia: No se pudo actualizar con los datos adicionales")
+            logger.warning("No se pudo actualizar con los datos adicionales", extra={"usuario_id": str(user_id)})
             # Aún así, el usuario básico se ha creado, así que podemos continuar
         
         # Recuperamos el usuario completo para devolverlo
-        user_result = db.table('usuarios').select('*').eq('id', user_id).execute()
+        user_result = await db.table('usuarios').select('*').eq('id', user_id).execute()
         if user_result.data:
             return User(**user_result.data[0])
         else:
@@ -59,20 +73,26 @@ async def create_user_in_auth_and_db(email: str, password: str, user_data: UserC
             )
         
     except AuthApiError as e:
-        print(f"ERROR DE AUTENTICACIÓN: {str(e)}")
+        logger.warning("Error de autenticación al crear usuario: %s", e)
         raise HTTPException(status_code=400, detail=f"Authentication error: {str(e)}")
     except Exception as e:
-        print(f"ERROR GENERAL: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error al crear usuario")
         raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
 
 
-def get_users(db: Client):
-    response = db.table('usuarios').select('*').execute()
-    return response.data
+async def get_users(db: AsyncClient, limit: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None):
+    # Devuelve (usuarios, next_cursor)
+    return await obtener_pagina(db.table('usuarios').select('*'), limit, cursor)
+
+async def get_user_by_id(user_id: UUID, db: AsyncClient):
+    user = usuarios_cache.get(str(user_id))
+    if user is not None:
+        return user
 
-def get_user_by_id(user_id: UUID, db: Client):
     # Convert UUID to string for query
-    response = db.table('usuarios').select('*').eq('id', str(user_id)).execute()
-    return response.data
\ No newline at end of file
+    response = await db.table('usuarios').select('*').eq('id', str(user_id)).execute()
+    if response.data and len(response.data) > 0:
+        user = User(**response.data[0])
+        usuarios_cache.set(str(user_id), user)
+        return user
+    return None
\ No newline at end of file
@@ -1,14 +1,25 @@
+from __future__ import annotations
+
 from fastapi import HTTPException
-from supabase import Client
+from pydantic import ValidationError
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
 from uuid import UUID
 from datetime import datetime
 from crud.base import serialize_model
-from models.visita import Visita, VisitaCreate
+from crud.paginacion import obtener_pagina, obtener_pagina_bloques, LIMITE_POR_DEFECTO, LIMITE_MAXIMO
+from crud.repositorios import get_repositorio
+from crud.relaciones import adjuntar, cargar_por_llave, TAMANO_BLOQUE_IN
+from crud.qr import generar_token_qr, verificar_token_qr
+from crud import eventos, indice_visitas, vistas_colonia
+from crud.residencias import get_residencia_by_id
+from models.visita import Visita, VisitaCreate, ResultadoVisitaLote, ResultadoLoteVisitas
 
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
-def create_visita(visita_data: VisitaCreate, db: Client):
-    """Crea una nueva visita."""
-    # Crear el objeto Visita completo
+
+def _nueva_visita(visita_data: VisitaCreate) -> Visita:
+    """Arma la visita completa (id, expiración y QR) a partir de los datos de alta."""
     visita = Visita(
         nombre_visitante=visita_data.nombre_visitante,
         apellido_visitante=visita_data.apellido_visitante,
@@ -19,92 +30,345 @@ def create_visita(visita_data: VisitaCreate, db: Client):
         usuario_id=visita_data.usuario_id,
         activa=visita_data.activa
     )
-    
+    # El QR es un token firmado que se puede verificar sin consultar la base
+    visita.codigo_qr = generar_token_qr(visita.id, visita.residencia_id, visita.fecha_expiracion)
+    return visita
+
+
+async def create_visita(visita_data: VisitaCreate, db: AsyncClient):
+    """Crea una nueva visita."""
+    visita = _nueva_visita(visita_data)
+
     # Serializar para Supabase
     serialized_data = serialize_model(visita)
     
     # Insertar en la base de datos
-    response = db.table('visitas').insert(serialized_data).execute()
+    response = await db.table('visitas').insert(serialized_data).execute()
     
     if len(response.data) > 0:
+        await vistas_colonia.visita_cambiada(visita, db)
+        await publicar_evento_visita("creada", visita, db)
         return visita
     raise HTTPException(status_code=500, detail="Error al crear la visita")
 
 
-def get_visitas(db: Client):
-    """Obtiene todas las visitas."""
-    response = db.table('visitas').select('*').execute()
-    return response.data
+async def publicar_evento_visita(tipo: str, visita, db: AsyncClient) -> None:
+    """
+    Publica el cambio de una visita en el bus de eventos: en el canal de su
+    residencia y, si alguien escucha colonias, en el de su colonia.
+    """
+    if not (eventos.bus.hay_suscriptores("residencia") or eventos.bus.hay_suscriptores("colonia")):
+        return
+    if not isinstance(visita, dict):
+        visita = visita.model_dump(mode="json")
+    canales = [f"residencia:{visita['residencia_id']}"]
+    if eventos.bus.hay_suscriptores("colonia"):
+        residencia = await get_residencia_by_id(visita['residencia_id'], db)
+        if residencia:
+            canales.append(f"colonia:{residencia.colonia_id}")
+    eventos.bus.publicar(canales, {"tipo": tipo, "visita": visita})
+
+
+async def publicar_eventos_visitas(tipo: str, visitas: List, db: AsyncClient) -> None:
+    """
+    Como publicar_evento_visita para varias visitas: las residencias que
+    hacen falta para el canal de la colonia se cargan con una sola consulta
+    y no una por visita.
+    """
+    if not visitas or not (eventos.bus.hay_suscriptores("residencia") or eventos.bus.hay_suscriptores("colonia")):
+        return
+    # Copias: la residencia adjunta no viaja en el evento
+    filas = [dict(v) if isinstance(v, dict) else v.model_dump(mode="json") for v in visitas]
+    if eventos.bus.hay_suscriptores("colonia"):
+        await adjuntar(filas, 'residencia_id', 'residencias', 'residencia', db)
+    for fila in filas:
+        residencia = fila.pop('residencia', None)
+        canales = [f"residencia:{fila['residencia_id']}"]
+        if residencia:
+            canales.append(f"colonia:{residencia['colonia_id']}")
+        eventos.bus.publicar(canales, {"tipo": tipo, "visita": fila})
+
+
+def _describir_errores(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+async def create_visitas_batch(visitas_data: List[Dict[str, Any]], db: AsyncClient) -> ResultadoLoteVisitas:
+    """
+    Crea varias visitas con un solo INSERT de varias filas.
+
+    Cada elemento se valida por separado; los inválidos o de residencias
+    inexistentes se reportan como fallidos y no se envían, para que uno malo
+    no tumbe el INSERT de los demás. El resultado trae una entrada por
+    elemento, en el mismo orden que la petición.
+    """
+    resultados: List[Optional[ResultadoVisitaLote]] = [None] * len(visitas_data)
+    por_crear: List[tuple] = []
+
+    for indice, datos in enumerate(visitas_data):
+        try:
+            por_crear.append((indice, VisitaCreate.model_validate(datos)))
+        except ValidationError as e:
+            resultados[indice] = ResultadoVisitaLote(indice=indice, ok=False, error=_describir_errores(e))
+
+    # Una consulta para todas las residencias en lugar de dejar fallar el INSERT por la llave foránea
+    existentes = {
+        str(r['id']) for r in await cargar_por_llave('residencias', 'id', (v.residencia_id for _, v in por_crear), db)
+    }
+    visitas = []
+    for indice, visita_data in por_crear:
+        if str(visita_data.residencia_id) in existentes:
+            visitas.append((indice, _nueva_visita(visita_data)))
+        else:
+            resultados[indice] = ResultadoVisitaLote(indice=indice, ok=False, error="Residencia no encontrada")
+
+    if visitas:
+        try:
+            response = await db.table('visitas').insert([serialize_model(v) for _, v in visitas]).execute()
+            insertadas = {str(fila['id']) for fila in response.data}
+        except Exception as e:
+            # El INSERT es una sola sentencia: si falla, no se creó ninguna
+            insertadas, error = set(), str(e)
+        else:
+            error = "Error al crear la visita"
+
+        for indice, visita in visitas:
+            if str(visita.id) in insertadas:
+                await vistas_colonia.visita_cambiada(visita, db)
+                resultados[indice] = ResultadoVisitaLote(indice=indice, ok=True, visita=visita)
+            else:
+                resultados[indice] = ResultadoVisitaLote(indice=indice, ok=False, error=error)
+        await publicar_eventos_visitas("creada", [v for _, v in visitas if str(v.id) in insertadas], db)
+
+    creadas = sum(1 for r in resultados if r.ok)
+    return ResultadoLoteVisitas(creadas=creadas, fallidas=len(resultados) - creadas, resultados=resultados)
+
+
+async def get_visitas(db: AsyncClient, limit: int = LIMITE_POR_DEFECTO, cursor: Optional[str] = None):
+    """Obtiene una página de visitas. Devuelve (visitas, next_cursor)."""
+    return await obtener_pagina(db.table('visitas').select('*'), limit, cursor)
+
+
+# Columnas que se pueden pedir con fields=; id y created_at van siempre (el cursor los usa)
+COLUMNAS_VISITA = tuple(Visita.model_fields)
+COLUMNAS_OBLIGATORIAS = ('id', 'created_at')
+
+
+def columnas_visita(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Valida fields=a,b,c y devuelve las columnas a seleccionar (None = todas)."""
+    if not fields:
+        return None
+    pedidas = [c.strip() for c in fields.split(',') if c.strip()]
+    desconocidas = [c for c in pedidas if c not in COLUMNAS_VISITA]
+    if desconocidas:
+        raise HTTPException(status_code=400, detail=f"Columnas desconocidas en fields: {', '.join(desconocidas)}")
+    return tuple(dict.fromkeys(COLUMNAS_OBLIGATORIAS + tuple(pedidas)))
+
+
+async def filtrar_visitas(
+    db: AsyncClient,
+    residencia_id: Optional[UUID] = None,
+    usuario_id: Optional[UUID] = None,
+    colonia_id: Optional[UUID] = None,
+    activas: bool = False,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    tipo: Optional[str] = None,
+    qr_activo: Optional[bool] = None,
+    columnas: Optional[Tuple[str, ...]] = None,
+) -> List:
+    """
+    Arma la consulta con todos los filtros recibidos (los que son None no
+    filtran; activas solo filtra si es True) y solo las columnas pedidas.
+    Devuelve los builders sin ejecutar: uno, o uno por bloque de residencias
+    si se filtra por colonia (para no pasar cientos de ids en una sola URL).
+    """
+    def armar(residencias: Optional[List[str]] = None):
+        query = db.table('visitas').select(','.join(columnas) if columnas else '*')
+        if residencia_id is not None:
+            query = query.eq('residencia_id', str(residencia_id))
+        if residencias is not None:
+            query = query.in_('residencia_id', residencias)
+        if usuario_id is not None:
+            query = query.eq('usuario_id', str(usuario_id))
+        if activas:
+            query = query.eq('activa', True)
+        if fecha_inicio is not None:
+            query = query.gte('fecha_programada', fecha_inicio.isoformat())
+        if fecha_fin is not None:
+            query = query.lte('fecha_programada', fecha_fin.isoformat())
+        if tipo is not None:
+            query = query.eq('tipo', tipo)
+        if qr_activo is not None:
+            query = query.eq('qr_activo', qr_activo)
+        return query
 
+    if colonia_id is None:
+        return [armar()]
+    ids = [str(r['id']) for r in await cargar_por_llave('residencias', 'colonia_id', [colonia_id], db)]
+    return [armar(ids[i:i + TAMANO_BLOQUE_IN]) for i in range(0, len(ids), TAMANO_BLOQUE_IN)]
 
-def get_visita_by_id(visita_id: UUID, db: Client):
+
+async def buscar_visitas(
+    db: AsyncClient,
+    residencia_id: Optional[UUID] = None,
+    usuario_id: Optional[UUID] = None,
+    colonia_id: Optional[UUID] = None,
+    activas: Optional[bool] = None,
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    tipo: Optional[str] = None,
+    qr_activo: Optional[bool] = None,
+    columnas: Optional[Tuple[str, ...]] = None,
+    limit: int = LIMITE_POR_DEFECTO,
+    cursor: Optional[str] = None,
+):
+    """
+    Una página de `limit` visitas que cumplen todos los filtros, con o sin
+    filtros. Devuelve (visitas, next_cursor); la siguiente página se pide
+    con ese cursor.
+    """
+    queries = await filtrar_visitas(
+        db, residencia_id=residencia_id, usuario_id=usuario_id, colonia_id=colonia_id,
+        # activas=false no filtra: siempre significó "también las inactivas"
+        activas=bool(activas), fecha_inicio=fecha_inicio, fecha_fin=fecha_fin,
+        tipo=tipo, qr_activo=qr_activo, columnas=columnas,
+    )
+    if not queries:
+        # La colonia no tiene residencias
+        return [], None
+    return await obtener_pagina_bloques(queries, limit, cursor)
+
+
+async def get_visita_by_id(visita_id: UUID, db: AsyncClient):
     """Obtiene una visita por su ID."""
-    response = db.table('visitas').select('*').eq('id', str(visita_id)).execute()
-    if response.data and len(response.data) > 0:
-        return Visita(**response.data[0])
+    repo = await get_repositorio(db)
+    visita = await repo.get_visita(visita_id)
+    if visita:
+        return Visita(**visita)
     return None
 
 
-def get_visitas_by_residencia(residencia_id: UUID, db: Client):
+async def get_visitas_by_residencia(residencia_id: UUID, db: AsyncClient):
     """Obtiene todas las visitas de una residencia."""
-    response = db.table('visitas').select('*').eq('residencia_id', str(residencia_id)).execute()
-    return response.data
+    repo = await get_repositorio(db)
+    return await repo.get_visitas_by_residencia(residencia_id)
 
 
-def get_visitas_by_usuario(usuario_id: UUID, db: Client):
+async def get_visitas_by_usuario(usuario_id: UUID, db: AsyncClient):
     """Obtiene todas las visitas creadas por un usuario."""
-    response = db.table('visitas').select('*').eq('usuario_id', str(usuario_id)).execute()
+    response = await db.table('visitas').select('*').eq('usuario_id', str(usuario_id)).execute()
     return response.data
 
 
-def get_visitas_activas_by_residencia(residencia_id: UUID, db: Client):
+async def get_visitas_activas_by_residencia(residencia_id: UUID, db: AsyncClient):
     """Obtiene todas las visitas activas de una residencia."""
-    response = db.table('visitas').select('*').eq('residencia_id', str(residencia_id)).eq('activa', True).execute()
-    return response.data
+    repo = await get_repositorio(db)
+    return await repo.get_visitas_by_residencia(residencia_id, solo_activas=True)
 
 
-def update_visita(visita_id: UUID, visita_data: dict, db: Client):
+async def update_visita(visita_id: UUID, visita_data: dict, db: AsyncClient):
     """Actualiza una visita existente."""
     # Añadir timestamp de actualización
     visita_data['updated_at'] = datetime.utcnow().isoformat()
     
-    response = db.table('visitas').update(visita_data).eq('id', str(visita_id)).execute()
+    response = await db.table('visitas').update(visita_data).eq('id', str(visita_id)).execute()
     
     if response.data and len(response.data) > 0:
+        await vistas_colonia.visita_cambiada(response.data[0], db)
+        await publicar_evento_visita("actualizada", response.data[0], db)
         return Visita(**response.data[0])
     raise HTTPException(status_code=404, detail="Visita no encontrada")
 
 
-def delete_visita(visita_id: UUID, db: Client):
+async def delete_visita(visita_id: UUID, db: AsyncClient):
     """Elimina una visita."""
-    response = db.table('visitas').delete().eq('id', str(visita_id)).execute()
+    response = await db.table('visitas').delete().eq('id', str(visita_id)).execute()
     
     if response.data and len(response.data) > 0:
+        vistas_colonia.visita_eliminada(visita_id)
+        await publicar_evento_visita("eliminada", response.data[0], db)
         return True
     raise HTTPException(status_code=404, detail="Visita no encontrada")
 
 
-def scan_visita_qr(visita_id: UUID, db: Client):
+async def scan_visita_qr(visita_id: UUID, db: AsyncClient):
     """Registra el escaneo de un QR de visita."""
-    # Primero verificamos si el QR es válido
-    check_response = db.rpc('is_qr_valid', {'visit_id': str(visita_id)}).execute()
-    
-    if not check_response.data or not check_response.data[0]:
+    repo = await get_repositorio(db)
+    qr_valido, visita = await repo.escanear_qr(visita_id)
+
+    if not qr_valido:
         raise HTTPException(status_code=400, detail="QR inválido o expirado")
-    
-    # Si el QR es válido, registramos el escaneo
-    scan_response = db.rpc('scan_qr', {'visit_id': str(visita_id)}).execute()
-    
-    if scan_response.data and scan_response.data[0]:
-        # Obtenemos la visita actualizada
-        visita = get_visita_by_id(visita_id, db)
-        if visita:
-            return visita
-    
+
+    if visita:
+        await vistas_colonia.visita_cambiada(visita, db)
+        await publicar_evento_visita("escaneada", visita, db)
+        return Visita(**visita)
+
     raise HTTPException(status_code=500, detail="Error al escanear el QR")
 
 
-def get_visitas_by_fecha(fecha_inicio: datetime, fecha_fin: datetime, db: Client):
-    """Obtiene visitas en un rango de fechas."""
-    response = db.table('visitas').select('*').gte('fecha_programada', fecha_inicio.isoformat()).lte('fecha_programada', fecha_fin.isoformat()).execute()
-    return response.data
\ No newline at end of file
+async def scan_visita_token(token: str, db: AsyncClient):
+    """
+    Registra el escaneo a partir del token firmado del QR.
+    La firma y la expiración se validan localmente; después un solo viaje
+    a la base marca el escaneo y devuelve la visita actualizada.
+    """
+    datos = verificar_token_qr(token)
+
+    repo = await get_repositorio(db)
+    visita = await repo.registrar_escaneo(datos.visita_id, datos.residencia_id)
+
+    if not visita:
+        raise HTTPException(status_code=400, detail="QR inválido o expirado")
+    await vistas_colonia.visita_cambiada(visita, db)
+    await publicar_evento_visita("escaneada", visita, db)
+    return Visita(**visita)
+
+
+async def desactivar_visitas_expiradas(db: AsyncClient, lote: int) -> List[dict]:
+    """
+    Desactiva (qr_activo y activa en False) hasta `lote` visitas cuya
+    fecha_expiracion ya pasó y avisa del cambio como evento "expirada".
+    Devuelve las filas actualizadas.
+    """
+    ahora = datetime.utcnow().isoformat()
+    response = await db.table('visitas').select('id').lt('fecha_expiracion', ahora).or_(
+        'qr_activo.eq.true,activa.eq.true'
+    ).order('fecha_expiracion').limit(lote).execute()
+    if not response.data:
+        return []
+
+    # PostgREST no admite limit en un UPDATE: se actualiza por ids, repitiendo
+    # la condición por si otra petición cambió la visita entre las dos consultas
+    response = await db.table('visitas').update({
+        'qr_activo': False, 'activa': False, 'updated_at': ahora,
+    }).in_('id', [str(v['id']) for v in response.data]).lt('fecha_expiracion', ahora).execute()
+
+    for visita in response.data:
+        await vistas_colonia.visita_cambiada(visita, db)
+    await publicar_eventos_visitas("expirada", response.data, db)
+    return response.data
+
+
+async def get_visitas_by_fecha(fecha_inicio: datetime, fecha_fin: datetime, db: AsyncClient, colonia_id: Optional[UUID] = None):
+    """
+    Obtiene visitas en un rango de fechas. Con colonia_id, las de esa colonia
+    salen del índice en memoria si el rango cae en su ventana.
+    """
+    if colonia_id is not None:
+        return await indice_visitas.visitas_por_fecha(colonia_id, fecha_inicio, fecha_fin, db)
+    response = await db.table('visitas').select('*').gte('fecha_programada', fecha_inicio.isoformat()).lte('fecha_programada', fecha_fin.isoformat()).execute()
+    return response.data
+
+
+async def iterar_visitas_by_fecha(fecha_inicio: datetime, fecha_fin: datetime, db: AsyncClient, tamano_lote: int = LIMITE_MAXIMO):
+    """Recorre las visitas de un rango de fechas por lotes, sin cargar el rango completo."""
+    cursor = None
+    while True:
+        query = db.table('visitas').select('*').gte('fecha_programada', fecha_inicio.isoformat()).lte('fecha_programada', fecha_fin.isoformat())
+        lote, cursor = await obtener_pagina(query, tamano_lote, cursor)
+        for visita in lote:
+            yield visita
+        if cursor is None:
+            break
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Vistas en memoria por colonia que se mantienen con las escrituras de visitas.
+
+El manifiesto, la analítica y el índice por fecha siguen el mismo esquema:
+se construyen una vez por colonia a partir de sus residencias, se guardan
+en el proceso hasta que vencen y, mientras tanto, cada alta, cambio,
+escaneo o baja de visita los actualiza sin volver a la base. Este módulo
+reúne lo que comparten:
+
+- `VistasPorColonia`: las vistas construidas de un tipo, con un lock por
+  colonia para que peticiones simultáneas no construyan la misma vista dos
+  veces.
+- El mapa residencia -> colonia, uno solo para todos los tipos. Se llena al
+  construir cualquier vista y con `residencia_creada`, que llama
+  crud/residencias; si aun así falta una residencia (la creó otro worker) se
+  busca con get_residencia_by_id, que tiene caché.
+- `visita_cambiada` / `visita_eliminada`: los llama crud/visitas después de
+  cada escritura y avisan a todas las vistas registradas de esa colonia. Si
+  la visita cambió de residencia y de colonia, sale de las vistas de la
+  colonia anterior.
+
+Cada módulo aporta `construir(colonia_id, residencias, db, anterior)`,
+`registrar(vista, visita)` con la visita como fila de la base (dict con
+UUID y fechas como texto ISO, venga del backend que venga) y
+`quitar(vista, visita_id)`, y opcionalmente
+`agregar_residencia(vista, residencia)`. La vista debe tener la propiedad
+`vencido`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TYPE_CHECKING
+from uuid import UUID
+
+from crud.base import serialize_fila, serialize_model
+from crud.relaciones import cargar_por_llave
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+_colonia_por_residencia: Dict[str, str] = {}
+_registros: List["VistasPorColonia"] = []
+
+
+class VistasPorColonia:
+    def __init__(
+        self,
+        construir: Callable[[str, List[dict], "AsyncClient", Optional[Any]], Awaitable[Any]],
+        registrar: Callable[[Any, dict], None],
+        quitar: Callable[[Any, str], None],
+        agregar_residencia: Optional[Callable[[Any, dict], None]] = None,
+    ):
+        self._construir = construir
+        self._registrar = registrar
+        self._quitar = quitar
+        self._agregar_residencia = agregar_residencia
+        self._vistas: Dict[str, Any] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        _registros.append(self)
+
+    async def obtener(self, colonia_id: UUID, db: AsyncClient):
+        """Devuelve la vista de la colonia, construyéndola si no existe o ya venció."""
+        clave = str(colonia_id)
+        vista = self._vistas.get(clave)
+        if vista is not None and not vista.vencido:
+            return vista
+
+        async with self._locks.setdefault(clave, asyncio.Lock()):
+            vista = self._vistas.get(clave)
+            if vista is None or vista.vencido:
+                residencias = await cargar_por_llave('residencias', 'colonia_id', [clave], db)
+                vista = await self._construir(clave, residencias, db, vista)
+                for residencia in residencias:
+                    _colonia_por_residencia[str(residencia['id'])] = clave
+                self._vistas[clave] = vista
+        return vista
+
+
+def residencia_creada(residencia) -> None:
+    """Registra una residencia nueva en el mapa y en las vistas ya construidas de su colonia."""
+    residencia = serialize_fila(residencia) if isinstance(residencia, dict) else serialize_model(residencia)
+    colonia_id = str(residencia['colonia_id'])
+    _colonia_por_residencia[str(residencia['id'])] = colonia_id
+    for registro in _registros:
+        vista = registro._vistas.get(colonia_id)
+        if vista is not None and registro._agregar_residencia is not None:
+            registro._agregar_residencia(vista, residencia)
+
+
+async def _colonia_de(residencia_id: str, db: AsyncClient) -> Optional[str]:
+    colonia_id = _colonia_por_residencia.get(residencia_id)
+    if colonia_id is not None or not any(registro._vistas for registro in _registros):
+        return colonia_id
+    # Residencia creada en otro worker después de construir las vistas
+    from crud.residencias import get_residencia_by_id
+    residencia = await get_residencia_by_id(residencia_id, db)
+    if residencia is None:
+        return None
+    residencia_creada(residencia)
+    return str(residencia.colonia_id)
+
+
+async def visita_cambiada(visita, db: AsyncClient) -> None:
+    """Aplica una visita creada, modificada, escaneada o desactivada a las vistas de su colonia."""
+    # Modelo, fila de PostgREST o fila de asyncpg: todas llegan a las vistas igual
+    visita = serialize_fila(visita) if isinstance(visita, dict) else serialize_model(visita)
+    visita_id = str(visita['id'])
+    colonia_id = await _colonia_de(str(visita.get('residencia_id')), db)
+    for registro in _registros:
+        for clave, vista in registro._vistas.items():
+            if clave == colonia_id:
+                registro._registrar(vista, visita)
+            else:
+                # Por si la visita se movió a una residencia de otra colonia
+                registro._quitar(vista, visita_id)
+
+
+def visita_eliminada(visita_id: UUID) -> None:
+    """Quita una visita eliminada de cualquier vista que la tenga."""
+    visita_id = str(visita_id)
+    for registro in _registros:
+        for vista in registro._vistas.values():
+            registro._quitar(vista, visita_id)
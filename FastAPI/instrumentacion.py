@@ -0,0 +1,93 @@
+"""
+Instrumentación de las llamadas a la base (upstream).
+
+`ClienteInstrumentado` envuelve al cliente de Supabase: cada
+`db.table(...)...execute()` y `db.rpc(...).execute()` se cronometra y se
+anota en el contador de la petición en curso (un ContextVar que pone el
+middleware de registro) y en las métricas por tabla/RPC (metricas.py).
+Así se sabe cuántas llamadas hizo cada petición y cuánto tiempo esperó a
+la base, sin tocar el código de crud.
+"""
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import metricas
+
+# Métodos del builder que definen qué operación es la consulta
+_OPERACIONES = {"select", "insert", "update", "upsert", "delete"}
+
+
+@dataclass
+class LlamadasUpstream:
+    """Llamadas a la base hechas durante una petición."""
+    llamadas: int = 0
+    segundos: float = 0.0
+
+
+llamadas_peticion: ContextVar[Optional[LlamadasUpstream]] = ContextVar("llamadas_peticion", default=None)
+
+
+def registrar_llamada(tipo: str, nombre: str, operacion: str, segundos: float, error: bool = False) -> None:
+    """Anota una llamada a la base en las métricas y en el contador de la petición en curso."""
+    metricas.observar_upstream(tipo, nombre, operacion, segundos, error)
+    contador = llamadas_peticion.get()
+    if contador is not None:
+        contador.llamadas += 1
+        contador.segundos += segundos
+
+
+class _ConsultaInstrumentada:
+    """Envuelve un builder de postgrest y cronometra su `execute()`."""
+
+    __slots__ = ("_consulta", "_tipo", "_nombre", "_operacion")
+
+    def __init__(self, consulta, tipo: str, nombre: str, operacion: str):
+        self._consulta = consulta
+        self._tipo = tipo
+        self._nombre = nombre
+        self._operacion = operacion
+
+    def _envolver(self, resultado, operacion: str):
+        if hasattr(resultado, "execute"):
+            return _ConsultaInstrumentada(resultado, self._tipo, self._nombre, operacion)
+        return resultado
+
+    def __getattr__(self, nombre: str) -> Any:
+        atributo = getattr(self._consulta, nombre)
+        operacion = nombre if nombre in _OPERACIONES else self._operacion
+        if not callable(atributo):
+            # Propiedades que devuelven otro builder, como `not_`
+            return self._envolver(atributo, operacion)
+
+        def encadenar(*args, **kwargs):
+            return self._envolver(atributo(*args, **kwargs), operacion)
+        return encadenar
+
+    async def execute(self):
+        inicio = time.perf_counter()
+        error = True
+        try:
+            resultado = await self._consulta.execute()
+            error = False
+            return resultado
+        finally:
+            registrar_llamada(self._tipo, self._nombre, self._operacion, time.perf_counter() - inicio, error)
+
+
+class ClienteInstrumentado:
+    """Cliente de Supabase (o SupabaseEnMemoria) con las llamadas instrumentadas."""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def table(self, nombre: str):
+        return _ConsultaInstrumentada(self._cliente.table(nombre), "tabla", nombre, "select")
+
+    def rpc(self, nombre: str, params: Optional[dict] = None, *args, **kwargs):
+        return _ConsultaInstrumentada(self._cliente.rpc(nombre, params, *args, **kwargs), "rpc", nombre, "rpc")
+
+    def __getattr__(self, nombre: str) -> Any:
+        return getattr(self._cliente, nombre)
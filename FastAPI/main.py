@@ -1,33 +1,61 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import logging
 import uvicorn
 
+import barrido
+import database
+from codificacion import MiddlewareCodificacion
+from crud.cache import estadisticas_caches
+import metricas
+import perfilado
+from registro import MiddlewareRegistro, configurar_logging
+
 # Importar todos los routers
 from routes import (
     router_usuarios,
     router_colonias,
     router_residencias,
-    router_visitas
+    router_visitas,
+    router_anuncios
 )
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Logs en JSON a través de una cola (ver registro.py)
+configurar_logging()
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Solo se crea el cliente (sin consultas): el arranque no espera a la red
+    # ni falla si la base no está disponible; eso lo reporta /readyz
+    await database.get_db()
+    # Desactiva visitas (y archiva anuncios, si hay tabla de archivo) expirados en segundo plano (ver barrido.py)
+    tarea_barrido = barrido.iniciar()
+    yield
+    await barrido.detener(tarea_barrido)
+    await database.cerrar()
+
 app = FastAPI(
     title="FastReact API",
     description="API para aplicación de administración de colonias",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Middleware para logs
-@app.middleware("http")
-async def log_requests(request, call_next):
-    logger.info(f"📨 Request: {request.method} {request.url}")
-    response = await call_next(request)
-    logger.info(f"📫 Response Status: {response.status_code}")
-    return response
+# Compresión (br/gzip) y MessagePack según Accept-Encoding / Accept (ver codificacion.py)
+app.add_middleware(MiddlewareCodificacion)
+
+# Perfilado con cProfile de las peticiones que traen X-Perfilar; sin
+# PERFILADO_TOKEN ni siquiera se instala (ver perfilado.py)
+if perfilado.PERFILADO_TOKEN:
+    app.add_middleware(perfilado.MiddlewarePerfilado)
+
+# Una línea de log por petición con duración y llamadas a la base (muestreada con LOG_MUESTREO)
+app.add_middleware(MiddlewareRegistro)
+# Conteos, peticiones en curso y latencias por plantilla de ruta para /metrics
+app.add_middleware(metricas.MiddlewareMetricas)
 
 # Configurar CORS
 app.add_middleware(
@@ -36,6 +64,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Ruta raíz
@@ -43,11 +72,43 @@ app.add_middleware(
 async def root():
     return {"message": "Welcome to the API"}
 
+# Liveness: el proceso responde; no toca la base
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# Readiness: la base responde a una consulta mínima
+@app.get("/readyz")
+async def readyz():
+    ok, detalle = await database.verificar_conexion()
+    if not ok:
+        return JSONResponse({"status": "unavailable", "detail": detalle}, status_code=503)
+    return {"status": "ready"}
+
+# Métricas de peticiones y de llamadas a la base en formato de Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4")
+
+# Resumen de un perfil tomado con X-Perfilar (requiere el mismo token)
+@app.get("/perfiles/{perfil_id}", include_in_schema=False)
+async def perfil(perfil_id: str, x_perfilar: str = Header(None)):
+    resumen = perfilado.leer_resumen(perfil_id) if perfilado.token_valido(x_perfilar) else None
+    if resumen is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return resumen
+
+# Contadores de las cachés en memoria (aciertos, fallos, desalojos)
+@app.get("/cache/estadisticas")
+async def cache_estadisticas():
+    return estadisticas_caches()
+
 # Incluir todos los routers
 app.include_router(router_usuarios, prefix="/usuarios", tags=["Usuarios"])
 app.include_router(router_colonias, prefix="/colonias", tags=["Colonias"])
 app.include_router(router_residencias, prefix="/residencias", tags=["Residencias"])
 app.include_router(router_visitas, prefix="/visitas", tags=["Visitas"])
+app.include_router(router_anuncios, prefix="/anuncios", tags=["Anuncios"])
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -55,5 +116,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,
-        log_level="info"
+        log_level="info",
+        access_log=False  # MiddlewareRegistro ya registra cada petición
     )
\ No newline at end of file
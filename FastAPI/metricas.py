@@ -0,0 +1,177 @@
+"""
+Métricas en formato de texto de Prometheus para GET /metrics.
+
+- Peticiones: total por método, plantilla de ruta y estado; histograma de
+  duración por método y plantilla de ruta (p. ej. /visitas/{visita_id}/scan);
+  peticiones en curso.
+- Upstream: total y histograma de duración de cada llamada a la base, por
+  tabla o RPC y operación (lo registra instrumentacion.py).
+
+Todo se actualiza desde el event loop, así que no hace falta bloquear. Los
+valores son del proceso: con varios workers, Prometheus debe raspar cada
+uno o agregarlos.
+"""
+
+import time
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+# Límites superiores (segundos) de los buckets de los histogramas de latencia
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Etiqueta de ruta para peticiones que no corresponden a ninguna ruta (404);
+# usar el path crudo haría crecer sin límite el número de series
+RUTA_DESCONOCIDA = "<sin_ruta>"
+
+METRICAS: List["_Metrica"] = []
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Tuple, extra: str = "") -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        METRICAS.append(self)
+
+    def _muestras(self) -> List[str]:
+        raise NotImplementedError
+
+    def exponer(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"] + self._muestras()
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Tuple, float] = {}
+
+    def incrementar(self, valores: Tuple = (), cantidad: float = 1) -> None:
+        self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def _muestras(self) -> List[str]:
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, v)} {_numero(n)}" for v, n in self._valores.items()]
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Tuple, float] = {}
+
+    def sumar(self, valores: Tuple = (), cantidad: float = 1) -> None:
+        self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def fijar(self, valores: Tuple = (), valor: float = 0) -> None:
+        self._valores[valores] = valor
+
+    def _muestras(self) -> List[str]:
+        if not self._valores and not self.etiquetas:
+            return [f"{self.nombre} 0"]
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, v)} {_numero(n)}" for v, n in self._valores.items()]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+        # valores de etiquetas -> [conteo por bucket (no acumulado)..., +Inf, suma]
+        self._series: Dict[Tuple, list] = {}
+
+    def observar(self, valores: Tuple, segundos: float) -> None:
+        serie = self._series.get(valores)
+        if serie is None:
+            serie = self._series[valores] = [0] * (len(self.buckets) + 1) + [0.0]
+        serie[bisect_left(self.buckets, segundos)] += 1
+        serie[-1] += segundos
+
+    def _muestras(self) -> List[str]:
+        lineas = []
+        for valores, serie in self._series.items():
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + ("+Inf",), serie):
+                acumulado += conteo
+                le = 'le="+Inf"' if limite == "+Inf" else f'le="{limite}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+peticiones_total = Contador(
+    "smartcolonia_peticiones_total", "Peticiones HTTP atendidas.", ("metodo", "ruta", "estado"))
+peticiones_en_curso = Medidor(
+    "smartcolonia_peticiones_en_curso", "Peticiones HTTP en proceso.")
+peticion_duracion = Histograma(
+    "smartcolonia_peticion_duracion_segundos", "Duración de las peticiones HTTP.", ("metodo", "ruta"))
+upstream_total = Contador(
+    "smartcolonia_upstream_llamadas_total", "Llamadas a la base.", ("tipo", "nombre", "operacion", "resultado"))
+upstream_duracion = Histograma(
+    "smartcolonia_upstream_duracion_segundos", "Duración de las llamadas a la base.", ("tipo", "nombre", "operacion"))
+
+
+def observar_upstream(tipo: str, nombre: str, operacion: str, segundos: float, error: bool) -> None:
+    upstream_total.incrementar((tipo, nombre, operacion, "error" if error else "ok"))
+    upstream_duracion.observar((tipo, nombre, operacion), segundos)
+
+
+def exponer() -> str:
+    """Todas las métricas en el formato de texto 0.0.4 de Prometheus."""
+    lineas = []
+    for metrica in METRICAS:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mide cada petición por plantilla de ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        peticiones_en_curso.sumar()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            segundos = time.perf_counter() - inicio
+            peticiones_en_curso.sumar(cantidad=-1)
+            ruta = getattr(scope.get("route"), "path", None) or RUTA_DESCONOCIDA
+            peticiones_total.incrementar((scope["method"], ruta, str(estado)))
+            peticion_duracion.observar((scope["method"], ruta), segundos)
+
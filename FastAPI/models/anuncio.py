@@ -25,10 +25,4 @@ class Anuncio(BaseModel):
     fecha_publicacion: datetime = Field(default_factory=datetime.utcnow)
     fecha_expiracion: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        json_encoders = {
-            UUID: str,
-            datetime: lambda dt: dt.isoformat()
-        }
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
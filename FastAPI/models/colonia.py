@@ -13,12 +13,6 @@ class Colonia(BaseModel):
     admin_principal_id: Optional[UUID] = None  # Hace explícitamente opcional
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        json_encoders = {
-            UUID: str,
-            datetime: lambda dt: dt.isoformat()
-        }
 
 class ColoniaCreate(BaseModel):
     nombre: str
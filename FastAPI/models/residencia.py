@@ -22,12 +22,6 @@ class Residencia(BaseModel):
     colonia_id: UUID
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        json_encoders = {
-            UUID: str,
-            datetime: lambda dt: dt.isoformat()
-        }
 
 class ResidenciaUsuarioCreate(BaseModel):
     usuario_id: UUID
@@ -44,10 +38,4 @@ class ResidenciaUsuario(BaseModel):
     es_principal: bool = False
     verificado: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        json_encoders = {
-            UUID: str,
-            datetime: lambda dt: dt.isoformat()
-        }
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
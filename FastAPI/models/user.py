@@ -28,10 +28,4 @@ class User(BaseModel):
     colonia_id: Optional[UUID] = None
     activo: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-
-    class Config:
-        json_encoders = {
-            UUID: str,
-            datetime: lambda dt: dt.isoformat()
-        }
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
@@ -2,8 +2,8 @@
 
 from pydantic import BaseModel, Field
 from uuid import UUID, uuid4
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
 
 
 class VisitaCreate(BaseModel):
@@ -17,6 +17,10 @@ class VisitaCreate(BaseModel):
     activa: bool = False
 
 
+class EscaneoQR(BaseModel):
+    token: str  # Contenido del QR (codigo_qr de la visita)
+
+
 class Visita(BaseModel):
     id: UUID = Field(default_factory=uuid4)
     nombre_visitante: str
@@ -37,8 +41,34 @@ class Visita(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    class Config:
-        json_encoders = {
-            UUID: str,
-            datetime: lambda dt: dt.isoformat()
-        }
\ No newline at end of file
+
+class ResultadoVisitaLote(BaseModel):
+    indice: int  # Posición del elemento en la petición
+    ok: bool
+    visita: Optional[Visita] = None
+    error: Optional[str] = None
+
+
+class ResultadoLoteVisitas(BaseModel):
+    creadas: int
+    fallidas: int
+    resultados: List[ResultadoVisitaLote]
+
+
+class VisitasPorDia(BaseModel):
+    fecha: date  # Día de fecha_programada (UTC)
+    visitas: int
+    escaneadas: int
+
+
+class AnaliticaVisitas(BaseModel):
+    colonia_id: UUID
+    desde: Optional[date] = None
+    hasta: Optional[date] = None
+    visitas: int
+    escaneadas: int
+    tasa_escaneo: Optional[float] = None  # escaneadas / visitas
+    retraso_promedio_minutos: Optional[float] = None  # fecha_escaneo - fecha_programada
+    por_dia: List[VisitasPorDia]
+    por_residencia: Dict[str, int]
+    por_tipo: Dict[str, int]
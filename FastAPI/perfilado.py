@@ -0,0 +1,154 @@
+"""
+Perfilado bajo demanda de una petición.
+
+Solo existe si PERFILADO_TOKEN está configurado: sin él main.py no instala
+el middleware y no cuesta nada. Con él, una petición que trae el header
+`X-Perfilar: <PERFILADO_TOKEN>` se ejecuta bajo cProfile y:
+
+- se guarda el perfil completo en PERFILADO_DIR/<id>.prof (pstats, snakeviz)
+  y un resumen en PERFILADO_DIR/<id>.json, que devuelve GET /perfiles/{id};
+- la respuesta trae `X-Perfil-Id` y un header `Server-Timing` con el
+  tiempo total, la espera a la base (upstream), el tiempo del event loop
+  sin trabajo (espera) y el tiempo de CPU en crud, en serialización, en el
+  cliente de la base y en lo demás.
+
+Se perfila una petición a la vez: si ya hay otra en curso, la nueva se
+atiende normal. cProfile mide el hilo completo, así que otras peticiones
+que avancen durante los `await` también aparecen en el perfil. El perfil se
+cierra al empezar la respuesta; el cuerpo de un StreamingResponse no entra.
+"""
+
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import secrets
+import tempfile
+import time
+from typing import Dict, Optional
+
+from instrumentacion import llamadas_peticion
+
+PERFILADO_TOKEN = os.getenv("PERFILADO_TOKEN")
+PERFILADO_DIR = os.getenv("PERFILADO_DIR", os.path.join(tempfile.gettempdir(), "smartcolonia_perfiles"))
+HEADER_PERFILAR = b"x-perfilar"
+
+# Categorías del tiempo propio de cada función, según su archivo o, para las
+# funciones en C, su nombre ("<method 'dump_json' of 'pydantic_core...'>")
+_CATEGORIAS = (
+    ("espera", ("select.epoll", "select.poll", "select.kqueue", f"{os.sep}selectors.py")),
+    ("crud", (f"{os.sep}crud{os.sep}",)),
+    ("serializacion", ("serializacion.py", f"{os.sep}pydantic", "encoders.py", f"{os.sep}json{os.sep}")),
+    ("cliente_db", ("instrumentacion.py", f"{os.sep}postgrest{os.sep}", f"{os.sep}httpx{os.sep}",
+                    f"{os.sep}httpcore{os.sep}", "supabase_memoria.py", f"{os.sep}asyncpg{os.sep}")),
+)
+
+_perfilando = False
+
+
+def token_valido(token: Optional[str]) -> bool:
+    return bool(PERFILADO_TOKEN) and token is not None and hmac.compare_digest(token, PERFILADO_TOKEN)
+
+
+def _categoria(funcion: str) -> str:
+    for nombre, patrones in _CATEGORIAS:
+        if any(p in funcion for p in patrones):
+            return nombre
+    return "otros"
+
+
+def _resumir(perfil: cProfile.Profile, metodo: str, path: str, segundos: float, upstream: float) -> Dict:
+    estadisticas = pstats.Stats(perfil)
+    por_categoria = {nombre: 0.0 for nombre, _ in _CATEGORIAS}
+    por_categoria["otros"] = 0.0
+    funciones = []
+    for (archivo, linea, funcion), (_, llamadas, propio, acumulado, _) in estadisticas.stats.items():
+        nombre = f"{archivo}:{linea}({funcion})"
+        por_categoria[_categoria(nombre)] += propio
+        funciones.append((acumulado, propio, llamadas, nombre))
+    funciones.sort(reverse=True)
+    return {
+        "metodo": metodo,
+        "path": path,
+        "duracion_ms": round(segundos * 1000, 2),
+        "upstream_ms": round(upstream * 1000, 2),
+        "cpu_ms": {k: round(v * 1000, 2) for k, v in por_categoria.items()},
+        "funciones": [
+            {"funcion": nombre, "acumulado_ms": round(acumulado * 1000, 3), "propio_ms": round(propio * 1000, 3), "llamadas": llamadas}
+            for acumulado, propio, llamadas, nombre in funciones[:40]
+        ],
+    }
+
+
+def _guardar(perfil_id: str, perfil: cProfile.Profile, resumen: Dict) -> None:
+    os.makedirs(PERFILADO_DIR, exist_ok=True)
+    perfil.dump_stats(os.path.join(PERFILADO_DIR, f"{perfil_id}.prof"))
+    with open(os.path.join(PERFILADO_DIR, f"{perfil_id}.json"), "w") as archivo:
+        json.dump(resumen, archivo, ensure_ascii=False)
+
+
+def leer_resumen(perfil_id: str) -> Optional[Dict]:
+    """Resumen guardado de un perfil, o None si no existe."""
+    if not perfil_id.isalnum():
+        return None
+    ruta = os.path.join(PERFILADO_DIR, f"{perfil_id}.json")
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta) as archivo:
+        return json.load(archivo)
+
+
+def _server_timing(resumen: Dict) -> str:
+    partes = [f"total;dur={resumen['duracion_ms']}", f"upstream;dur={resumen['upstream_ms']}"]
+    partes += [f"{nombre};dur={ms}" for nombre, ms in resumen["cpu_ms"].items()]
+    return ", ".join(partes)
+
+
+class MiddlewarePerfilado:
+    """Middleware ASGI que perfila las peticiones que traen el token de X-Perfilar."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _perfilando
+        if scope["type"] != "http" or _perfilando:
+            await self.app(scope, receive, send)
+            return
+        token = next((v.decode() for k, v in scope["headers"] if k == HEADER_PERFILAR), None)
+        if not token_valido(token):
+            await self.app(scope, receive, send)
+            return
+
+        _perfilando = True
+        perfil = cProfile.Profile()
+        perfil_id = secrets.token_hex(8)
+        inicio = time.perf_counter()
+        activo = True
+
+        def terminar():
+            nonlocal activo
+            if activo:
+                perfil.disable()
+                activo = False
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                terminar()
+                contador = llamadas_peticion.get()
+                resumen = _resumir(perfil, scope["method"], scope["path"], time.perf_counter() - inicio,
+                                   contador.segundos if contador else 0.0)
+                _guardar(perfil_id, perfil, resumen)
+                mensaje["headers"] = list(mensaje.get("headers", [])) + [
+                    (b"x-perfil-id", perfil_id.encode()),
+                    (b"server-timing", _server_timing(resumen).encode()),
+                ]
+            await send(mensaje)
+
+        perfil.enable()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            terminar()
+            _perfilando = False
@@ -0,0 +1,140 @@
+"""
+Logs estructurados (una línea JSON por evento) sin E/S en las peticiones.
+
+- Los handlers de la app solo encolan el registro (QueueHandler); un hilo
+  aparte (QueueListener) lo formatea y lo escribe. Escribir a stdout nunca
+  bloquea una petición.
+- MiddlewareRegistro deja una línea por petición con método, ruta
+  (plantilla, p. ej. /visitas/{visita_id}/scan), estado, duración y las
+  llamadas a la base que hizo (ver instrumentacion.py).
+- Las peticiones exitosas se muestrean con LOG_MUESTREO (0 a 1); los
+  errores (estado >= 400 o excepción) se registran siempre.
+
+Configuración: LOG_LEVEL (INFO), LOG_MUESTREO (1.0).
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+from instrumentacion import LlamadasUpstream, llamadas_peticion
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MUESTREO = float(os.getenv("LOG_MUESTREO", "1.0"))
+
+logger = logging.getLogger("peticiones")
+
+# Atributos estándar de LogRecord; lo demás viene de `extra=` y va al JSON
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro; los campos de `extra=` se incluyen tal cual."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        evento = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                evento[clave] = valor
+        if record.exc_info:
+            evento["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(evento, default=str, ensure_ascii=False)
+
+
+class _ColaHandler(logging.handlers.QueueHandler):
+    """Encola el registro sin formatearlo: el formato se hace en el hilo del listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener = None
+
+
+def configurar_logging() -> None:
+    """Manda todos los logs a stdout en JSON a través de una cola. Se puede llamar más de una vez."""
+    global _listener
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatoJSON())
+    cola = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    raiz = logging.getLogger()
+    raiz.handlers = [_ColaHandler(cola)]
+    raiz.setLevel(LOG_LEVEL)
+    # uvicorn trae sus propios handlers; que pasen también por la cola
+    for nombre in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(nombre).handlers = []
+        logging.getLogger(nombre).propagate = True
+
+
+class MiddlewareRegistro:
+    """Middleware ASGI que registra cada petición con su duración y llamadas a la base."""
+
+    def __init__(self, app, muestreo: float = LOG_MUESTREO):
+        self.app = app
+        self.muestreo = muestreo
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = 500
+        contador = LlamadasUpstream()
+        token = llamadas_peticion.set(contador)
+        inicio = time.perf_counter()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        error = None
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            llamadas_peticion.reset(token)
+            if error is not None or estado >= 400 or random.random() < self.muestreo:
+                self._registrar(scope, estado, time.perf_counter() - inicio, contador, error)
+
+    def _registrar(self, scope, estado, segundos, contador, error):
+        ruta = scope.get("route")
+        campos = {
+            "metodo": scope["method"],
+            "ruta": getattr(ruta, "path", None) or scope["path"],
+            "path": scope["path"],
+            "estado": estado,
+            "duracion_ms": round(segundos * 1000, 2),
+            "upstream_llamadas": contador.llamadas,
+            "upstream_ms": round(contador.segundos * 1000, 2),
+        }
+        if error is not None:
+            logger.error("peticion", extra=campos, exc_info=error)
+        elif estado >= 500:
+            logger.error("peticion", extra=campos)
+        elif estado >= 400:
+            logger.warning("peticion", extra=campos)
+        else:
+            logger.info("peticion", extra=campos)
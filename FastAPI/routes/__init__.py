@@ -4,4 +4,5 @@ from routes.usuarios import router as router_usuarios
 from routes.colonias import router as router_colonias
 from routes.residencias import router as router_residencias
 from routes.visitas import router as router_visitas
+from routes.anuncios import router as router_anuncios
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
@@ -12,16 +12,19 @@ from crud.anuncios import (
     delete_anuncio
 )
 from database import get_db
+from routes.etag import etag_de_filas, responder_con_etag
+from routes.serializacion import serializar
+from crud.paginacion import LIMITE_POR_DEFECTO, LIMITE_MAXIMO, HEADER_CURSOR
 import logging
 
-router = APIRouter(prefix="/anuncios", tags=["anuncios"])
+router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.post("/", response_model=Anuncio)
 async def create_anuncio_route(anuncio_data: AnuncioCreate, db=Depends(get_db)):
     """Crea un nuevo anuncio."""
     try:
-        created_anuncio = create_anuncio(anuncio_data, db)
+        created_anuncio = await create_anuncio(anuncio_data, db)
         return created_anuncio
     except Exception as e:
         logger.error(f"Error al crear anuncio: {str(e)}")
@@ -30,29 +33,36 @@ async def create_anuncio_route(anuncio_data: AnuncioCreate, db=Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 @router.get("/", response_model=List[Anuncio])
-async def get_anuncios_route(db=Depends(get_db)):
-    """Obtiene todos los anuncios."""
-    anuncios = get_anuncios(db)
+async def get_anuncios_route(
+    response: Response,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    db=Depends(get_db)
+):
+    """Obtiene una página de anuncios; la siguiente se pide con el cursor del header X-Next-Cursor."""
+    anuncios, next_cursor = await get_anuncios(db, limit, cursor)
+    if next_cursor:
+        response.headers[HEADER_CURSOR] = next_cursor
     return anuncios
 
 @router.get("/{anuncio_id}", response_model=Anuncio)
 async def get_anuncio_route(anuncio_id: UUID, db=Depends(get_db)):
     """Obtiene un anuncio por su ID."""
-    anuncio = get_anuncio_by_id(anuncio_id, db)
+    anuncio = await get_anuncio_by_id(anuncio_id, db)
     if not anuncio:
         raise HTTPException(status_code=404, detail="Anuncio no encontrado")
     return anuncio
 
 @router.get("/colonia/{colonia_id}", response_model=List[Anuncio])
-async def get_anuncios_by_colonia_route(colonia_id: UUID, db=Depends(get_db)):
-    """Obtiene todos los anuncios de una colonia específica."""
-    anuncios = get_anuncios_by_colonia(colonia_id, db)
-    return anuncios
+async def get_anuncios_by_colonia_route(colonia_id: UUID, request: Request, db=Depends(get_db)):
+    """Obtiene los anuncios vigentes de una colonia (304 si no cambiaron desde el ETag enviado)."""
+    anuncios = await get_anuncios_by_colonia(colonia_id, db)
+    return responder_con_etag(request, etag_de_filas(anuncios, colonia_id), lambda: serializar(Anuncio, anuncios))
 
 @router.put("/{anuncio_id}", response_model=Anuncio)
 async def update_anuncio_route(anuncio_id: UUID, anuncio_data: dict, db=Depends(get_db)):
     """Actualiza un anuncio existente."""
-    updated = update_anuncio(anuncio_id, anuncio_data, db)
+    updated = await update_anuncio(anuncio_id, anuncio_data, db)
     if not updated:
         raise HTTPException(status_code=404, detail="Anuncio no encontrado")
     return updated
@@ -60,7 +70,7 @@ async def update_anuncio_route(anuncio_id: UUID, anuncio_data: dict, db=Depends(
 @router.delete("/{anuncio_id}")
 async def delete_anuncio_route(anuncio_id: UUID, db=Depends(get_db)):
     """Elimina un anuncio por su ID."""
-    success = delete_anuncio(anuncio_id, db)
+    success = await delete_anuncio(anuncio_id, db)
     if not success:
         raise HTTPException(status_code=404, detail="Anuncio no encontrado")
     return {"message": "Anuncio eliminado correctamente"}
\ No newline at end of file
@@ -1,17 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse
+from datetime import date
+from typing import List, Optional
 import logging
 from uuid import UUID
 from database import get_db
 from models.colonia import Colonia, ColoniaCreate
 from models.residencia import Residencia
+from models.visita import AnaliticaVisitas
 from crud.colonias import create_colonia, get_colonias, get_colonia_by_id
-from crud.residencias import get_residencias_by_colonia
-from crud.base import serialize_model
+from crud.residencias import get_residencias_by_colonia, create_residencias_bulk
+from crud.manifiesto import get_manifiesto
+from crud.analitica import get_analitica
+from routes.etag import coincide, etag_de_filas, responder_con_etag
+from routes.serializacion import serializar
+from crud.paginacion import LIMITE_POR_DEFECTO, LIMITE_MAXIMO, HEADER_CURSOR
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+MAX_RESIDENCIAS_GENERADAS = 5000
+
 @router.post("/", response_model=Colonia)
 async def create_colonia_route(colonia_data: ColoniaCreate, db=Depends(get_db)):
     """Crea una nueva colonia."""
@@ -23,7 +32,7 @@ async def create_colonia_route(colonia_data: ColoniaCreate, db=Depends(get_db)):
             admin_principal_id=colonia_data.admin_principal_id
             # Los demás campos se generan automáticamente
         )
-        created_colonia = create_colonia(colonia, db)
+        created_colonia = await create_colonia(colonia, db)
         return created_colonia
     except Exception as e:
         # Logging detallado para depuración
@@ -33,45 +42,91 @@ async def create_colonia_route(colonia_data: ColoniaCreate, db=Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 @router.get("/", response_model=List[Colonia])
-async def get_colonias_route(db=Depends(get_db)):
-    colonias = get_colonias(db)
-    return colonias
+async def get_colonias_route(
+    request: Request,
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    db=Depends(get_db)
+):
+    colonias, next_cursor = await get_colonias(db, limit, cursor)
+    headers = {HEADER_CURSOR: next_cursor} if next_cursor else None
+    etag = etag_de_filas(colonias, limit, cursor)
+    return responder_con_etag(request, etag, lambda: serializar(Colonia, colonias), headers)
 
 @router.get("/{colonia_id}/residencias", response_model=List[Residencia])
-async def get_residencias_by_colonia_route(colonia_id: UUID, db=Depends(get_db)):
-    """Obtiene todas las residencias de una colonia."""
-    residencias = get_residencias_by_colonia(colonia_id, db)
-    return residencias
+async def get_residencias_by_colonia_route(colonia_id: UUID, request: Request, db=Depends(get_db)):
+    """Obtiene todas las residencias de una colonia (304 si no cambiaron desde el ETag enviado)."""
+    residencias = await get_residencias_by_colonia(colonia_id, db)
+    etag = etag_de_filas(residencias, colonia_id)
+    return responder_con_etag(request, etag, lambda: serializar(Residencia, residencias))
+
+@router.get("/{colonia_id}/manifiesto")
+async def get_manifiesto_route(colonia_id: UUID, request: Request, desde: Optional[int] = None, db=Depends(get_db)):
+    """
+    Manifiesto de la caseta: visitas esperadas hoy o activas en la colonia.
+    - If-None-Match con el ETag anterior responde 304 si no hubo cambios
+    - desde=<version> devuelve solo altas y bajas posteriores a esa versión
+      (o el manifiesto completo si esa versión ya no está disponible)
+    """
+    manifiesto = await get_manifiesto(colonia_id, db)
+    headers = {"ETag": manifiesto.etag}
+
+    if coincide(request, manifiesto.etag):
+        return Response(status_code=304, headers=headers)
+
+    if desde is not None:
+        delta = manifiesto.delta(desde)
+        if delta is not None:
+            return JSONResponse(delta, headers=headers)
+
+    return JSONResponse(manifiesto.completo(), headers=headers)
 
-@router.get("/{colonia_id}/generar-codigo/{cantidad}")
-async def generar_codigos_residencias_route(colonia_id: UUID, cantidad: int, db=Depends(get_db)):
+@router.get("/{colonia_id}/analitica", response_model=AnaliticaVisitas)
+async def get_analitica_route(colonia_id: UUID, desde: Optional[date] = None, hasta: Optional[date] = None, db=Depends(get_db)):
+    """
+    Tablero de visitas de la colonia: por día, por residencia y por tipo,
+    tasa de escaneo y retraso promedio de llegada. desde/hasta (inclusive)
+    filtran por el día de fecha_programada.
+    """
+    if desde and hasta and desde > hasta:
+        raise HTTPException(status_code=400, detail="desde no puede ser posterior a hasta")
+    analitica = await get_analitica(colonia_id, db)
+    return analitica.resumen(desde, hasta)
+
+@router.post("/{colonia_id}/generar-codigo/{cantidad}")
+async def generar_codigos_residencias_route(
+    colonia_id: UUID,
+    cantidad: int = Path(..., ge=1, le=MAX_RESIDENCIAS_GENERADAS),
+    db=Depends(get_db)
+):
     """Genera un número específico de códigos para residencias en una colonia."""
     # Verificar que la colonia existe
-    colonia_response = db.table('colonias').select('*').eq('id', str(colonia_id)).execute()
-    if not colonia_response.data:
+    colonia = await get_colonia_by_id(colonia_id, db)
+    if not colonia:
         raise HTTPException(status_code=404, detail="Colonia no encontrada")
-    
-    residencias_generadas = []
-    
+
     # Generar las residencias con sus códigos
-    for i in range(cantidad):
-        nueva_residencia = Residencia(
+    residencias = [
+        Residencia(
             numero=f"Auto-{i+1}",  # Número provisional
             calle="Por asignar",   # Calle provisional
             referencia="Residencia generada automáticamente",
             colonia_id=colonia_id
         )
-        
-        # Serializar y guardar
-        serialized_data = serialize_model(nueva_residencia)
-        response = db.table('residencias').insert(serialized_data).execute()
-        
-        if response.data:
-            # Guardar la información con el ID generado
-            residencia_guardada = response.data[0]
-            residencias_generadas.append({
-                "id": residencia_guardada["id"],
-                "codigo": residencia_guardada["id"]  # El UUID como código
-            })
-    
-    return {"residencias_generadas": residencias_generadas}
\ No newline at end of file
+        for i in range(cantidad)
+    ]
+
+    creadas, lotes = await create_residencias_bulk(residencias, db)
+    for lote in lotes:
+        if lote["error"]:
+            logger.error(f"Error en lote {lote['lote']} al generar residencias: {lote['error']}")
+
+    return {
+        "residencias_generadas": [
+            {"id": r["id"], "codigo": r["id"]}  # El UUID como código
+            for r in creadas
+        ],
+        "solicitadas": cantidad,
+        "insertadas": len(creadas),
+        "lotes": lotes,
+    }
\ No newline at end of file
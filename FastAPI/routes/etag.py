@@ -0,0 +1,83 @@
+"""
+ETag / If-None-Match para las rutas de lectura.
+
+Una ruta que quiera soportarlo calcula un ETag barato a partir de las filas
+(`etag_de_filas`: id + updated_at de cada fila, sin serializar nada) y
+devuelve `responder_con_etag(request, etag, construir)`. Si el cliente ya
+tiene esa versión se responde 304 sin cuerpo y sin serializar nada; si no,
+se llama a `construir()`, que devuelve el JSON en bytes, y se responde con
+el ETag.
+
+Uso:
+    etag = etag_de_filas(filas, colonia_id)
+    return responder_con_etag(request, etag, lambda: serializar(Residencia, filas))
+"""
+
+import hashlib
+from fastapi import Request, Response
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+def _valor(fila: Any, campo: str) -> Any:
+    return fila.get(campo) if isinstance(fila, dict) else getattr(fila, campo, None)
+
+
+def etag_de_filas(filas: Iterable[Any], *partes: Any) -> str:
+    """
+    ETag fuerte a partir del id y updated_at de cada fila, más el número de
+    filas y cualquier parte extra que distinga la consulta (filtros, cursor...).
+    Acepta diccionarios o modelos.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for parte in partes:
+        h.update(str(parte).encode())
+        h.update(b"\x00")
+    total = 0
+    for fila in filas:
+        h.update(f"{_valor(fila, 'id')}|{_valor(fila, 'updated_at')}\x00".encode())
+        total += 1
+    h.update(str(total).encode())
+    return f'"{h.hexdigest()}"'
+
+
+def etag_de_contenido(cuerpo: bytes) -> str:
+    """ETag fuerte a partir de los bytes de la respuesta."""
+    return f'"{hashlib.blake2b(cuerpo, digest_size=16).hexdigest()}"'
+
+
+def coincide(request: Request, etag: str) -> bool:
+    """Compara If-None-Match con el ETag (comparación débil, como pide RFC 9110)."""
+    encabezado = request.headers.get("if-none-match")
+    if not encabezado:
+        return False
+    if encabezado.strip() == "*":
+        return True
+    etiquetas = {e.strip().removeprefix("W/") for e in encabezado.split(",")}
+    return etag.removeprefix("W/") in etiquetas
+
+
+def responder_con_etag(
+    request: Request,
+    etag: Optional[str],
+    construir: Callable[[], bytes],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Devuelve 304 si el cliente ya tiene `etag`; si no, responde con el JSON de `construir()`.
+    Con etag=None se calcula a partir del cuerpo serializado.
+    """
+    headers = dict(headers or {})
+    headers["Cache-Control"] = "private, no-cache"
+
+    if etag is not None and coincide(request, etag):
+        headers["ETag"] = etag
+        return Response(status_code=304, headers=headers)
+
+    cuerpo = construir()
+    if etag is None:
+        etag = etag_de_contenido(cuerpo)
+        if coincide(request, etag):
+            headers["ETag"] = etag
+            return Response(status_code=304, headers=headers)
+    headers["ETag"] = etag
+    return Response(content=cuerpo, media_type="application/json", headers=headers)
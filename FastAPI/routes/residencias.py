@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
 import logging
 from uuid import UUID
 from database import get_db
+from routes.serializacion import respuesta_json
+from crud.paginacion import LIMITE_POR_DEFECTO, LIMITE_MAXIMO, HEADER_CURSOR
 from models.residencia import Residencia, ResidenciaCreate, ResidenciaUsuario, ResidenciaUsuarioCreate
 from crud.residencias import (
     create_residencia, get_residencias, get_residencia_by_id,
@@ -17,7 +19,7 @@ logger = logging.getLogger(__name__)
 async def create_residencia_route(residencia_data: ResidenciaCreate, db=Depends(get_db)):
     """Crea una nueva residencia."""
     try:
-        created_residencia = create_residencia(residencia_data, db)
+        created_residencia = await create_residencia(residencia_data, db)
         return created_residencia
     except Exception as e:
         logger.error(f"Error al crear residencia: {str(e)}")
@@ -26,15 +28,20 @@ async def create_residencia_route(residencia_data: ResidenciaCreate, db=Depends(
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 @router.get("/", response_model=List[Residencia])
-async def get_residencias_route(db=Depends(get_db)):
-    """Obtiene todas las residencias."""
-    residencias = get_residencias(db)
-    return residencias
+async def get_residencias_route(
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
+    db=Depends(get_db)
+):
+    """Obtiene una página de residencias; la siguiente se pide con el cursor del header X-Next-Cursor."""
+    residencias, next_cursor = await get_residencias(db, limit, cursor)
+    headers = {HEADER_CURSOR: next_cursor} if next_cursor else None
+    return respuesta_json(Residencia, residencias, headers)
 
 @router.get("/{residencia_id}", response_model=Residencia)
 async def get_residencia_route(residencia_id: UUID, db=Depends(get_db)):
     """Obtiene una residencia por su ID."""
-    residencia = get_residencia_by_id(residencia_id, db)
+    residencia = await get_residencia_by_id(residencia_id, db)
     if not residencia:
         raise HTTPException(status_code=404, detail="Residencia no encontrada")
     return residencia
@@ -44,7 +51,7 @@ async def get_residencia_route(residencia_id: UUID, db=Depends(get_db)):
 async def create_residencia_usuario_route(residencia_usuario_data: ResidenciaUsuarioCreate, db=Depends(get_db)):
     """Asocia un usuario a una residencia."""
     try:
-        created = create_residencia_usuario(residencia_usuario_data, db)
+        created = await create_residencia_usuario(residencia_usuario_data, db)
         return created
     except Exception as e:
         logger.error(f"Error al asociar usuario a residencia: {str(e)}")
@@ -57,8 +64,8 @@ async def create_residencia_usuario_route(residencia_usuario_data: ResidenciaUsu
 async def get_residencias_by_usuario_route(usuario_id: UUID, db=Depends(get_db)):
     """Obtiene todas las residencias asociadas a un usuario."""
     try:
-        residencias = get_residencias_by_usuario(usuario_id, db)
-        return [Residencia(**residencia) for residencia in residencias]
+        residencias = await get_residencias_by_usuario(usuario_id, db)
+        return respuesta_json(Residencia, residencias)
     except Exception as e:
         logger.error(f"Error al obtener residencias del usuario: {str(e)}")
         if isinstance(e, HTTPException):
@@ -70,7 +77,7 @@ async def get_residencias_by_usuario_route(usuario_id: UUID, db=Depends(get_db))
 @router.patch("/usuarios/verificar/{residencia_id}/{usuario_id}")
 async def verificar_residencia_usuario_route(residencia_id: UUID, usuario_id: UUID, db=Depends(get_db)):
     """Marca como verificada la relación entre un usuario y una residencia."""
-    success = verificar_residencia_usuario(residencia_id, usuario_id, db)
+    success = await verificar_residencia_usuario(residencia_id, usuario_id, db)
     if not success:
         raise HTTPException(status_code=404, detail="Relación residencia-usuario no encontrada")
     return {"message": "Relación verificada correctamente"}
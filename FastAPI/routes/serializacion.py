@@ -0,0 +1,45 @@
+"""
+Serialización rápida de listas de filas de la base.
+
+Si una ruta devuelve `[Visita(**fila) for fila in filas]`, cada fila se
+valida al construir el modelo y FastAPI la vuelve a validar y a convertir
+con `jsonable_encoder` por el response_model. Aquí las filas se validan
+una sola vez con un TypeAdapter compilado (uno por tipo, reutilizado) y
+pydantic-core escribe el JSON directamente a bytes, sin pasar por
+diccionarios intermedios.
+
+La ruta conserva su response_model para la documentación, pero devuelve
+`respuesta_json(...)`, que FastAPI envía tal cual.
+"""
+
+from functools import lru_cache
+from fastapi import Response
+from pydantic import TypeAdapter, create_model
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@lru_cache(maxsize=None)
+def adaptador(tipo: Any) -> TypeAdapter:
+    """TypeAdapter compilado para `tipo`; se construye una vez por tipo."""
+    return TypeAdapter(tipo)
+
+
+@lru_cache(maxsize=256)
+def proyeccion(modelo: Any, campos: Tuple[str, ...]) -> Any:
+    """Modelo con solo `campos` de `modelo` (todos opcionales), para respuestas con fields=."""
+    definiciones = {c: (Optional[modelo.model_fields[c].annotation], None) for c in campos}
+    return create_model(f"{modelo.__name__}Parcial", **definiciones)
+
+
+def serializar(modelo: Any, filas: Any) -> bytes:
+    """
+    Valida `filas` contra List[modelo] y devuelve el JSON en bytes.
+    Acepta diccionarios de la base o instancias del modelo (que no se revalidan).
+    """
+    lista = adaptador(List[modelo])
+    return lista.dump_json(lista.validate_python(filas))
+
+
+def respuesta_json(modelo: Any, filas: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Respuesta JSON con las filas serializadas por `serializar`."""
+    return Response(content=serializar(modelo, filas), media_type="application/json", headers=headers)
@@ -1,25 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Literal, Optional
 from uuid import UUID
 from datetime import datetime, timedelta
+import asyncio
+import csv
+import io
+import json
 import logging
 from database import get_db
-from models.visita import Visita, VisitaCreate
+from crud.eventos import bus
+from crud.indice_visitas import proximas_visitas
+from routes.etag import etag_de_filas, responder_con_etag
+from routes.serializacion import proyeccion, respuesta_json, serializar
+from crud.paginacion import LIMITE_POR_DEFECTO, LIMITE_MAXIMO, HEADER_CURSOR
+from models.visita import Visita, VisitaCreate, EscaneoQR, ResultadoLoteVisitas
 from crud.visitas import (
-    create_visita, get_visitas, get_visita_by_id,
+    create_visita, create_visitas_batch, buscar_visitas, columnas_visita, get_visita_by_id,
     get_visitas_by_residencia, get_visitas_by_usuario,
     get_visitas_activas_by_residencia, update_visita,
-    delete_visita, scan_visita_qr, get_visitas_by_fecha
+    delete_visita, scan_visita_qr, scan_visita_token, get_visitas_by_fecha,
+    iterar_visitas_by_fecha
 )
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Máximo de visitas por petición en POST /visitas/batch
+MAX_VISITAS_LOTE = 200
+
+# Máximo de llegadas en GET /visitas/colonia/{colonia_id}/proximas
+MAX_PROXIMAS = 100
+
+# Segundos sin eventos tras los que se manda un latido para mantener viva la conexión
+LATIDO_SEGUNDOS = 15
+
 @router.post("/", response_model=Visita)
 async def create_visita_route(visita_data: VisitaCreate, db=Depends(get_db)):
     """Crea una nueva visita."""
     try:
-        created_visita = create_visita(visita_data, db)
+        created_visita = await create_visita(visita_data, db)
         return created_visita
     except Exception as e:
         logger.error(f"Error al crear visita: {str(e)}")
@@ -27,6 +47,25 @@ async def create_visita_route(visita_data: VisitaCreate, db=Depends(get_db)):
             raise e
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@router.post("/batch", response_model=ResultadoLoteVisitas)
+async def create_visitas_batch_route(
+    visitas_data: List[Dict[str, Any]] = Body(..., min_length=1, max_length=MAX_VISITAS_LOTE),
+    db=Depends(get_db)
+):
+    """
+    Crea varias visitas en una sola petición (fiestas, empresas de servicio).
+    Cada elemento tiene la forma de VisitaCreate. Se responde con el
+    resultado de cada uno en el mismo orden; los que fallan traen `error` y
+    no impiden que se creen los demás.
+    """
+    try:
+        return await create_visitas_batch(visitas_data, db)
+    except Exception as e:
+        logger.error(f"Error al crear visitas en lote: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
 @router.get("/", response_model=List[Visita])
 async def get_visitas_route(
     residencia_id: Optional[UUID] = None,
@@ -34,32 +73,37 @@ async def get_visitas_route(
     activas: bool = None,
     fecha_inicio: Optional[datetime] = None,
     fecha_fin: Optional[datetime] = None,
+    colonia_id: Optional[UUID] = None,
+    tipo: Optional[str] = None,
+    qr_activo: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description="Columnas a devolver separadas por comas (id y created_at siempre van)"),
+    limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO),
+    cursor: Optional[str] = None,
     db=Depends(get_db)
 ):
     """
-    Obtiene visitas con filtros opcionales:
-    - Si se proporciona residencia_id, filtra por residencia
-    - Si se proporciona usuario_id, filtra por usuario
+    Obtiene visitas con filtros opcionales, que se combinan entre sí en una
+    sola consulta:
+    - residencia_id, usuario_id, colonia_id, tipo y qr_activo filtran por igualdad
     - Si activas=True, solo devuelve visitas activas
-    - Si se proporcionan fecha_inicio y fecha_fin, filtra por rango de fechas
+    - fecha_inicio y fecha_fin acotan fecha_programada (inclusive)
+    - fields=a,b,c devuelve solo esas columnas
+    - Con o sin filtros devuelve una página de `limit` visitas; la siguiente
+      se pide con el cursor del header X-Next-Cursor
     """
+    headers = None
     try:
-        # Filtrar por residencia
-        if residencia_id is not None and activas is True:
-            visitas_data = get_visitas_activas_by_residencia(residencia_id, db)
-        elif residencia_id is not None:
-            visitas_data = get_visitas_by_residencia(residencia_id, db)
-        # Filtrar por usuario
-        elif usuario_id is not None:
-            visitas_data = get_visitas_by_usuario(usuario_id, db)
-        # Filtrar por fecha
-        elif fecha_inicio is not None and fecha_fin is not None:
-            visitas_data = get_visitas_by_fecha(fecha_inicio, fecha_fin, db)
-        # Sin filtros
-        else:
-            visitas_data = get_visitas(db)
-        
-        return [Visita(**visita) for visita in visitas_data]
+        columnas = columnas_visita(fields)
+        visitas_data, next_cursor = await buscar_visitas(
+            db, residencia_id=residencia_id, usuario_id=usuario_id, colonia_id=colonia_id,
+            activas=activas, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, tipo=tipo,
+            qr_activo=qr_activo, columnas=columnas, limit=limit, cursor=cursor,
+        )
+        if next_cursor:
+            headers = {HEADER_CURSOR: next_cursor}
+
+        modelo = proyeccion(Visita, columnas) if columnas else Visita
+        return respuesta_json(modelo, visitas_data, headers)
     except Exception as e:
         logger.error(f"Error al obtener visitas: {str(e)}")
         if isinstance(e, HTTPException):
@@ -69,7 +113,7 @@ async def get_visitas_route(
 @router.get("/{visita_id}", response_model=Visita)
 async def get_visita_route(visita_id: UUID, db=Depends(get_db)):
     """Obtiene una visita por su ID."""
-    visita = get_visita_by_id(visita_id, db)
+    visita = await get_visita_by_id(visita_id, db)
     if not visita:
         raise HTTPException(status_code=404, detail="Visita no encontrada")
     return visita
@@ -78,7 +122,7 @@ async def get_visita_route(visita_id: UUID, db=Depends(get_db)):
 async def update_visita_route(visita_id: UUID, visita_data: dict, db=Depends(get_db)):
     """Actualiza una visita existente."""
     try:
-        updated_visita = update_visita(visita_id, visita_data, db)
+        updated_visita = await update_visita(visita_id, visita_data, db)
         return updated_visita
     except HTTPException as e:
         raise e
@@ -90,7 +134,7 @@ async def update_visita_route(visita_id: UUID, visita_data: dict, db=Depends(get
 async def delete_visita_route(visita_id: UUID, db=Depends(get_db)):
     """Elimina una visita."""
     try:
-        delete_visita(visita_id, db)
+        await delete_visita(visita_id, db)
         return {"message": "Visita eliminada correctamente"}
     except HTTPException as e:
         raise e
@@ -102,7 +146,7 @@ async def delete_visita_route(visita_id: UUID, db=Depends(get_db)):
 async def scan_visita_qr_route(visita_id: UUID, db=Depends(get_db)):
     """Registra el escaneo de un QR de visita."""
     try:
-        updated_visita = scan_visita_qr(visita_id, db)
+        updated_visita = await scan_visita_qr(visita_id, db)
         return updated_visita
     except HTTPException as e:
         raise e
@@ -110,16 +154,28 @@ async def scan_visita_qr_route(visita_id: UUID, db=Depends(get_db)):
         logger.error(f"Error al escanear QR de visita: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@router.post("/scan", response_model=Visita)
+async def scan_visita_token_route(escaneo: EscaneoQR, db=Depends(get_db)):
+    """Registra el escaneo a partir del token firmado del QR (un solo viaje a la base)."""
+    try:
+        return await scan_visita_token(escaneo.token, db)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Error al escanear QR de visita: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
 @router.get("/residencia/{residencia_id}", response_model=List[Visita])
-async def get_visitas_by_residencia_route(residencia_id: UUID, activas: bool = False, db=Depends(get_db)):
-    """Obtiene las visitas de una residencia específica."""
+async def get_visitas_by_residencia_route(residencia_id: UUID, request: Request, activas: bool = False, db=Depends(get_db)):
+    """Obtiene las visitas de una residencia específica (304 si no cambiaron desde el ETag enviado)."""
     try:
         if activas:
-            visitas_data = get_visitas_activas_by_residencia(residencia_id, db)
+            visitas_data = await get_visitas_activas_by_residencia(residencia_id, db)
         else:
-            visitas_data = get_visitas_by_residencia(residencia_id, db)
-        
-        return [Visita(**visita) for visita in visitas_data]
+            visitas_data = await get_visitas_by_residencia(residencia_id, db)
+
+        etag = etag_de_filas(visitas_data, residencia_id, activas)
+        return responder_con_etag(request, etag, lambda: serializar(Visita, visitas_data))
     except Exception as e:
         logger.error(f"Error al obtener visitas por residencia: {str(e)}")
         if isinstance(e, HTTPException):
@@ -130,8 +186,8 @@ async def get_visitas_by_residencia_route(residencia_id: UUID, activas: bool = F
 async def get_visitas_by_usuario_route(usuario_id: UUID, db=Depends(get_db)):
     """Obtiene las visitas creadas por un usuario específico."""
     try:
-        visitas_data = get_visitas_by_usuario(usuario_id, db)
-        return [Visita(**visita) for visita in visitas_data]
+        visitas_data = await get_visitas_by_usuario(usuario_id, db)
+        return respuesta_json(Visita, visitas_data)
     except Exception as e:
         logger.error(f"Error al obtener visitas por usuario: {str(e)}")
         if isinstance(e, HTTPException):
@@ -142,14 +198,138 @@ async def get_visitas_by_usuario_route(usuario_id: UUID, db=Depends(get_db)):
 async def get_visitas_by_fecha_route(
     fecha_inicio: datetime = Query(..., description="Fecha de inicio (formato ISO)"),
     fecha_fin: datetime = Query(..., description="Fecha fin (formato ISO)"),
+    colonia_id: Optional[UUID] = Query(None, description="Solo visitas de esta colonia (usa el índice en memoria)"),
     db=Depends(get_db)
 ):
     """Obtiene visitas programadas en un rango de fechas."""
     try:
-        visitas_data = get_visitas_by_fecha(fecha_inicio, fecha_fin, db)
-        return [Visita(**visita) for visita in visitas_data]
+        visitas_data = await get_visitas_by_fecha(fecha_inicio, fecha_fin, db, colonia_id)
+        return respuesta_json(Visita, visitas_data)
     except Exception as e:
         logger.error(f"Error al obtener visitas por fecha: {str(e)}")
         if isinstance(e, HTTPException):
             raise e
-        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+@router.get("/colonia/{colonia_id}/proximas", response_model=List[Visita])
+async def get_proximas_visitas_route(
+    colonia_id: UUID,
+    cantidad: int = Query(10, ge=1, le=MAX_PROXIMAS),
+    db=Depends(get_db)
+):
+    """Próximas llegadas de la colonia: visitas sin escanear a partir de ahora, en orden de fecha."""
+    try:
+        visitas_data = await proximas_visitas(colonia_id, cantidad, db)
+        return respuesta_json(Visita, visitas_data)
+    except Exception as e:
+        logger.error(f"Error al obtener próximas visitas: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
+# Columnas del CSV de exportación, en el mismo orden que el modelo Visita
+COLUMNAS_EXPORTACION = list(Visita.model_fields.keys())
+
+
+async def _exportar_ndjson(visitas):
+    async for visita in visitas:
+        yield json.dumps(visita, default=str, ensure_ascii=False) + "\n"
+
+
+async def _exportar_csv(visitas, filas_por_bloque: int = 500):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNAS_EXPORTACION, extrasaction="ignore")
+    writer.writeheader()
+    filas = 0
+    async for visita in visitas:
+        writer.writerow(visita)
+        filas += 1
+        if filas % filas_por_bloque == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+@router.get("/fecha/exportar")
+async def exportar_visitas_by_fecha_route(
+    fecha_inicio: datetime = Query(..., description="Fecha de inicio (formato ISO)"),
+    fecha_fin: datetime = Query(..., description="Fecha fin (formato ISO)"),
+    formato: Literal["ndjson", "csv"] = "ndjson",
+    db=Depends(get_db)
+):
+    """
+    Exporta las visitas de un rango de fechas para auditoría.
+    Las filas se leen por lotes y se envían conforme llegan, así que la
+    memoria usada no depende del tamaño del rango.
+    """
+    visitas = iterar_visitas_by_fecha(fecha_inicio, fecha_fin, db)
+    nombre = f"visitas_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}.{formato}"
+    headers = {"Content-Disposition": f'attachment; filename="{nombre}"'}
+
+    if formato == "csv":
+        return StreamingResponse(_exportar_csv(visitas), media_type="text/csv", headers=headers)
+    return StreamingResponse(_exportar_ndjson(visitas), media_type="application/x-ndjson", headers=headers)
+
+
+# Eventos en tiempo real: creadas, actualizadas, escaneadas, eliminadas y expiradas.
+# Sustituyen al sondeo de GET /visitas/residencia/{id}?activas=true.
+
+async def _flujo_sse(request: Request, canal: str):
+    with bus.suscribir(canal) as suscripcion:
+        while not await request.is_disconnected():
+            mensaje = await suscripcion.siguiente(timeout=LATIDO_SEGUNDOS)
+            yield f"data: {mensaje}\n\n" if mensaje is not None else ": latido\n\n"
+
+
+def _respuesta_sse(request: Request, canal: str) -> StreamingResponse:
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_flujo_sse(request, canal), media_type="text/event-stream", headers=headers)
+
+
+async def _transmitir_ws(websocket: WebSocket, canal: str):
+    await websocket.accept()
+    with bus.suscribir(canal) as suscripcion:
+        async def enviar():
+            while True:
+                mensaje = await suscripcion.siguiente(timeout=LATIDO_SEGUNDOS)
+                await websocket.send_text(mensaje if mensaje is not None else '{"tipo": "latido"}')
+
+        async def recibir():
+            # El cliente no manda nada; solo se espera a que cierre
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+
+        tareas = [asyncio.ensure_future(enviar()), asyncio.ensure_future(recibir())]
+        try:
+            await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+
+@router.get("/eventos/residencia/{residencia_id}")
+async def eventos_residencia_sse(residencia_id: UUID, request: Request):
+    """Eventos de las visitas de una residencia (Server-Sent Events)."""
+    return _respuesta_sse(request, f"residencia:{residencia_id}")
+
+
+@router.get("/eventos/colonia/{colonia_id}")
+async def eventos_colonia_sse(colonia_id: UUID, request: Request):
+    """Eventos de las visitas de toda una colonia, para la caseta (Server-Sent Events)."""
+    return _respuesta_sse(request, f"colonia:{colonia_id}")
+
+
+@router.websocket("/ws/residencia/{residencia_id}")
+async def eventos_residencia_ws(websocket: WebSocket, residencia_id: UUID):
+    """Eventos de las visitas de una residencia (WebSocket)."""
+    await _transmitir_ws(websocket, f"residencia:{residencia_id}")
+
+
+@router.websocket("/ws/colonia/{colonia_id}")
+async def eventos_colonia_ws(websocket: WebSocket, colonia_id: UUID):
+    """Eventos de las visitas de toda una colonia (WebSocket)."""
+    await _transmitir_ws(websocket, f"colonia:{colonia_id}")
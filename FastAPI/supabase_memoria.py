@@ -0,0 +1,407 @@
+"""
+Sustituto en memoria del cliente asíncrono de Supabase.
+
+Implementa la parte de la API de postgrest/supabase que usa `crud/`:
+table().select/insert/upsert/update/delete con los filtros eq, neq, gt, gte, lt,
+lte, in_, is_, or_, order, limit y range, más rpc('is_qr_valid'|'scan_qr')
+y auth.sign_up. Sirve para correr la API y los benchmarks sin un proyecto
+de Supabase. Se activa con DB_BACKEND=memoria.
+
+Cada execute() espera `latencia_ms` (+/- `jitter_ms`) para simular el viaje
+de ida y vuelta a PostgREST.
+"""
+
+import asyncio
+import copy
+import random
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+
+def _normalizar(valor: Any) -> Any:
+    """Convierte un valor a algo comparable (fechas ISO a datetime UTC naive)."""
+    if isinstance(valor, datetime):
+        if valor.tzinfo is not None:
+            valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+        return valor
+    if isinstance(valor, str) and len(valor) >= 10 and valor[4:5] == "-" and valor[7:8] == "-":
+        try:
+            return _normalizar(datetime.fromisoformat(valor.replace("Z", "+00:00")))
+        except ValueError:
+            return valor
+    return valor
+
+
+def _literal(valor: str) -> Any:
+    """Interpreta un literal de PostgREST (los que llegan dentro de or_())."""
+    if len(valor) >= 2 and valor[0] == valor[-1] == '"':
+        return valor[1:-1]
+    if valor == "null":
+        return None
+    if valor == "true":
+        return True
+    if valor == "false":
+        return False
+    return valor
+
+
+def _comparar(operador: str, actual: Any, esperado: Any) -> bool:
+    if operador == "is":
+        esperado = _literal(esperado) if isinstance(esperado, str) else esperado
+        return actual is esperado if esperado is None else actual == esperado
+    if operador == "in":
+        return str(actual) in {str(v) for v in esperado}
+    if actual is None or esperado is None:
+        return operador == "neq" and actual is not esperado
+    if isinstance(actual, bool) or isinstance(esperado, bool):
+        actual, esperado = str(actual).lower(), str(esperado).lower()
+    elif isinstance(actual, (int, float)) and isinstance(esperado, str):
+        try:
+            esperado = type(actual)(esperado)
+        except ValueError:
+            actual = str(actual)
+    else:
+        actual, esperado = _normalizar(actual), _normalizar(esperado)
+        if type(actual) is not type(esperado):
+            actual, esperado = str(actual), str(esperado)
+    if operador == "eq":
+        return actual == esperado
+    if operador == "neq":
+        return actual != esperado
+    if operador == "gt":
+        return actual > esperado
+    if operador == "gte":
+        return actual >= esperado
+    if operador == "lt":
+        return actual < esperado
+    if operador == "lte":
+        return actual <= esperado
+    raise ValueError(f"Operador no soportado: {operador}")
+
+
+def _dividir(expresion: str) -> List[str]:
+    """Separa por comas de primer nivel: 'a.eq.1,and(b.gt.2,c.lt.3)'."""
+    partes, nivel, actual = [], 0, ""
+    for caracter in expresion:
+        if caracter == "," and nivel == 0:
+            partes.append(actual)
+            actual = ""
+            continue
+        if caracter == "(":
+            nivel += 1
+        elif caracter == ")":
+            nivel -= 1
+        actual += caracter
+    if actual:
+        partes.append(actual)
+    return partes
+
+
+def _filtro_logico(expresion: str):
+    """Compila una expresión de or_()/and() de PostgREST a un predicado."""
+    expresion = expresion.strip()
+    for conector, combinar in (("and(", all), ("or(", any)):
+        if expresion.startswith(conector) and expresion.endswith(")"):
+            hijos = [_filtro_logico(p) for p in _dividir(expresion[len(conector):-1])]
+            return lambda fila: combinar(h(fila) for h in hijos)
+    columna, operador, valor = expresion.split(".", 2)
+    if operador == "in":
+        valores = [_literal(v) for v in valor.strip("()").split(",")]
+        return lambda fila: _comparar("in", fila.get(columna), valores)
+    return lambda fila: _comparar(operador, fila.get(columna), _literal(valor))
+
+
+class _Consulta:
+    """Builder encadenable equivalente a los de postgrest."""
+
+    def __init__(self, cliente: "SupabaseEnMemoria", tabla: str):
+        self._cliente = cliente
+        self._tabla = tabla
+        self._operacion = "select"
+        self._columnas: Optional[List[str]] = None
+        self._contar = False
+        self._datos: Any = None
+        self._filtros = []
+        self._orden = []
+        self._limite: Optional[int] = None
+        self._desde = 0
+
+    # Operaciones
+    def select(self, *columnas: str, count: Optional[str] = None):
+        self._operacion = "select"
+        texto = ",".join(columnas) if columnas else "*"
+        if texto.strip() != "*":
+            self._columnas = [c.strip() for c in texto.split(",") if c.strip()]
+        self._contar = count is not None
+        return self
+
+    def insert(self, datos, **kwargs):
+        self._operacion = "insert"
+        self._datos = datos
+        return self
+
+    def upsert(self, datos, **kwargs):
+        self._operacion = "upsert"
+        self._datos = datos
+        return self
+
+    def update(self, datos: dict, **kwargs):
+        self._operacion = "update"
+        self._datos = datos
+        return self
+
+    def delete(self, **kwargs):
+        self._operacion = "delete"
+        return self
+
+    # Filtros
+    def _agregar(self, operador: str, columna: str, valor: Any):
+        self._filtros.append(lambda fila: _comparar(operador, fila.get(columna), valor))
+        return self
+
+    def eq(self, columna, valor):
+        return self._agregar("eq", columna, valor)
+
+    def neq(self, columna, valor):
+        return self._agregar("neq", columna, valor)
+
+    def gt(self, columna, valor):
+        return self._agregar("gt", columna, valor)
+
+    def gte(self, columna, valor):
+        return self._agregar("gte", columna, valor)
+
+    def lt(self, columna, valor):
+        return self._agregar("lt", columna, valor)
+
+    def lte(self, columna, valor):
+        return self._agregar("lte", columna, valor)
+
+    def in_(self, columna, valores):
+        return self._agregar("in", columna, list(valores))
+
+    def is_(self, columna, valor):
+        return self._agregar("is", columna, valor)
+
+    def or_(self, filtros: str, **kwargs):
+        self._filtros.append(_filtro_logico(f"or({filtros})"))
+        return self
+
+    # Modificadores
+    def order(self, columna: str, *, desc: bool = False, **kwargs):
+        self._orden.append((columna, desc))
+        return self
+
+    def limit(self, cantidad: int, **kwargs):
+        self._limite = cantidad
+        return self
+
+    def range(self, inicio: int, fin: int, **kwargs):
+        self._desde = inicio
+        self._limite = fin - inicio + 1
+        return self
+
+    # Ejecución
+    def _coincide(self, fila: dict) -> bool:
+        return all(filtro(fila) for filtro in self._filtros)
+
+    def _proyectar(self, fila: dict) -> dict:
+        if self._columnas is None:
+            return copy.deepcopy(fila)
+        return {c: copy.deepcopy(fila.get(c)) for c in self._columnas}
+
+    def _ejecutar(self):
+        filas = self._cliente.tablas.setdefault(self._tabla, [])
+        count = None
+
+        if self._operacion in ("insert", "upsert"):
+            nuevas = self._datos if isinstance(self._datos, list) else [self._datos]
+            por_id = {str(f["id"]): f for f in filas} if self._operacion == "upsert" else {}
+            insertadas = []
+            for datos in nuevas:
+                existente = por_id.get(str(datos.get("id")))
+                if existente is not None:
+                    # upsert sobre una fila existente (conflicto por id): se reemplazan sus columnas
+                    existente.update(copy.deepcopy(datos))
+                    insertadas.append(copy.deepcopy(existente))
+                    continue
+                fila = {"id": str(uuid4()), **copy.deepcopy(datos)}
+                ahora = datetime.utcnow().isoformat()
+                fila.setdefault("created_at", ahora)
+                fila.setdefault("updated_at", ahora)
+                filas.append(fila)
+                insertadas.append(copy.deepcopy(fila))
+            return insertadas, count
+
+        seleccion = [fila for fila in filas if self._coincide(fila)]
+
+        if self._operacion == "update":
+            for fila in seleccion:
+                fila.update(copy.deepcopy(self._datos))
+            return [copy.deepcopy(f) for f in seleccion], count
+
+        if self._operacion == "delete":
+            ids = {id(f) for f in seleccion}
+            filas[:] = [f for f in filas if id(f) not in ids]
+            return seleccion, count
+
+        for columna, desc in reversed(self._orden):
+            seleccion.sort(
+                key=lambda f: (f.get(columna) is None, _normalizar(f.get(columna))),
+                reverse=desc,
+            )
+        if self._contar:
+            count = len(seleccion)
+        fin = None if self._limite is None else self._desde + self._limite
+        return [self._proyectar(f) for f in seleccion[self._desde:fin]], count
+
+    async def execute(self):
+        await self._cliente.esperar()
+        datos, count = self._ejecutar()
+        return SimpleNamespace(data=datos, count=count)
+
+
+class _Rpc:
+    def __init__(self, cliente: "SupabaseEnMemoria", nombre: str, params: Optional[dict]):
+        self._cliente = cliente
+        self._nombre = nombre
+        self._params = params or {}
+
+    async def execute(self):
+        await self._cliente.esperar()
+        funcion = self._cliente.funciones.get(self._nombre)
+        if funcion is None:
+            raise ValueError(f"Función RPC desconocida: {self._nombre}")
+        return SimpleNamespace(data=funcion(self._cliente, **self._params), count=None)
+
+
+def _buscar_visita(cliente: "SupabaseEnMemoria", visit_id: str) -> Optional[dict]:
+    for fila in cliente.tablas.get("visitas", []):
+        if str(fila.get("id")) == str(visit_id):
+            return fila
+    return None
+
+
+def _is_qr_valid(cliente: "SupabaseEnMemoria", visit_id: str) -> List[bool]:
+    visita = _buscar_visita(cliente, visit_id)
+    if not visita or not visita.get("qr_activo"):
+        return [False]
+    expiracion = visita.get("fecha_expiracion")
+    return [expiracion is None or _normalizar(expiracion) > datetime.utcnow()]
+
+
+def _scan_qr(cliente: "SupabaseEnMemoria", visit_id: str) -> List[bool]:
+    visita = _buscar_visita(cliente, visit_id)
+    if not visita:
+        return [False]
+    ahora = datetime.utcnow().isoformat()
+    visita.update({"fecha_escaneo": ahora, "escaneo_exitoso": True, "activa": True, "updated_at": ahora})
+    return [True]
+
+
+class _AuthEnMemoria:
+    def __init__(self, cliente: "SupabaseEnMemoria"):
+        self._cliente = cliente
+
+    async def sign_up(self, credenciales: dict):
+        await self._cliente.esperar()
+        user_id = str(uuid4())
+        # Igual que el trigger de Supabase: crea el registro en la tabla usuarios
+        ahora = datetime.utcnow().isoformat()
+        self._cliente.tablas.setdefault("usuarios", []).append({
+            "id": user_id,
+            "email": credenciales["email"],
+            "nombre": "",
+            "apellido": "",
+            "tipo_usuario_id": 1,
+            "activo": True,
+            "created_at": ahora,
+            "updated_at": ahora,
+        })
+        return SimpleNamespace(user=SimpleNamespace(id=user_id, email=credenciales["email"]))
+
+
+class SupabaseEnMemoria:
+    """Cliente falso con tablas en memoria y latencia configurable."""
+
+    def __init__(self, latencia_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latencia_ms = latencia_ms
+        self.jitter_ms = jitter_ms
+        self.tablas: Dict[str, List[dict]] = {}
+        self.funciones = {"is_qr_valid": _is_qr_valid, "scan_qr": _scan_qr}
+        self.auth = _AuthEnMemoria(self)
+
+    async def esperar(self):
+        latencia = self.latencia_ms
+        if self.jitter_ms:
+            latencia += random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latencia > 0:
+            await asyncio.sleep(latencia / 1000)
+
+    def table(self, nombre: str) -> _Consulta:
+        return _Consulta(self, nombre)
+
+    def rpc(self, nombre: str, params: Optional[dict] = None) -> _Rpc:
+        return _Rpc(self, nombre, params)
+
+    def sembrar(
+        self,
+        colonias: int = 2,
+        residencias_por_colonia: int = 50,
+        visitas_por_residencia: int = 10,
+        anuncios_por_colonia: int = 20,
+    ) -> dict:
+        """Llena las tablas con datos de prueba y devuelve algunos IDs útiles."""
+        ahora = datetime.utcnow()
+        ids = {"colonias": [], "residencias": [], "usuarios": [], "visitas": [], "visitas_vigentes": [],
+               "anuncios": []}
+
+        def fila(**campos):
+            marca = (ahora - timedelta(seconds=random.randint(0, 86400 * 30))).isoformat()
+            return {"id": str(uuid4()), "created_at": marca, "updated_at": marca, **campos}
+
+        for c in range(colonias):
+            colonia = fila(nombre=f"Colonia {c + 1}", direccion=f"Calle {c + 1}", admin_principal_id=None)
+            self.tablas.setdefault("colonias", []).append(colonia)
+            ids["colonias"].append(colonia["id"])
+
+            for r in range(residencias_por_colonia):
+                residencia = fila(numero=str(r + 1), calle="Principal", referencia=None,
+                                  ubicacion=None, colonia_id=colonia["id"])
+                usuario = fila(email=f"residente{c}-{r}@example.com", nombre="Residente", apellido=str(r),
+                               telefono=None, tipo_usuario_id=2, colonia_id=colonia["id"], activo=True)
+                relacion = fila(usuario_id=usuario["id"], residencia_id=residencia["id"], rol="residente",
+                                es_principal=True, verificado=True)
+                self.tablas.setdefault("residencias", []).append(residencia)
+                self.tablas.setdefault("usuarios", []).append(usuario)
+                self.tablas.setdefault("residencias_usuarios", []).append(relacion)
+                ids["residencias"].append(residencia["id"])
+                ids["usuarios"].append(usuario["id"])
+
+                for v in range(visitas_por_residencia):
+                    programada = ahora + timedelta(hours=random.randint(-72, 72))
+                    visita = fila(
+                        nombre_visitante="Visitante", apellido_visitante=str(v), identificacion=f"INE-{v}",
+                        tipo=random.choice(["Visita", "Servicio", "Recurrente"]),
+                        fecha_programada=programada.isoformat(), residencia_id=residencia["id"],
+                        usuario_id=usuario["id"], codigo_qr=None, qr_activo=True,
+                        fecha_expiracion=(programada + timedelta(hours=24)).isoformat(),
+                        activa=random.random() < 0.3, fecha_escaneo=None, escaneo_exitoso=False,
+                    )
+                    self.tablas.setdefault("visitas", []).append(visita)
+                    ids["visitas"].append(visita["id"])
+                    if programada + timedelta(hours=24) > ahora:
+                        ids["visitas_vigentes"].append(visita["id"])
+
+            for a in range(anuncios_por_colonia):
+                expiracion = None if a % 3 else (ahora + timedelta(days=random.randint(-10, 10))).isoformat()
+                anuncio = fila(titulo=f"Anuncio {a}", contenido="Contenido", usuario_id=ids["usuarios"][-1],
+                               colonia_id=colonia["id"], importante=a % 5 == 0,
+                               fecha_publicacion=(ahora - timedelta(days=a)).isoformat(),
+                               fecha_expiracion=expiracion)
+                self.tablas.setdefault("anuncios", []).append(anuncio)
+                ids["anuncios"].append(anuncio["id"])
+
+        return ids
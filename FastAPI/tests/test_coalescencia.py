@@ -0,0 +1,152 @@
+"""Tests del decorador de coalescencia y del feed de anuncios que lo usa."""
+
+import asyncio
+
+import pytest
+
+from crud import anuncios
+from crud.coalescencia import coalescer, llamadas_coalescidas
+from models.anuncio import AnuncioCreate
+from supabase_memoria import SupabaseEnMemoria
+
+
+def _conteo(nombre: str, resultado: str) -> float:
+    return llamadas_coalescidas._valores.get((nombre, resultado), 0)
+
+
+def _lectura_retenida(nombre: str):
+    """Función coalescida que no termina hasta que se libera el evento."""
+    liberar = asyncio.Event()
+    llamadas = []
+
+    @coalescer(nombre)
+    async def leer(clave, db=None):
+        llamadas.append(clave)
+        await liberar.wait()
+        return {"clave": clave, "llamada": len(llamadas)}
+
+    return leer, liberar, llamadas
+
+
+def test_llamadas_concurrentes_ejecutan_una_vez():
+    async def caso():
+        leer, liberar, llamadas = _lectura_retenida("test_concurrentes")
+        esperas = [asyncio.ensure_future(leer("a", db=object())) for _ in range(10)]
+        await asyncio.sleep(0)
+        liberar.set()
+        return await asyncio.gather(*esperas), llamadas
+
+    resultados, llamadas = asyncio.run(caso())
+    assert llamadas == ["a"]
+    assert all(r is resultados[0] for r in resultados)
+    assert _conteo("test_concurrentes", "ejecutada") == 1
+    assert _conteo("test_concurrentes", "colapsada") == 9
+
+
+def test_cancelar_un_espera_no_cancela_a_los_demas():
+    async def caso():
+        leer, liberar, llamadas = _lectura_retenida("test_cancelar")
+        primera = asyncio.ensure_future(leer("a"))
+        resto = [asyncio.ensure_future(leer("a")) for _ in range(3)]
+        await asyncio.sleep(0)
+        primera.cancel()
+        await asyncio.sleep(0)
+        liberar.set()
+        with pytest.raises(asyncio.CancelledError):
+            await primera
+        return await asyncio.gather(*resto), llamadas
+
+    resultados, llamadas = asyncio.run(caso())
+    assert llamadas == ["a"]
+    assert [r["clave"] for r in resultados] == ["a"] * 3
+
+
+def test_la_excepcion_llega_a_todos():
+    async def caso():
+        liberar = asyncio.Event()
+
+        @coalescer("test_excepcion")
+        async def leer(clave):
+            await liberar.wait()
+            raise ValueError(clave)
+
+        esperas = [asyncio.ensure_future(leer("a")) for _ in range(4)]
+        await asyncio.sleep(0)
+        liberar.set()
+        return await asyncio.gather(*esperas, return_exceptions=True)
+
+    errores = asyncio.run(caso())
+    assert len(errores) == 4
+    assert all(isinstance(e, ValueError) and e.args == ("a",) for e in errores)
+
+
+def test_olvidar_separa_las_lecturas_nuevas():
+    async def caso():
+        leer, liberar, llamadas = _lectura_retenida("test_olvidar")
+        vieja = asyncio.ensure_future(leer("a"))
+        await asyncio.sleep(0)
+        leer.olvidar("a")
+        nueva = asyncio.ensure_future(leer("a"))
+        await asyncio.sleep(0)
+        liberar.set()
+        return await vieja, await nueva, llamadas
+
+    vieja, nueva, llamadas = asyncio.run(caso())
+    assert llamadas == ["a", "a"]
+    assert vieja is not nueva
+    assert _conteo("test_olvidar", "ejecutada") == 2
+    assert _conteo("test_olvidar", "colapsada") == 0
+
+
+class _Retenida:
+    """Envuelve una consulta de SupabaseEnMemoria; execute() espera al evento."""
+
+    def __init__(self, consulta, liberar: asyncio.Event):
+        self._consulta = consulta
+        self._liberar = liberar
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._consulta, nombre)
+        if not callable(atributo):
+            return atributo
+        return lambda *args, **kwargs: _Retenida(atributo(*args, **kwargs), self._liberar)
+
+    async def execute(self):
+        respuesta = await self._consulta.execute()
+        await self._liberar.wait()
+        return respuesta
+
+
+class _ClienteRetenido:
+    def __init__(self, db: SupabaseEnMemoria, liberar: asyncio.Event):
+        self._db = db
+        self._liberar = liberar
+
+    def table(self, nombre: str):
+        return _Retenida(self._db.table(nombre), self._liberar)
+
+
+def test_lectura_en_vuelo_no_rellena_la_cache_tras_escribir():
+    async def caso():
+        db = SupabaseEnMemoria()
+        ids = db.sembrar(colonias=1, residencias_por_colonia=1, visitas_por_residencia=0)
+        colonia = ids["colonias"][0]
+        anuncios.feed_cache.limpiar()
+        liberar = asyncio.Event()
+
+        # La lectura ya consultó la base pero aún no vuelve cuando llega la escritura
+        lectura = asyncio.ensure_future(anuncios.get_anuncios_by_colonia(colonia, _ClienteRetenido(db, liberar)))
+        await asyncio.sleep(0.01)
+        nuevo = await anuncios.create_anuncio(AnuncioCreate(
+            titulo="Corte de agua", contenido="Mañana", usuario_id=ids["usuarios"][0], colonia_id=colonia), db)
+        liberar.set()
+        vieja = await lectura
+
+        en_cache = anuncios.feed_cache.get(str(colonia))
+        actual = await anuncios.get_anuncios_by_colonia(colonia, db)
+        return nuevo, vieja, en_cache, actual
+
+    nuevo, vieja, en_cache, actual = asyncio.run(caso())
+    assert nuevo.id not in [a.id for a in vieja]
+    assert en_cache is None
+    assert nuevo.id in [a.id for a in actual]
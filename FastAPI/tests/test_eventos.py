@@ -0,0 +1,104 @@
+"""Tests del bus de eventos de visitas (crud/eventos.py)."""
+
+import asyncio
+import json
+import time
+import uuid
+
+from fastapi.testclient import TestClient
+
+from crud.eventos import BusEventos, bus
+
+
+def _leer(suscripcion, timeout=0.01):
+    mensaje = asyncio.run(suscripcion.siguiente(timeout=timeout))
+    return json.loads(mensaje) if mensaje is not None else None
+
+
+def _esperar(condicion, segundos=1.0) -> bool:
+    limite = time.monotonic() + segundos
+    while not condicion() and time.monotonic() < limite:
+        time.sleep(0.01)
+    return condicion()
+
+
+def test_publicar_llega_solo_a_los_canales_suscritos():
+    eventos = BusEventos()
+    colonia = eventos.suscribir("colonia:a")
+    otra = eventos.suscribir("colonia:b")
+    ambas = eventos.suscribir("colonia:a", "residencia:r")
+
+    assert eventos.publicar(["colonia:a", "residencia:r"], {"tipo": "creada", "id": 1}) == 2
+    assert _leer(colonia) == {"tipo": "creada", "id": 1}
+    # Suscrito a los dos canales del evento, pero lo recibe una sola vez
+    assert _leer(ambas) == {"tipo": "creada", "id": 1}
+    assert _leer(ambas) is None
+    assert _leer(otra) is None
+
+
+def test_suscriptor_lento_descarta_los_mas_viejos_sin_bloquear():
+    eventos = BusEventos(max_cola=3)
+    lento = eventos.suscribir("colonia:a")
+    rapido = eventos.suscribir("colonia:a")
+
+    inicio = time.perf_counter()
+    for i in range(10):
+        assert eventos.publicar(["colonia:a"], {"tipo": "actualizada", "n": i}) == 2
+        _leer(rapido)
+    assert time.perf_counter() - inicio < 1
+
+    assert lento.cola.qsize() == 3
+    assert lento.perdidos == 7
+    assert _leer(lento) == {"tipo": "desfase", "perdidos": 7}
+    assert [_leer(lento)["n"] for _ in range(3)] == [7, 8, 9]
+    assert rapido.perdidos == 0
+
+
+def test_cerrar_cancela_la_suscripcion():
+    eventos = BusEventos()
+    with eventos.suscribir("colonia:a", "residencia:r") as suscripcion:
+        assert eventos.hay_suscriptores("colonia")
+        assert eventos.hay_suscriptores("residencia")
+    assert not eventos.hay_suscriptores("colonia")
+    assert not eventos.hay_suscriptores("residencia")
+    assert eventos.publicar(["colonia:a", "residencia:r"], {"tipo": "creada"}) == 0
+    assert suscripcion.cola.empty()
+    # Cancelar dos veces no descuenta de más
+    suscripcion.cerrar()
+    assert not eventos.hay_suscriptores("colonia")
+
+
+def test_desconectar_el_websocket_cancela_la_suscripcion():
+    from main import app
+
+    canal = f"colonia:{uuid.uuid4()}"
+    # Sin `with`: no corre el lifespan, que necesita Supabase
+    cliente = TestClient(app)
+    with cliente.websocket_connect(f"/visitas/ws/{canal.replace(':', '/')}"):
+        assert _esperar(lambda: canal in bus._canales)
+    assert _esperar(lambda: canal not in bus._canales)
+
+
+def test_publicar_varias_visitas_carga_las_residencias_una_vez():
+    from crud.visitas import publicar_eventos_visitas
+    from supabase_memoria import SupabaseEnMemoria
+
+    async def caso():
+        db = SupabaseEnMemoria()
+        ids = db.sembrar(colonias=1, residencias_por_colonia=5, visitas_por_residencia=4)
+        consultas = []
+        tabla = db.table
+        db.table = lambda nombre: consultas.append(nombre) or tabla(nombre)
+
+        with bus.suscribir(f"colonia:{ids['colonias'][0]}") as suscripcion:
+            await publicar_eventos_visitas("expirada", db.tablas["visitas"], db)
+            recibidos = []
+            while (mensaje := await suscripcion.siguiente(timeout=0.01)) is not None:
+                recibidos.append(json.loads(mensaje))
+        return consultas, recibidos, db.tablas["visitas"]
+
+    consultas, recibidos, visitas = asyncio.run(caso())
+    assert consultas == ["residencias"]
+    assert len(recibidos) == len(visitas) == 20
+    assert {e["visita"]["id"] for e in recibidos} == {v["id"] for v in visitas}
+    assert all("residencia" not in e["visita"] and "residencia" not in v for e, v in zip(recibidos, visitas))
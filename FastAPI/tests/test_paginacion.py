@@ -0,0 +1,65 @@
+"""Tests del cursor de paginación (crud/paginacion.py)."""
+
+import asyncio
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from crud.paginacion import aplicar_cursor, codificar_cursor, decodificar_cursor, obtener_pagina
+from supabase_memoria import SupabaseEnMemoria
+
+
+def _cursor(*valores) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(valores)).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize("cursor", [
+    "no-es-base64!",
+    _cursor("x", ")"),
+    _cursor("2024-01-01T00:00:00", "1),id.gt.(0"),
+    _cursor('2024-01-01T00:00:00"),id.gt.(', "c2a2f6a5-6f0b-4c59-9a9e-4a8f0b3b6a11"),
+    _cursor("2024-01-01T00:00:00"),
+    _cursor(1, 2),
+])
+def test_cursor_invalido_responde_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        decodificar_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_el_filtro_lleva_los_valores_entre_comillas():
+    fila = {'created_at': '2024-01-01T00:00:00+00:00', 'id': 'c2a2f6a5-6f0b-4c59-9a9e-4a8f0b3b6a11'}
+
+    class Consulta:
+        filtros = []
+
+        def or_(self, filtro):
+            self.filtros.append(filtro)
+            return self
+
+        def order(self, *args, **kwargs):
+            return self
+
+    consulta = aplicar_cursor(Consulta(), codificar_cursor(fila))
+    assert consulta.filtros == [
+        'created_at.gt."2024-01-01T00:00:00+00:00",'
+        'and(created_at.eq."2024-01-01T00:00:00+00:00",id.gt."c2a2f6a5-6f0b-4c59-9a9e-4a8f0b3b6a11")'
+    ]
+
+
+def test_recorrer_todas_las_paginas():
+    async def caso():
+        db = SupabaseEnMemoria()
+        ids = db.sembrar(colonias=1, residencias_por_colonia=10, visitas_por_residencia=5)
+        vistos, cursor = [], None
+        while True:
+            filas, cursor = await obtener_pagina(db.table('visitas').select('*'), 7, cursor)
+            vistos.extend(str(f['id']) for f in filas)
+            if cursor is None:
+                return ids['visitas'], vistos
+
+    esperadas, vistas = asyncio.run(caso())
+    assert len(vistas) == len(set(vistas)) == 50
+    assert set(vistas) == set(esperadas)
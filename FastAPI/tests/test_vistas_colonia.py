@@ -0,0 +1,107 @@
+"""Tests de las vistas por colonia (manifiesto, analítica e índice) frente a las escrituras."""
+
+import asyncio
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+
+from crud import analitica, indice_visitas, manifiesto, vistas_colonia
+from crud.residencias import create_residencia
+from crud.visitas import create_visita, update_visita
+from models.residencia import ResidenciaCreate
+from models.visita import VisitaCreate
+from supabase_memoria import SupabaseEnMemoria
+
+
+def _visita(residencia_id, usuario_id) -> VisitaCreate:
+    return VisitaCreate(nombre_visitante="Ana", apellido_visitante="Pérez", identificacion="INE-1",
+                        tipo="Visita", fecha_programada=datetime.utcnow() + timedelta(hours=1),
+                        residencia_id=residencia_id, usuario_id=usuario_id)
+
+
+async def _vistas(colonia_id, db):
+    return (await manifiesto.get_manifiesto(colonia_id, db),
+            await analitica.get_analitica(colonia_id, db),
+            await indice_visitas.get_indice(colonia_id, db))
+
+
+def _contiene(vistas, visita_id) -> list:
+    m, a, i = vistas
+    visita_id = str(visita_id)
+    return [visita_id in m.entradas, visita_id in a.aportes, visita_id in i.filas]
+
+
+def test_residencia_creada_despues_de_construir():
+    async def caso():
+        db = SupabaseEnMemoria()
+        ids = db.sembrar(colonias=1, residencias_por_colonia=2, visitas_por_residencia=0)
+        colonia = ids["colonias"][0]
+        vistas = await _vistas(colonia, db)
+
+        residencia = await create_residencia(ResidenciaCreate(numero="99", calle="Nueva", colonia_id=colonia), db)
+        visita = await create_visita(_visita(residencia.id, ids["usuarios"][0]), db)
+        return vistas, visita
+
+    vistas, visita = asyncio.run(caso())
+    assert _contiene(vistas, visita.id) == [True, True, True]
+    assert vistas[0].entradas[str(visita.id)]["residencia"] == "Nueva 99"
+
+
+def test_residencia_de_otro_worker_se_busca_en_la_base():
+    async def caso():
+        db = SupabaseEnMemoria()
+        ids = db.sembrar(colonias=1, residencias_por_colonia=2, visitas_por_residencia=0)
+        colonia = ids["colonias"][0]
+        vistas = await _vistas(colonia, db)
+
+        # Insertada directo en la base, sin pasar por crud/residencias de este proceso
+        residencia_id = str(uuid4())
+        await db.table("residencias").insert({"id": residencia_id, "numero": "7", "calle": "Otra",
+                                              "colonia_id": colonia}).execute()
+        visita = await create_visita(_visita(residencia_id, ids["usuarios"][0]), db)
+        return vistas, visita
+
+    vistas, visita = asyncio.run(caso())
+    assert _contiene(vistas, visita.id) == [True, True, True]
+
+
+def test_visita_movida_a_otra_colonia_sale_de_la_anterior():
+    async def caso():
+        db = SupabaseEnMemoria()
+        ids = db.sembrar(colonias=2, residencias_por_colonia=2, visitas_por_residencia=0)
+        origen, destino = ids["colonias"]
+        vistas_origen = await _vistas(origen, db)
+        vistas_destino = await _vistas(destino, db)
+
+        visita = await create_visita(_visita(ids["residencias"][0], ids["usuarios"][0]), db)
+        antes = _contiene(vistas_origen, visita.id)
+        await update_visita(visita.id, {"residencia_id": ids["residencias"][2]}, db)
+        return antes, _contiene(vistas_origen, visita.id), _contiene(vistas_destino, visita.id)
+
+    antes, origen, destino = asyncio.run(caso())
+    assert antes == [True, True, True]
+    assert origen == [False, False, False]
+    assert destino == [True, True, True]
+
+
+def test_filas_de_asyncpg_llegan_igual_que_las_de_postgrest():
+    async def caso():
+        db = SupabaseEnMemoria()
+        ids = db.sembrar(colonias=1, residencias_por_colonia=1, visitas_por_residencia=0)
+        colonia = ids["colonias"][0]
+        m, _, i = await _vistas(colonia, db)
+
+        visita = await create_visita(_visita(ids["residencias"][0], ids["usuarios"][0]), db)
+        fila = dict(db.tablas["visitas"][-1])
+        texto = (dict(m.entradas[str(visita.id)]), i.filas[str(visita.id)][1])
+
+        # Misma fila con los tipos que devuelve asyncpg
+        for campo in ("id", "residencia_id", "usuario_id"):
+            fila[campo] = UUID(str(fila[campo]))
+        for campo in ("fecha_programada", "fecha_expiracion", "created_at", "updated_at"):
+            fila[campo] = datetime.fromisoformat(str(fila[campo]))
+        await vistas_colonia.visita_cambiada(fila, db)
+        return texto, (m.entradas[str(visita.id)], i.filas[str(visita.id)][1])
+
+    (entrada_texto, fila_texto), (entrada, fila) = asyncio.run(caso())
+    assert entrada == entrada_texto
+    assert isinstance(fila["id"], str) and isinstance(fila["fecha_programada"], str)